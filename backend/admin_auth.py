@@ -0,0 +1,57 @@
+"""
+Admin authorization shared by the admin-only routers.
+
+Role lookups are memoized per worker for ADMIN_ROLE_CACHE_TTL seconds so
+paging through the moderation queue or polling the dashboard does not
+re-read profiles.role on every call. Revoking a role therefore takes effect
+within that window.
+"""
+
+import os
+import time
+import threading
+
+from fastapi import HTTPException
+from db import get_supabase_admin
+from routes_listings import get_current_user
+
+# "admin" is used by the reports tools, "superadmin" by the dashboard (migration 013)
+ADMIN_ROLES = {"admin", "superadmin"}
+
+ADMIN_ROLE_CACHE_TTL = float(os.environ.get("ADMIN_ROLE_CACHE_TTL", "60"))
+
+_role_cache: dict[str, tuple[float, bool]] = {}
+_role_cache_lock = threading.Lock()
+
+
+def _is_admin(uid: str) -> bool:
+    now = time.monotonic()
+    with _role_cache_lock:
+        hit = _role_cache.get(uid)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+
+    sb = get_supabase_admin()
+    res = sb.table("profiles").select("role").eq("id", uid).execute()
+    is_admin = bool(res.data) and res.data[0].get("role") in ADMIN_ROLES
+
+    with _role_cache_lock:
+        _role_cache[uid] = (now + ADMIN_ROLE_CACHE_TTL, is_admin)
+    return is_admin
+
+
+def require_admin(authorization: str | None) -> str:
+    """
+    Validate the Bearer token and require an admin role.
+
+    Returns:
+        str: The admin's user id
+
+    Raises:
+        HTTPException: 401 for a bad token, 403 if the user is not an admin
+    """
+    user = get_current_user(authorization or "")
+    uid = str(user.id)
+    if not _is_admin(uid):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return uid
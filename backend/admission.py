@@ -0,0 +1,185 @@
+"""
+Priority admission control and load shedding.
+
+Every request is assigned a priority class before it reaches a route:
+
+  - critical: Stripe webhooks, auth and message sends. These may use the whole
+    in-flight budget and wait longest for a slot.
+  - normal: other authenticated traffic.
+  - low: anonymous GETs (listing browsing), view tracking and admin
+    analytics. These may only use part of the budget, so some capacity is
+    always left for the classes above.
+
+A request over its class's share waits briefly for a slot and is shed with
+503 + Retry-After if none frees up. While admitted requests have recently
+been queueing for longer than ADMISSION_TARGET_DELAY_MS, low-priority requests
+are shed straight away instead of joining the queue.
+
+Rules are prefix matches on "METHOD /path" (first match wins).
+ADMISSION_PRIORITIES adds rules ahead of the defaults, e.g.
+"GET /listings=normal;POST /deals=critical". Probes and /metrics are never
+shed. Limits are per worker process.
+"""
+
+import os
+import time
+import random
+import asyncio
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+CRITICAL, NORMAL, LOW = "critical", "normal", "low"
+
+# Matches the default anyio thread pool that runs the sync route handlers
+MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "40"))
+TARGET_DELAY = float(os.environ.get("ADMISSION_TARGET_DELAY_MS", "100")) / 1000
+RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "2"))
+
+# Fraction of MAX_IN_FLIGHT each class may occupy, and how long (s) it may queue
+SHARES = {
+    CRITICAL: 1.0,
+    NORMAL: float(os.environ.get("ADMISSION_NORMAL_SHARE", "0.85")),
+    LOW: float(os.environ.get("ADMISSION_LOW_SHARE", "0.6")),
+}
+QUEUE_TIMEOUTS = {
+    CRITICAL: float(os.environ.get("ADMISSION_CRITICAL_QUEUE_TIMEOUT", "10")),
+    NORMAL: float(os.environ.get("ADMISSION_NORMAL_QUEUE_TIMEOUT", "2")),
+    LOW: float(os.environ.get("ADMISSION_LOW_QUEUE_TIMEOUT", "0.25")),
+}
+
+EXEMPT_PATHS = frozenset({"/", "/ready", "/health/live", "/health/ready", "/metrics"})
+
+DEFAULT_RULES = [
+    ("POST", "/webhooks/stripe", CRITICAL),
+    ("*", "/auth", CRITICAL),
+    ("POST", "/messages/send", CRITICAL),
+    ("*", "/admin/analytics", LOW),
+    ("POST", "/listings/views", LOW),
+]
+
+ADMITTED = Gauge(
+    "admission_in_flight",
+    "Requests currently admitted past admission control",
+    multiprocess_mode="livesum",
+)
+QUEUE_DELAY = Histogram(
+    "admission_queue_seconds",
+    "Time requests waited for an admission slot",
+    ["priority"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SHED = Counter(
+    "admission_shed_total",
+    "Requests rejected with 503 by admission control",
+    ["priority", "reason"],
+)
+
+
+def parse_rules(spec: str) -> list[tuple[str, str, str]]:
+    """Parse "METHOD /prefix=class;..." (METHOD may be *) into rules."""
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        target, _, priority = item.rpartition("=")
+        method, _, prefix = target.strip().partition(" ")
+        priority = priority.strip().lower()
+        if priority not in SHARES or not prefix.startswith("/"):
+            raise ValueError(f"Invalid ADMISSION_PRIORITIES rule: {item!r}")
+        rules.append((method.upper(), prefix.strip().rstrip("/") or "/", priority))
+    return rules
+
+
+RULES = parse_rules(os.environ.get("ADMISSION_PRIORITIES", "")) + DEFAULT_RULES
+
+
+def classify(method: str, path: str, authenticated: bool) -> str:
+    """Priority class for a request."""
+    for rule_method, prefix, priority in RULES:
+        if rule_method in ("*", method) and (path == prefix or path.startswith(prefix.rstrip("/") + "/")):
+            return priority
+    if method == "GET" and not authenticated:
+        return LOW
+    return NORMAL
+
+
+class AdmissionController:
+    """In-flight budget shared by the priority classes of one worker process."""
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT):
+        self.limits = {cls: max(1, int(max_in_flight * share)) for cls, share in SHARES.items()}
+        self.in_flight = 0
+        # Exponentially weighted queue delay of recently admitted requests
+        self.delay = 0.0
+        self._freed: Optional[asyncio.Condition] = None
+
+    def overloaded(self) -> bool:
+        return self.delay > TARGET_DELAY
+
+    async def acquire(self, priority: str) -> Optional[str]:
+        """Take a slot for `priority`. Returns None when admitted, else the reason it was shed."""
+        limit = self.limits[priority]
+        if self.in_flight < limit:
+            self._admit(0.0)
+            return None
+        if priority == LOW and self.overloaded():
+            return "overloaded"
+
+        if self._freed is None:
+            self._freed = asyncio.Condition()
+        start = time.monotonic()
+        try:
+            async with self._freed:
+                await asyncio.wait_for(
+                    self._freed.wait_for(lambda: self.in_flight < limit),
+                    QUEUE_TIMEOUTS[priority],
+                )
+                self._admit(time.monotonic() - start)
+        except asyncio.TimeoutError:
+            return "queue_timeout"
+        finally:
+            QUEUE_DELAY.labels(priority).observe(time.monotonic() - start)
+        return None
+
+    def _admit(self, waited: float) -> None:
+        self.in_flight += 1
+        self.delay = 0.8 * self.delay + 0.2 * waited
+        ADMITTED.inc()
+
+    async def release(self) -> None:
+        self.in_flight -= 1
+        ADMITTED.dec()
+        if self._freed is not None:
+            async with self._freed:
+                self._freed.notify_all()
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or AdmissionController()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        authenticated = "authorization" in Headers(scope=scope)
+        priority = classify(scope["method"], scope["path"], authenticated)
+        reason = await self.controller.acquire(priority)
+        if reason is not None:
+            SHED.labels(priority, reason).inc()
+            response = JSONResponse(
+                {"detail": "Server is busy. Please try again shortly."},
+                status_code=503,
+                # Spread the retries out so shed clients don't return in lockstep
+                headers={"Retry-After": str(random.randint(RETRY_AFTER, 2 * RETRY_AFTER))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self.controller.release()
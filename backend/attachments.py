@@ -0,0 +1,289 @@
+"""
+Streaming message attachment uploads.
+
+POST /messages/attachments takes one multipart file field ("file") and parses
+the request body as it arrives: each chunk is hashed (sha256) and appended to
+a temporary file, so memory use stays at one network chunk whatever the file
+size, and an oversized or disallowed file is rejected as soon as it is
+detected instead of after the whole body has been received.
+
+The file's type comes from its first bytes (magic numbers), not from the
+client's Content-Type or file name; anything not in the allow-list below
+(executables, HTML, SVG, ...) is rejected with 415. Files are stored in the
+object store under their content hash, so a file that was already uploaded
+by anyone is not stored again.
+
+Quotas are per user: ATTACHMENT_DAILY_QUOTA_BYTES over the last 24 hours and
+ATTACHMENT_QUOTA_BYTES in total, counting each distinct file once.
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+from prometheus_client import Counter
+from starlette.concurrency import run_in_threadpool
+
+from db import get_supabase_admin
+from object_store import get_store
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = int(os.environ.get("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+DAILY_QUOTA_BYTES = int(os.environ.get("ATTACHMENT_DAILY_QUOTA_BYTES", str(500 * 1024 * 1024)))
+QUOTA_BYTES = int(os.environ.get("ATTACHMENT_QUOTA_BYTES", str(2 * 1024 * 1024 * 1024)))
+TMP_DIR = os.environ.get("ATTACHMENT_TMP_DIR") or None
+
+UPLOADS = Counter(
+    "attachment_uploads_total",
+    "Message attachment uploads",
+    ["result"],
+)
+UPLOAD_BYTES = Counter(
+    "attachment_upload_bytes_total",
+    "Bytes of message attachments received",
+)
+
+# Bytes needed to recognise every type below
+SNIFF_BYTES = 512
+
+_OFFICE_ZIP = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+_OFFICE_LEGACY = {".doc": "application/msword", ".xls": "application/vnd.ms-excel", ".ppt": "application/vnd.ms-powerpoint"}
+_TEXT = {".txt": "text/plain", ".csv": "text/csv"}
+
+EXTENSIONS = {
+    "image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp",
+    "image/heic": ".heic", "application/pdf": ".pdf", "application/zip": ".zip",
+    "application/vnd.rar": ".rar", "video/mp4": ".mp4", "video/quicktime": ".mov", "audio/mpeg": ".mp3",
+    **{t: ext for ext, t in {**_OFFICE_ZIP, **_OFFICE_LEGACY, **_TEXT}.items()},
+}
+
+
+def sniff(head: bytes, filename: Optional[str]) -> Optional[str]:
+    """
+    Content type of a file from its first bytes; the file name only picks
+    between types that share a container (zip, OLE, plain text).
+
+    Returns:
+        str: MIME type, or None if the file is not an allowed type
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "image/heic"
+        if brand == b"qt  ":
+            return "video/quicktime"
+        return "video/mp4"
+    if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mpeg"
+    if head.startswith(b"Rar!\x1a\x07"):
+        return "application/vnd.rar"
+    if head.startswith(b"PK\x03\x04"):
+        return _OFFICE_ZIP.get(ext, "application/zip")
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return _OFFICE_LEGACY.get(ext)
+    if ext in _TEXT and head and b"\x00" not in head:
+        try:
+            # The sniffed prefix may end mid-character
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if e.start < len(head) - 3:
+                return None
+        return _TEXT[ext]
+    return None
+
+
+def usage(user_id: str) -> tuple[int, int]:
+    """(bytes in the last 24 hours, bytes in total) uploaded by a user."""
+    res = get_supabase_admin().rpc("attachment_usage", {"p_user_id": str(user_id)}).execute()
+    row = (res.data or [{}])[0]
+    return int(row.get("day_bytes") or 0), int(row.get("total_bytes") or 0)
+
+
+class _Upload:
+    """The file part being received: spooled to a temp file and hashed on the way."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size = 0
+        self.head = b""
+        self.sha256 = hashlib.sha256()
+        self.file = tempfile.NamedTemporaryFile(dir=TMP_DIR, prefix="attachment-", delete=False)
+        self.complete = False
+
+    def write(self, chunks: list[bytes]) -> None:
+        for chunk in chunks:
+            self.size += len(chunk)
+            if self.size > self.limit:
+                raise HTTPException(status_code=413, detail=f"Attachments can be at most {self.limit // (1024 * 1024)} MB")
+            if len(self.head) < SNIFF_BYTES:
+                self.head += chunk[:SNIFF_BYTES - len(self.head)]
+                if len(self.head) >= SNIFF_BYTES:
+                    self.check_type()
+            self.sha256.update(chunk)
+            self.file.write(chunk)
+
+    def check_type(self) -> None:
+        self.content_type = sniff(self.head, self.filename)
+        if self.content_type is None:
+            raise HTTPException(status_code=415, detail="This file type can't be sent as an attachment")
+
+    def close(self) -> None:
+        self.file.close()
+
+    def discard(self) -> None:
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+async def _receive(request: Request, limit: int) -> _Upload:
+    """Parse the multipart body, streaming the "file" field into an _Upload."""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    upload = _Upload(limit)
+    headers: dict[bytes, bytes] = {}
+    state = {"field": None, "header": b"", "value": b""}
+    pending: list[bytes] = []
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        headers[state["header"].lower()] = state["value"]
+        state["header"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        state["field"] = options.get(b"name")
+        if state["field"] == b"file":
+            if upload.filename is not None:
+                raise HTTPException(status_code=400, detail="Upload one file at a time")
+            upload.filename = os.path.basename(options.get(b"filename", b"").decode("utf-8", "replace"))[:255] or "attachment"
+
+    def on_part_data(data, start, end):
+        if state["field"] == b"file":
+            pending.append(bytes(data[start:end]))
+
+    def on_part_end():
+        if state["field"] == b"file":
+            upload.complete = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if pending:
+                await run_in_threadpool(upload.write, pending[:])
+                pending.clear()
+        parser.finalize()
+        if not upload.complete:
+            raise HTTPException(status_code=400, detail="No file in the upload (expected a field named 'file')")
+        if upload.content_type is None:
+            upload.check_type()
+        upload.close()
+        return upload
+    except BaseException:
+        upload.discard()
+        raise
+
+
+def _store(user_id: str, upload: _Upload) -> dict:
+    content_hash = upload.sha256.hexdigest()
+    key = f"attachments/{content_hash[:2]}/{content_hash}{EXTENSIONS[upload.content_type]}"
+    store = get_store()
+    existed = store.exists(key)
+    url = store.url(key) if existed else store.put(key, upload.file.name, upload.content_type)
+
+    get_supabase_admin().table("message_attachments").upsert({
+        "user_id": str(user_id),
+        "content_hash": content_hash,
+        "size": upload.size,
+        "content_type": upload.content_type,
+        "filename": upload.filename,
+        "url": url,
+    }, on_conflict="user_id,content_hash", ignore_duplicates=True).execute()
+    return {
+        "url": url,
+        "name": upload.filename,
+        "type": upload.content_type,
+        "size": upload.size,
+        "content_hash": content_hash,
+        "deduplicated": existed,
+    }
+
+
+async def receive_attachment(request: Request, user_id: str) -> dict:
+    """
+    Handle POST /messages/attachments.
+
+    Returns:
+        dict: url, name and type (for send_message's attachment_* fields),
+        size, content_hash and whether the file was already stored
+
+    Raises:
+        HTTPException: 400 malformed upload, 413 too large, 415 type not
+            allowed, 429 quota exceeded
+    """
+    day_bytes, total_bytes = await run_in_threadpool(usage, user_id)
+    limit = min(MAX_BYTES, DAILY_QUOTA_BYTES - day_bytes, QUOTA_BYTES - total_bytes)
+    if limit <= 0:
+        UPLOADS.labels("over_quota").inc()
+        raise HTTPException(status_code=429, detail="You've reached your attachment upload limit. Try again tomorrow.")
+
+    try:
+        upload = await _receive(request, limit)
+    except HTTPException as e:
+        result = {413: "too_large", 415: "rejected_type"}.get(e.status_code, "invalid")
+        if e.status_code == 413 and limit < MAX_BYTES:
+            result = "over_quota"
+            e = HTTPException(status_code=429, detail="This file would exceed your attachment upload limit.")
+        UPLOADS.labels(result).inc()
+        raise e
+    try:
+        UPLOAD_BYTES.inc(upload.size)
+        stored = await run_in_threadpool(_store, user_id, upload)
+    finally:
+        upload.discard()
+    UPLOADS.labels("deduplicated" if stored["deduplicated"] else "stored").inc()
+    return stored
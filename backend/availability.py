@@ -0,0 +1,226 @@
+"""
+Listing availability calendar.
+
+Booked and owner-blocked dates live in listing_bookings as Postgres
+dateranges [move-in, move-out); a missing move-out is an open-ended stay.
+An exclusion constraint over (listing_id, period) makes overlapping
+bookings of a listing impossible, so two deals racing for the same dates
+can't both win: the losing insert fails and becomes a 409 here, with no
+read-then-write window. The GiST index behind the constraint also answers
+the overlap queries for free windows and for the move_in/move_out filter on
+GET /listings, so their cost depends on the dates asked about, not on how
+many bookings a listing has.
+
+A deal books its dates when it is created, as a hold that expires with its
+owner-fee checkout (DEAL_HOLD_HOURS) unless the payment webhook confirms
+it (migration 027), so an abandoned deal frees the calendar on its own.
+Expired holds are ignored by every read and deleted before each booking.
+"""
+
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+
+from db import get_supabase_admin
+
+MAX_SPAN_DAYS = int(os.environ.get("AVAILABILITY_MAX_SPAN_DAYS", "730"))
+DEFAULT_SPAN_DAYS = 365
+# How long an unpaid deal holds its dates, and its checkout stays open (Stripe allows 30 min to 24 h)
+DEAL_HOLD_HOURS = min(24.0, max(1.0, float(os.environ.get("DEAL_HOLD_HOURS", "24"))))
+
+BOOKING_FIELDS = "id,period,source,deal_id,note,expires_at,created_at"
+
+# Postgres error for an exclusion constraint violation
+EXCLUSION_VIOLATION = "23P01"
+
+
+def period(start: date, end: Optional[date]) -> str:
+    """
+    Daterange literal for a stay; `end` is the move-out day (not booked).
+
+    Raises:
+        HTTPException: 400 if the stay ends on or before it starts
+    """
+    if end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="Move-out must be after move-in")
+    return f"[{start.isoformat()},{end.isoformat() if end else ''})"
+
+
+def bounds(value: str) -> tuple[date, Optional[date]]:
+    """(start, end) of a canonical daterange as Postgres returns it, e.g. "[2026-01-01,2026-02-01)"."""
+    lower, _, upper = value[1:-1].partition(",")
+    return date.fromisoformat(lower), date.fromisoformat(upper) if upper else None
+
+
+def stay_dates(move_in: Optional[str], move_out: Optional[str]) -> Optional[tuple[date, Optional[date]]]:
+    """
+    Parse a deal's move-in/move-out strings.
+
+    Returns:
+        tuple: (move_in, move_out or None), or None when there is no move-in date
+
+    Raises:
+        HTTPException: 400 if a date isn't YYYY-MM-DD
+    """
+    if not move_in:
+        return None
+    try:
+        return date.fromisoformat(move_in[:10]), date.fromisoformat(move_out[:10]) if move_out else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+
+def _listing(listing_id: str) -> dict:
+    res = (
+        get_supabase_admin().table("listings")
+        .select("id,owner_id,available_from,available_to")
+        .eq("id", listing_id)
+        .execute()
+    )
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    return res.data[0]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def hold_until() -> datetime:
+    """When a hold placed now for an unpaid deal expires."""
+    return datetime.now(timezone.utc) + timedelta(hours=DEAL_HOLD_HOURS)
+
+
+def _row(booking: dict) -> dict:
+    start, end = bounds(booking["period"])
+    out = {k: v for k, v in booking.items() if k != "period"}
+    return {**out, "start_date": start.isoformat(), "end_date": end.isoformat() if end else None}
+
+
+def calendar(listing_id: str, start: Optional[date], end: Optional[date], user_id: Optional[str] = None) -> dict:
+    """
+    Free windows of a listing between `start` (default today) and `end`
+    (default a year later). The owner also gets the bookings in that range.
+
+    Raises:
+        HTTPException: 404 unknown listing, 400 bad or too long range
+    """
+    start = start or datetime.now(timezone.utc).date()
+    end = end or start + timedelta(days=DEFAULT_SPAN_DAYS)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if (end - start).days > MAX_SPAN_DAYS:
+        raise HTTPException(status_code=400, detail=f"Ask for at most {MAX_SPAN_DAYS} days at a time")
+
+    listing = _listing(listing_id)
+    sb = get_supabase_admin()
+    free = sb.rpc("listing_free_windows", {
+        "p_listing_id": listing_id,
+        "p_start": start.isoformat(),
+        "p_end": end.isoformat(),
+    }).execute().data
+    result = {
+        "listing_id": listing_id,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "free": free,
+    }
+    if user_id and str(user_id) == str(listing["owner_id"]):
+        booked = (
+            sb.table("listing_bookings")
+            .select(BOOKING_FIELDS)
+            .eq("listing_id", listing_id)
+            .ov("period", period(start, end))
+            .or_(f"expires_at.is.null,expires_at.gt.{_now()}")
+            .order("period")
+            .execute()
+        ).data
+        result["bookings"] = [_row(b) for b in booked]
+    return result
+
+
+def book(
+    listing_id: str,
+    owner_id: str,
+    start: date,
+    end: Optional[date],
+    source: str = "deal",
+    note: Optional[str] = None,
+    deal_id: Optional[str] = None,
+    expires_at: Optional[datetime] = None,
+) -> dict:
+    """
+    Reserve [start, end) of a listing for its owner (a deal or a block);
+    with `expires_at`, only until then unless confirm_deal() is called.
+
+    Returns:
+        dict: The booking, with start_date/end_date
+
+    Raises:
+        HTTPException: 404 unknown listing, 403 not the owner, 400 bad
+            dates, 409 overlaps an existing booking
+    """
+    from postgrest.exceptions import APIError  # loaded with the client; deferred for startup time
+
+    stay = period(start, end)
+    listing = _listing(listing_id)
+    if str(listing["owner_id"]) != str(owner_id):
+        raise HTTPException(status_code=403, detail="You can only book your own listings")
+    sb = get_supabase_admin()
+    # Expired holds still count for the exclusion constraint until they are gone
+    sb.table("listing_bookings").delete().eq("listing_id", listing_id).lt("expires_at", _now()).execute()
+    try:
+        res = sb.table("listing_bookings").insert({
+            "listing_id": listing_id,
+            "period": stay,
+            "source": source,
+            "deal_id": deal_id,
+            "expires_at": expires_at.isoformat() if expires_at else None,
+            "created_by": str(owner_id),
+            "note": note,
+        }).execute()
+    except APIError as e:
+        if e.code == EXCLUSION_VIOLATION:
+            raise HTTPException(status_code=409, detail="Those dates are already booked")
+        raise
+    return _row(res.data[0])
+
+
+def confirm_deal(deal_id: str) -> bool:
+    """
+    Make a paid deal's hold permanent.
+
+    Returns:
+        bool: False if the deal holds no dates (none given, or the hold expired first)
+    """
+    res = get_supabase_admin().table("listing_bookings").update({"expires_at": None}).eq("deal_id", deal_id).execute()
+    return bool(res.data)
+
+
+def release_deal(deal_id: str) -> None:
+    """Free the dates held by a cancelled deal."""
+    get_supabase_admin().table("listing_bookings").delete().eq("deal_id", deal_id).execute()
+
+
+def unblock(listing_id: str, booking_id: str, owner_id: str) -> None:
+    """
+    Remove an owner's block.
+
+    Raises:
+        HTTPException: 404 unknown listing or block, 403 not the owner
+    """
+    listing = _listing(listing_id)
+    if str(listing["owner_id"]) != str(owner_id):
+        raise HTTPException(status_code=403, detail="You can only change your own listings")
+    res = (
+        get_supabase_admin().table("listing_bookings")
+        .delete()
+        .eq("id", booking_id)
+        .eq("listing_id", listing_id)
+        .eq("source", "blocked")
+        .execute()
+    )
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Block not found")
@@ -0,0 +1,15 @@
+"""
+Benchmark and load-test harness for the MigRent API.
+
+Boots main.app under uvicorn against an in-process stand-in for Supabase
+(PostgREST + GoTrue) and Stripe, seeds synthetic data and drives scripted
+scenarios, reporting throughput and p50/p95/p99 per endpoint.
+
+    cd backend
+    python -m bench.run --duration 20 --concurrency 16
+    python -m bench.run --baseline bench/baseline.json          # fail on regressions
+    python -m bench.run --write-baseline bench/baseline.json    # record a new baseline
+
+See bench/run.py --help for scale and mix options, and bench/datagen.py for
+generating larger datasets to load into the fake or a scratch Postgres.
+"""
@@ -0,0 +1,21 @@
+"""
+ASGI entry point for benchmark runs: main.app with Stripe pointed at the fake.
+
+    STRIPE_API_BASE=http://127.0.0.1:54329 uvicorn bench.app:app
+"""
+
+import os
+import logging
+import stripe
+
+stripe.api_base = os.environ.get("STRIPE_API_BASE", stripe.api_base)
+
+from main import app  # noqa: E402
+from limiter import limiter  # noqa: E402
+
+# Every simulated user connects from 127.0.0.1, so per-address rate limits would throttle the whole run
+limiter.enabled = False
+
+# main configures INFO logging; per-request httpx/stripe lines would swamp the run output
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("stripe").setLevel(logging.WARNING)
@@ -0,0 +1,601 @@
+"""
+Synthetic dataset generator for scale testing.
+
+Produces auth users, profiles, listings, deals (every DealStatus), messages,
+payment events and listing availability bookings that pass the API's request models (ListingCreate,
+ProfileUpdate, DealCreate, MessageCreate) and the migration schema. Output is
+written for bulk loading rather than row-by-row inserts:
+
+  <table>.ndjson   one row per line; bench.fake_upstream loads these via
+                   POST /__bench/load/<table>
+  <table>.tsv      COPY text format, loaded by load.sql with psql \\copy
+  manifest.json    seed, as-of date and row counts
+
+Output is byte-for-byte reproducible for a given --seed and --as-of. Message
+volume is Zipf-skewed across owners (a handful end up with huge inboxes),
+bookings are Zipf-skewed across listings (the busiest hold thousands) and
+listings cluster on popular postcodes.
+
+    cd backend
+    python -m bench.datagen --out /tmp/migrent-data --listings 50000 --messages 500000
+    psql "$DATABASE_URL" -f /tmp/migrent-data/load.sql
+    python -m bench.datagen --out /tmp/migrent-data --upload http://127.0.0.1:54329
+"""
+
+import json
+import time
+import uuid
+import random
+import argparse
+from bisect import bisect
+from itertools import accumulate
+from pathlib import Path
+from datetime import date, datetime, time as dtime, timedelta, timezone
+
+import httpx
+
+from models import ListingCreate, ProfileUpdate, DealCreate, MessageCreate, DealStatus
+
+# (suburb, postcode, median weekly rent, popularity); cities follow
+# routes_listings.derive_city, plus two capitals it doesn't know about
+SUBURBS = {
+    "Sydney": [
+        ("Sydney", 2000, 520, 10), ("Ultimo", 2007, 430, 6), ("Surry Hills", 2010, 460, 7),
+        ("Bondi", 2026, 480, 5), ("Randwick", 2031, 390, 6), ("Kensington", 2033, 370, 8),
+        ("Glebe", 2037, 400, 4), ("Newtown", 2042, 410, 5), ("Chatswood", 2067, 390, 4),
+        ("Ashfield", 2131, 320, 3), ("Burwood", 2134, 330, 5), ("Strathfield", 2135, 320, 4),
+        ("Auburn", 2144, 260, 3), ("Blacktown", 2148, 240, 2), ("Parramatta", 2150, 300, 6),
+        ("Liverpool", 2170, 240, 2), ("Marrickville", 2204, 340, 3), ("Hurstville", 2220, 290, 3),
+    ],
+    "Adelaide": [
+        ("Adelaide", 5000, 340, 8), ("North Adelaide", 5006, 320, 3), ("Hindmarsh", 5007, 260, 2),
+        ("Marion", 5043, 230, 2), ("Glenelg", 5045, 300, 2), ("Unley", 5061, 280, 2),
+        ("Norwood", 5067, 290, 3), ("Prospect", 5082, 260, 2), ("Mawson Lakes", 5095, 250, 3),
+        ("Salisbury", 5108, 210, 1),
+    ],
+    "Melbourne": [("Melbourne", 3000, 450, 3), ("Carlton", 3053, 380, 2)],
+    "Brisbane": [("Brisbane City", 4000, 400, 2), ("St Lucia", 4067, 330, 1)],
+}
+
+PROPERTY_TYPES = ["apartment", "house", "townhouse", "studio", "granny_flat"]
+PLACE_TYPES = ["private_room", "shared_room", "entire_place"]
+BATHROOM_TYPES = ["private", "ensuite", "shared"]
+HIGHLIGHTS = ["near_station", "near_uni", "quiet", "sunny", "balcony", "garden", "gym", "pool", "city_views"]
+LAUNDRY = ["in_unit", "shared", "none"]
+MIN_STAY = ["1 month", "3 months", "6 months", "12 months"]
+INTERESTS = ["cooking", "hiking", "gaming", "music", "football", "reading", "photography", "yoga", "coffee", "travel"]
+LIFESTYLE = ["early_riser", "night_owl", "non_smoker", "vegetarian", "pet_lover", "social", "quiet", "student", "wfh"]
+OCCUPATIONS = ["Student", "Nurse", "Software Engineer", "Chef", "Accountant", "Barista", "Electrician", "Researcher"]
+VISA_TYPES = ["student", "working_holiday", "skilled", "graduate", "partner", "citizen", "permanent_resident"]
+LANGUAGES = ["en", "zh", "hi", "vi", "es", "ko", "ne", "pt"]
+FIRST_NAMES = ["Aarav", "Mei", "Liam", "Priya", "Hugo", "Sofia", "Minh", "Olivia", "Kenji", "Fatima", "Noah", "Isabela"]
+LAST_NAMES = ["Nguyen", "Smith", "Patel", "Chen", "Garcia", "Kim", "Singh", "Brown", "Silva", "Wang", "Tran", "Jones"]
+STREETS = ["George", "King", "Queen", "Victoria", "Church", "Railway", "Park", "High", "Station", "Elizabeth"]
+STREET_TYPES = ["St", "Rd", "Ave", "Pde", "Ln"]
+
+DESCRIPTION_PHRASES = [
+    "Bright room with a large window and built-in wardrobe.",
+    "Five minutes' walk to the train station and local shops.",
+    "Shared kitchen is fully equipped and cleaned weekly.",
+    "Friendly housemates who work and study nearby.",
+    "Quiet street, plenty of street parking.",
+    "Fast NBN internet included in the rent.",
+    "Air conditioning and heating in every bedroom.",
+    "Close to the university, buses every ten minutes.",
+    "Bills are split evenly between housemates each quarter.",
+    "Looking for a tidy, respectful person for a long stay.",
+]
+MESSAGE_PHRASES = [
+    "Hi! Is the room still available?",
+    "Could I come and inspect it this weekend?",
+    "Yes, it's still available. When would you like to move in?",
+    "Are bills included in the weekly price?",
+    "I'm a student at the nearby uni and don't smoke.",
+    "Saturday at 11am works for an inspection.",
+    "Is there space for a bike in the garage?",
+    "Thanks, I'd like to go ahead with the booking.",
+    "The bond is two weeks' rent, payable before move-in.",
+    "No worries, see you then!",
+]
+
+# Relative frequency of each deal status; every status is also guaranteed once
+DEAL_STATUS_WEIGHTS = {
+    DealStatus.initiated: 1,
+    DealStatus.awaiting_owner_payment: 4,
+    DealStatus.owner_paid: 2,
+    DealStatus.awaiting_seeker_optional: 2,
+    DealStatus.completed: 5,
+    DealStatus.cancelled: 2,
+}
+OWNER_FEE_CENTS, SEEKER_FEE_CENTS = 9900, 1900
+
+PROFILE_EXTRA_COLUMNS = ["id", "onboarding_completed", "verified", "created_at"]
+COLUMNS = {
+    "profiles": PROFILE_EXTRA_COLUMNS + [c for c in ProfileUpdate.model_fields if c not in PROFILE_EXTRA_COLUMNS],
+    "listings": ["id", "owner_id", *ListingCreate.model_fields, "suburb", "status", "created_at"],
+    "deals": [
+        "id", *DealCreate.model_fields, "status", "owner_fee_amount", "seeker_fee_amount",
+        "owner_payment_stripe_session_id", "seeker_payment_stripe_session_id", "created_at", "updated_at",
+    ],
+    "messages": ["id", *MessageCreate.model_fields, "read_at", "created_at", "updated_at"],
+    "payment_events": ["id", "deal_id", "fee_type", "stripe_session_id", "amount", "currency", "event_type", "created_at"],
+    "listing_bookings": ["id", "listing_id", "period", "source", "deal_id", "created_by", "note", "created_at"],
+}
+JSONB_COLUMNS = {"profiles": {"residential_address", "emergency_contact"}}
+AUTH_USER_COLUMNS = [
+    "instance_id", "id", "aud", "role", "email", "encrypted_password", "email_confirmed_at",
+    "raw_app_meta_data", "raw_user_meta_data", "created_at", "updated_at",
+]
+# Load order respects foreign keys
+LOAD_ORDER = ["auth_users", "profiles", "listings", "deals", "messages", "payment_events", "listing_bookings"]
+
+
+# ── Helpers ──────────────────────────────────────────────────
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _zipf_cum_weights(n: int, exponent: float) -> list[float]:
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def _pick(rng: random.Random, items: list, cum_weights: list[float]):
+    return items[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def _text(rng: random.Random, phrases: list[str], min_len: int, max_len: int, mean_sentences: float) -> str:
+    count = max(1, int(rng.expovariate(1 / mean_sentences)) + 1)
+    text = " ".join(rng.choice(phrases) for _ in range(count))
+    while len(text) < min_len:
+        text += " " + rng.choice(phrases)
+    return text[:max_len]
+
+
+class _Clock:
+    """Deterministic timestamps counting back from the as-of date."""
+
+    def __init__(self, rng: random.Random, as_of: date):
+        self.rng = rng
+        self.end = datetime.combine(as_of, dtime(), tzinfo=timezone.utc)
+
+    def within(self, days: int) -> datetime:
+        return self.end - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+
+def _iso(ts: datetime) -> str:
+    return ts.isoformat()
+
+
+# ── Row builders ─────────────────────────────────────────────
+
+
+def _auth_user(rng: random.Random, clock: _Clock, i: int, user_type: str) -> tuple[dict, dict]:
+    uid = _uuid(rng)
+    created = _iso(clock.within(540))
+    user = {
+        "id": uid,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": f"user{i}@synthetic.migrent.test",
+        "app_metadata": {"provider": "email", "providers": ["email"]},
+        "user_metadata": {"user_type": user_type},
+        "created_at": created,
+    }
+    return {"token": f"bench-{uid}", "user": user}, user
+
+
+def _profile(rng: random.Random, user: dict, user_type: str) -> dict:
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    suburbs = rng.sample([s[0] for s in SUBURBS["Sydney"] + SUBURBS["Adelaide"]], rng.randint(1, 3))
+    budget_min = rng.randrange(150, 450, 10)
+    # COPY writes every column, so fields with column defaults are set explicitly
+    update = ProfileUpdate(
+        name=f"{first} {last}",
+        legal_name=f"{first} {last}",
+        preferred_name=first,
+        about_me=_text(rng, DESCRIPTION_PHRASES, 0, 200, 1),
+        interests=rng.sample(INTERESTS, rng.randint(0, 5)),
+        occupation=rng.choice(OCCUPATIONS),
+        age=rng.randint(18, 65),
+        visa_type=rng.choice(VISA_TYPES) if user_type == "seeker" else None,
+        budget_min=budget_min if user_type == "seeker" else None,
+        budget_max=budget_min + rng.randrange(50, 400, 10) if user_type == "seeker" else None,
+        preferred_suburbs=", ".join(suburbs) if user_type == "seeker" else None,
+        move_in_date=(date.fromisoformat(user["created_at"][:10]) + timedelta(days=rng.randint(7, 90))).isoformat(),
+        lifestyle=rng.sample(LIFESTYLE, rng.randint(0, 4)),
+        phone=f"04{rng.randint(0, 99_999_999):08d}",
+        residential_address=f"{rng.randint(1, 300)} {rng.choice(STREETS)} {rng.choice(STREET_TYPES)}",
+        phones=[],
+        preferred_language=rng.choice(LANGUAGES),
+        preferred_currency="AUD",
+        timezone="Australia/Adelaide" if rng.random() < 0.25 else "Australia/Sydney",
+        wishlist=[],
+        identity_verified=False,
+        rooms_owned=rng.randint(1, 6) if user_type == "owner" else 0,
+        properties_owned=rng.randint(1, 3) if user_type == "owner" else 0,
+        notify_email=rng.random() < 0.9,
+        notify_sms=rng.random() < 0.2,
+        role=user_type,
+    )
+    return {
+        **update.model_dump(),
+        "id": user["id"],
+        "onboarding_completed": rng.random() < 0.85,
+        "verified": rng.random() < 0.3,
+        "created_at": user["created_at"],
+    }
+
+
+def _listing(rng: random.Random, clock: _Clock, owner_id: str, city: str, suburb: tuple, i: int) -> dict:
+    name, postcode, median, _ = suburb
+    place_type = rng.choice(PLACE_TYPES)
+    bedrooms = rng.randint(1, 5)
+    available_from = clock.within(60).date() + timedelta(days=rng.randint(0, 120))
+    listing = ListingCreate(
+        address=f"{rng.randint(1, 400)} {rng.choice(STREETS)} {rng.choice(STREET_TYPES)}, {name}",
+        postcode=postcode,
+        city=city,
+        weekly_price=round(min(50000, median * rng.lognormvariate(0, 0.3) * (1.8 if place_type == "entire_place" else 1)), 2),
+        description=_text(rng, DESCRIPTION_PHRASES, 10, 5000, 4),
+        images=[f"https://images.synthetic.migrent.test/{i}/{n}.webp" for n in range(rng.randint(0, 12))],
+        title=f"{place_type.replace('_', ' ').capitalize()} in {name}"[:80],
+        property_type=rng.choice(PROPERTY_TYPES),
+        place_type=place_type,
+        max_guests=rng.randint(1, 4),
+        bedrooms=bedrooms,
+        beds=rng.randint(1, bedrooms + 1),
+        bathrooms=rng.randint(1, min(5, bedrooms)),
+        bathroom_type=rng.choice(BATHROOM_TYPES),
+        total_other_people=str(rng.randint(0, 5)),
+        furnished=rng.random() < 0.7,
+        bills_included=rng.random() < 0.5,
+        parking=rng.random() < 0.3,
+        highlights=rng.sample(HIGHLIGHTS, rng.randint(0, 4)),
+        weekly_discount=rng.choice([0, 0, 0, 5, 10]),
+        monthly_discount=rng.choice([0, 0, 10, 15, 20]),
+        no_smoking=rng.random() < 0.85,
+        min_stay=rng.choice(MIN_STAY),
+        security_cameras=False,
+        weapons_on_property=False,
+        available_from=available_from.isoformat(),
+        available_to=(available_from + timedelta(days=rng.choice([90, 180, 365]))).isoformat() if rng.random() < 0.4 else None,
+        instant_book=rng.random() < 0.2,
+        internet_included=rng.random() < 0.6,
+        pets_allowed=rng.random() < 0.2,
+        air_conditioning=rng.random() < 0.5,
+        laundry=rng.choice(LAUNDRY),
+        dishwasher=rng.random() < 0.4,
+        couples_ok=rng.random() < 0.3,
+    )
+    return {
+        "id": _uuid(rng),
+        "owner_id": owner_id,
+        **listing.model_dump(),
+        "suburb": name,
+        "status": "active" if rng.random() < 0.9 else "inactive",
+        "created_at": _iso(clock.within(365)),
+    }
+
+
+def _deal(rng: random.Random, clock: _Clock, listing: dict, seeker_id: str, status: DealStatus) -> tuple[dict, list[dict]]:
+    move_in = clock.within(120).date() + timedelta(days=rng.randint(7, 60))
+    guests = rng.choice([1, 1, 1, 2])
+    deal = DealCreate(
+        owner_id=listing["owner_id"],
+        seeker_id=seeker_id,
+        listing_id=listing["id"],
+        start_date=move_in.isoformat(),
+        end_date=(move_in + timedelta(weeks=rng.choice([12, 26, 52]))).isoformat(),
+        special_requests=rng.choice([None, "Early move-in if possible", "Need a parking spot"]),
+        total_guests=guests,
+        move_in_date=move_in.isoformat(),
+        number_of_guests=guests,
+        deal_notes=rng.choice([None, "Bond paid in cash at key handover"]),
+    )
+    created = clock.within(120)
+    row = {
+        "id": _uuid(rng),
+        **deal.model_dump(),
+        "status": status.value,
+        "owner_fee_amount": OWNER_FEE_CENTS / 100,
+        "seeker_fee_amount": SEEKER_FEE_CENTS / 100,
+        "owner_payment_stripe_session_id": None,
+        "seeker_payment_stripe_session_id": None,
+        "created_at": _iso(created),
+        "updated_at": _iso(created + timedelta(hours=rng.randint(0, 72))),
+    }
+
+    events = []
+    if status is not DealStatus.initiated:
+        row["owner_payment_stripe_session_id"] = f"cs_test_{rng.getrandbits(96):024x}"
+    if status in (DealStatus.owner_paid, DealStatus.awaiting_seeker_optional, DealStatus.completed):
+        events.append(("owner", row["owner_payment_stripe_session_id"], OWNER_FEE_CENTS))
+    if status is DealStatus.completed and rng.random() < 0.6:
+        row["seeker_payment_stripe_session_id"] = f"cs_test_{rng.getrandbits(96):024x}"
+        events.append(("seeker", row["seeker_payment_stripe_session_id"], SEEKER_FEE_CENTS))
+    payments = [{
+        "id": _uuid(rng),
+        "deal_id": row["id"],
+        "fee_type": fee_type,
+        "stripe_session_id": session_id,
+        "amount": amount,
+        "currency": "aud",
+        "event_type": "checkout.session.completed",
+        "created_at": row["updated_at"],
+    } for fee_type, session_id, amount in events]
+    return row, payments
+
+
+def _booking(rng: random.Random, clock: _Clock, listing: dict, start: date) -> tuple[dict, date]:
+    """An owner-blocked stay from `start`; also returns the earliest start of the next one."""
+    end = start + timedelta(days=rng.choice([2, 3, 5, 7, 14, 28]))
+    row = {
+        "id": _uuid(rng),
+        "listing_id": listing["id"],
+        "period": f"[{start.isoformat()},{end.isoformat()})",
+        "source": "blocked",
+        "deal_id": None,
+        "created_by": listing["owner_id"],
+        "note": None,
+        "created_at": _iso(clock.within(365)),
+    }
+    return row, end + timedelta(days=rng.choice([0, 0, 1, 2, 3, 7]))
+
+
+def _conversation(rng: random.Random, clock: _Clock, listing: dict, seeker_id: str, length: int,
+                  deal_id=None) -> list[dict]:
+    owner_id = listing["owner_id"]
+    sent = clock.within(90)
+    rows = []
+    for n in range(length):
+        from_seeker = n == 0 or rng.random() < 0.5
+        message = MessageCreate(
+            sender_id=seeker_id if from_seeker else owner_id,
+            receiver_id=owner_id if from_seeker else seeker_id,
+            listing_id=listing["id"],
+            deal_id=deal_id,
+            message_text=_text(rng, MESSAGE_PHRASES, 1, 5000, 1.5),
+        )
+        read = None if n >= length - 2 and rng.random() < 0.4 else sent + timedelta(minutes=rng.randint(1, 600))
+        rows.append({
+            "id": _uuid(rng),
+            **message.model_dump(),
+            "read_at": _iso(read) if read else None,
+            "created_at": _iso(sent),
+            "updated_at": _iso(sent),
+        })
+        sent += timedelta(minutes=int(rng.expovariate(1 / 180)) + 1)
+    return rows
+
+
+# ── Writers ──────────────────────────────────────────────────
+
+
+def _copy_value(value, jsonb: bool) -> str:
+    if value is None:
+        return "\\N"
+    if jsonb:
+        text = json.dumps(value)
+    elif isinstance(value, bool):
+        text = "t" if value else "f"
+    elif isinstance(value, list):
+        text = "{" + ",".join('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in value) + "}"
+    elif isinstance(value, dict):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class _TableWriter:
+    """Streams rows to <table>.ndjson and/or <table>.tsv (COPY text format)."""
+
+    def __init__(self, out: Path, table: str, columns: list[str], formats: set[str]):
+        self.columns = columns
+        self.jsonb = JSONB_COLUMNS.get(table, set())
+        self.count = 0
+        self.ndjson = open(out / f"{table}.ndjson", "w") if "ndjson" in formats else None
+        self.tsv = open(out / f"{table}.tsv", "w") if "copy" in formats else None
+
+    def write(self, row: dict, copy_row: dict = None) -> None:
+        self.count += 1
+        if self.ndjson:
+            self.ndjson.write(json.dumps(row, separators=(",", ":")) + "\n")
+        if self.tsv:
+            source = copy_row or row
+            self.tsv.write("\t".join(_copy_value(source.get(c), c in self.jsonb) for c in self.columns) + "\n")
+
+    def close(self) -> None:
+        for f in (self.ndjson, self.tsv):
+            if f:
+                f.close()
+
+
+def _auth_copy_row(user: dict) -> dict:
+    return {
+        "instance_id": "00000000-0000-0000-0000-000000000000",
+        "id": user["id"],
+        "aud": user["aud"],
+        "role": user["role"],
+        "email": user["email"],
+        "encrypted_password": "",
+        "email_confirmed_at": user["created_at"],
+        "raw_app_meta_data": user["app_metadata"],
+        "raw_user_meta_data": user["user_metadata"],
+        "created_at": user["created_at"],
+        "updated_at": user["created_at"],
+    }
+
+
+def _write_load_sql(out: Path) -> None:
+    lines = [
+        "-- Generated by bench.datagen. Run with: psql \"$DATABASE_URL\" -f load.sql",
+        "-- Synthetic auth users have no password; they exist to satisfy foreign keys.",
+        "\\set ON_ERROR_STOP on",
+        "BEGIN;",
+    ]
+    for table in LOAD_ORDER:
+        target, columns = ("auth.users", AUTH_USER_COLUMNS) if table == "auth_users" else (table, COLUMNS[table])
+        lines.append(f"\\copy {target} ({', '.join(columns)}) FROM '{table}.tsv'")
+    lines += [
+        "COMMIT;",
+        "SELECT refresh_admin_rollups(current_date - 730);",
+        "ANALYZE profiles, listings, deals, messages, payment_events, listing_bookings;",
+    ]
+    (out / "load.sql").write_text("\n".join(lines) + "\n")
+
+
+# ── Generation ───────────────────────────────────────────────
+
+
+def generate(out: Path, users: int, listings: int, deals: int, messages: int, seed: int = 1,
+             as_of: date = None, owner_share: float = 0.25, skew: float = 1.1,
+             formats: frozenset = frozenset({"ndjson", "copy"}), bookings: int = 0) -> dict:
+    """
+    Write a dataset to `out` and return its manifest.
+
+    Owners get listings and inbound messages with Zipf(`skew`) weights, so the
+    busiest owners hold a large share of all threads; `bookings` are spread
+    over listings the same way, back to back from each listing's
+    available_from.
+    """
+    as_of = as_of or datetime.now(timezone.utc).date()
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    clock = _Clock(rng, as_of)
+    writers = {
+        "auth_users": _TableWriter(out, "auth_users", AUTH_USER_COLUMNS, formats),
+        **{t: _TableWriter(out, t, cols, formats) for t, cols in COLUMNS.items()},
+    }
+
+    owners, seekers = [], []
+    n_owners = max(1, round(users * owner_share))
+    for i in range(max(users, n_owners + 1)):
+        user_type = "owner" if i < n_owners else "seeker"
+        entry, user = _auth_user(rng, clock, i, user_type)
+        writers["auth_users"].write(entry, _auth_copy_row(user))
+        writers["profiles"].write(_profile(rng, user, user_type))
+        (owners if user_type == "owner" else seekers).append(user["id"])
+    rng.shuffle(owners)
+    owner_weights = _zipf_cum_weights(len(owners), skew)
+    seeker_weights = _zipf_cum_weights(len(seekers), 0.6)
+
+    locations = [(city, s) for city, suburbs in SUBURBS.items() for s in suburbs]
+    location_weights = list(accumulate(s[3] for _, s in locations))
+    listings_by_owner: dict[str, list[dict]] = {}
+    booking_starts: dict[str, date] = {}
+    for i in range(listings):
+        owner_id = owners[i] if i < len(owners) else _pick(rng, owners, owner_weights)
+        city, suburb = _pick(rng, locations, location_weights)
+        row = _listing(rng, clock, owner_id, city, suburb, i)
+        writers["listings"].write(row)
+        listings_by_owner.setdefault(owner_id, []).append({"id": row["id"], "owner_id": owner_id})
+        booking_starts[row["id"]] = date.fromisoformat(row["available_from"])
+
+    listed_owners = [o for o in owners if o in listings_by_owner]
+    listed_weights = _zipf_cum_weights(len(listed_owners), skew)
+
+    def pick_thread() -> tuple[dict, str]:
+        listing = rng.choice(listings_by_owner[_pick(rng, listed_owners, listed_weights)])
+        return listing, _pick(rng, seekers, seeker_weights)
+
+    statuses = list(DEAL_STATUS_WEIGHTS)
+    status_weights = list(accumulate(DEAL_STATUS_WEIGHTS.values()))
+    remaining = messages
+    for i in range(deals if listed_owners else 0):
+        status = statuses[i] if i < len(statuses) else _pick(rng, statuses, status_weights)
+        listing, seeker_id = pick_thread()
+        deal, payments = _deal(rng, clock, listing, seeker_id, status)
+        writers["deals"].write(deal)
+        for payment in payments:
+            writers["payment_events"].write(payment)
+        length = min(remaining, rng.randint(2, 12))
+        for message in _conversation(rng, clock, listing, seeker_id, length, deal["id"]):
+            writers["messages"].write(message)
+        remaining -= length
+
+    while remaining > 0 and listed_owners:
+        listing, seeker_id = pick_thread()
+        length = min(remaining, 1 + int(rng.expovariate(1 / 5)))
+        for message in _conversation(rng, clock, listing, seeker_id, length):
+            writers["messages"].write(message)
+        remaining -= length
+
+    # Drawn last so the other tables stay identical for a given seed
+    booked = [listing for owned in listings_by_owner.values() for listing in owned]
+    booked_weights = _zipf_cum_weights(len(booked), skew)
+    for _ in range(bookings if booked else 0):
+        listing = _pick(rng, booked, booked_weights)
+        row, booking_starts[listing["id"]] = _booking(rng, clock, listing, booking_starts[listing["id"]])
+        writers["listing_bookings"].write(row)
+
+    for writer in writers.values():
+        writer.close()
+    if "copy" in formats:
+        _write_load_sql(out)
+
+    manifest = {
+        "seed": seed,
+        "as_of": as_of.isoformat(),
+        "skew": skew,
+        "formats": sorted(formats),
+        "counts": {t: w.count for t, w in writers.items()},
+    }
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n")
+    return manifest
+
+
+def _chunks(path: Path, size: int = 1 << 20):
+    with open(path, "rb") as f:
+        while chunk := f.read(size):
+            yield chunk
+
+
+def upload(out: Path, upstream_url: str) -> dict:
+    """Stream the NDJSON files into bench.fake_upstream, in foreign-key order."""
+    counts = {}
+    with httpx.Client(base_url=upstream_url, timeout=600) as client:
+        for table in LOAD_ORDER:
+            if not (out / f"{table}.ndjson").exists():
+                continue  # generated before the table existed
+            res = client.post(f"/__bench/load/{table}", content=_chunks(out / f"{table}.ndjson"))
+            res.raise_for_status()
+            counts[table] = res.json()["rows"]
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic MigRent dataset")
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--listings", type=int, default=20000)
+    parser.add_argument("--deals", type=int, default=4000)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--bookings", type=int, default=50000, help="listing availability bookings")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--as-of", type=date.fromisoformat, help="date timestamps count back from (default today, UTC)")
+    parser.add_argument("--owner-share", type=float, default=0.25, help="fraction of users who are owners")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for per-owner listing and message volume")
+    parser.add_argument("--format", default="ndjson,copy", help="comma-separated: ndjson, copy")
+    parser.add_argument("--upload", metavar="URL", help="load the NDJSON output into a running bench.fake_upstream")
+    args = parser.parse_args()
+
+    formats = frozenset(f.strip() for f in args.format.split(","))
+    if not formats <= {"ndjson", "copy"} or (args.upload and "ndjson" not in formats):
+        raise SystemExit("--format takes ndjson and/or copy (--upload needs ndjson)")
+
+    out = Path(args.out)
+    started = time.perf_counter()
+    manifest = generate(
+        out, args.users, args.listings, args.deals, args.messages, args.seed,
+        args.as_of, args.owner_share, args.skew, formats, args.bookings,
+    )
+    print(f"Generated {manifest['counts']} in {time.perf_counter() - started:.1f}s → {out}")
+    if args.upload:
+        print(f"Uploaded {upload(out, args.upload)}")
+
+
+if __name__ == "__main__":
+    main()
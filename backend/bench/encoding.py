@@ -0,0 +1,140 @@
+"""
+Payload encoding benchmark for GET /listings and GET /messages/threads.
+
+Boots the same stack as bench.run and fetches each payload with
+Accept-Encoding identity, gzip and br to record wire size and latency through
+the real middleware. It then times serialization (stdlib json, as Starlette's
+JSONResponse does it, vs orjson) and compression (gzip levels, brotli
+qualities) in-process on the same payloads.
+
+    cd backend
+    python -m bench.encoding --listings 5000 --messages 50000
+"""
+
+import gzip
+import json
+import time
+import argparse
+import tempfile
+import statistics
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import orjson
+
+from bench import datagen
+from bench.run import load_context, serve
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def _busiest_owner(dataset: Path, owners: list[dict]) -> dict:
+    owner_ids = {o["id"] for o in owners}
+    inbox = Counter()
+    with open(dataset / "messages.ndjson") as f:
+        for line in f:
+            receiver = json.loads(line)["receiver_id"]
+            if receiver in owner_ids:
+                inbox[receiver] += 1
+    busiest = inbox.most_common(1)[0][0]
+    return next(o for o in owners if o["id"] == busiest)
+
+
+def measure_wire(client: httpx.Client, path: str, headers: dict, repeat: int) -> tuple[dict, bytes]:
+    """Per Accept-Encoding: bytes on the wire and median latency. Also returns the identity body."""
+    results, body = {}, b""
+    for encoding in ("identity", "gzip", "br"):
+        latencies, wire = [], 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with client.stream("GET", path, headers={**headers, "Accept-Encoding": encoding}) as res:
+                res.raise_for_status()
+                raw = b"".join(res.iter_raw())
+            latencies.append(time.perf_counter() - start)
+            wire = len(raw)
+            if encoding == "identity":
+                body = raw
+        results[encoding] = {"bytes": wire, "p50_ms": round(statistics.median(latencies) * 1000, 2)}
+    return results, body
+
+
+def measure_encoding(payload, repeat: int) -> dict:
+    """Serialize and compress `payload` in-process; sizes in bytes, times in ms."""
+    stdlib = lambda: json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    raw = orjson.dumps(payload)
+    results = {
+        "json": {"bytes": len(stdlib()), "ms": _best_ms(stdlib, repeat)},
+        "orjson": {"bytes": len(raw), "ms": _best_ms(lambda: orjson.dumps(payload), repeat)},
+    }
+    for level in (1, 6, 9):
+        results[f"gzip-{level}"] = {
+            "bytes": len(gzip.compress(raw, level)),
+            "ms": _best_ms(lambda: gzip.compress(raw, level), repeat),
+        }
+    if brotli:
+        for quality in (1, 4, 6, 11):
+            results[f"br-{quality}"] = {
+                "bytes": len(brotli.compress(raw, quality=quality)),
+                "ms": _best_ms(lambda: brotli.compress(raw, quality=quality), max(1, repeat // 5)),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark response serialization and compression")
+    parser.add_argument("--dataset", help="bench.datagen output directory to load instead of generating one")
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--listings", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--upstream-latency-ms", type=float, default=0)
+    parser.add_argument("--output", help="also write results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="migrent-bench-") as scratch:
+        dataset = Path(args.dataset) if args.dataset else Path(scratch)
+        if not args.dataset:
+            datagen.generate(dataset, args.users, args.listings, 0, args.messages, args.seed,
+                             formats=frozenset({"ndjson"}))
+        ctx = load_context(dataset)
+        owner = _busiest_owner(dataset, ctx.owners)
+        payloads = {
+            "GET /listings?city=Sydney": ("/listings?city=Sydney", {}),
+            "GET /messages/threads (busiest inbox)": ("/messages/threads", {"Authorization": f"Bearer {owner['token']}"}),
+        }
+
+        results = {}
+        with serve(dataset, args.upstream_latency_ms) as api_url, httpx.Client(base_url=api_url, timeout=120) as client:
+            for label, (path, headers) in payloads.items():
+                wire, body = measure_wire(client, path, headers, args.repeat)
+                results[label] = {"wire": wire, "encode": measure_encoding(orjson.loads(body), args.repeat)}
+
+    for label, result in results.items():
+        print(f"\n{label}")
+        print(f"  {'over HTTP':<12}{'bytes':>12}{'p50 ms':>10}")
+        for encoding, r in result["wire"].items():
+            print(f"  {encoding:<12}{r['bytes']:>12}{r['p50_ms']:>10}")
+        print(f"  {'in-process':<12}{'bytes':>12}{'best ms':>10}")
+        for name, r in result["encode"].items():
+            print(f"  {name:<12}{r['bytes']:>12}{r['ms']:>10}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
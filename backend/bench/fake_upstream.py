@@ -0,0 +1,623 @@
+"""
+In-memory stand-in for the upstream services the API talks to.
+
+One ASGI app serving:
+  /rest/v1/<table>       PostgREST subset (filters, or/and groups, select,
+                         order, limit/offset, insert/upsert/update/delete,
+                         return=representation, single-object responses)
+  /rest/v1/rpc/<fn>      The Postgres functions the backend calls
+  /auth/v1/user          GoTrue token → user lookup
+  /v1/checkout/sessions  Stripe Checkout Session create
+  /__bench/*             Seeding (JSON or streamed NDJSON) and reset hooks
+
+It implements just enough of each API for the routers in this repo, not the
+full protocols. FAKE_UPSTREAM_LATENCY_MS adds a per-call delay so network
+round-trips (and N+1 patterns) show up in the numbers.
+
+    python -m bench.fake_upstream --port 54329
+"""
+
+import os
+import re
+import json
+import math
+import uuid
+import asyncio
+import argparse
+from urllib.parse import parse_qsl
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+LATENCY_S = float(os.environ.get("FAKE_UPSTREAM_LATENCY_MS", "2")) / 1000
+
+# Tables keyed by primary key "id" (insertion ordered)
+TABLES: dict[str, dict[str, dict]] = {}
+# GoTrue users keyed by access token
+USERS_BY_TOKEN: dict[str, dict] = {}
+
+LOCKED_ERROR = "PT403"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _table(name: str) -> dict[str, dict]:
+    return TABLES.setdefault(name, {})
+
+
+def _error(status: int, code: str, message: str) -> JSONResponse:
+    return JSONResponse({"code": code, "message": message, "details": None, "hint": None}, status_code=status)
+
+
+# ── Filters ──────────────────────────────────────────────────
+
+
+def _split_top(s: str) -> list[str]:
+    """Split on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, cur = [], 0, False, []
+    for ch in s:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(cur))
+            cur = []
+        else:
+            cur.append(ch)
+    if cur:
+        parts.append("".join(cur))
+    return parts
+
+
+def _coerce(stored: Any, raw: str) -> Any:
+    raw = raw.strip('"')
+    if isinstance(stored, bool):
+        return raw.lower() == "true"
+    if isinstance(stored, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _range(text: str) -> tuple[str, str]:
+    """[lower, upper) of a canonical daterange literal; ISO dates compare as strings."""
+    lower, _, upper = text.strip('"')[1:-1].partition(",")
+    return lower, upper or "9999-12-31"
+
+
+def _overlaps(a: tuple[str, str], b: tuple[str, str]) -> bool:
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def _compare(value: Any, op: str, raw: str) -> bool:
+    if op == "is":
+        if raw == "null":
+            return value is None
+        return value is (raw.lower() == "true")
+    if value is None:
+        return False
+    if op in ("like", "ilike"):
+        pattern = "^" + re.escape(raw.strip('"')).replace("\\*", ".*").replace("%", ".*") + "$"
+        return re.match(pattern, str(value), re.IGNORECASE if op == "ilike" else 0) is not None
+    if op == "ov" and raw.startswith(("[", "(")):
+        return _overlaps(_range(str(value)), _range(raw))
+    if op == "cs":
+        wanted = [o.strip('"') for o in _split_top(raw.strip("{}"))]
+        return isinstance(value, list) and all(w in map(str, value) for w in wanted)
+    target = _coerce(value, raw)
+    if isinstance(target, float) and isinstance(value, (int, float)):
+        lhs = float(value)
+    else:
+        lhs, target = str(value), str(target)
+    return {
+        "eq": lhs == target,
+        "neq": lhs != target,
+        "gt": lhs > target,
+        "gte": lhs >= target,
+        "lt": lhs < target,
+        "lte": lhs <= target,
+    }[op]
+
+
+def _condition(expr: str):
+    """Compile "col.op.value", "not.col.op.value", "and(...)" or "or(...)"."""
+    for group in ("and", "or", "not.and", "not.or"):
+        if expr.startswith(group + "("):
+            inner = [_condition(e) for e in _split_top(expr[len(group) + 1:-1])]
+            combine = all if group.endswith("and") else any
+            negate = group.startswith("not.")
+            return lambda row: combine(c(row) for c in inner) != negate
+    negate = expr.startswith("not.")
+    if negate:
+        expr = expr[4:]
+    col, op, raw = expr.split(".", 2)
+    if op == "in":
+        options = {o.strip('"') for o in _split_top(raw.strip("()"))}
+        return lambda row: (row.get(col) is not None and str(row.get(col)) in options) != negate
+    return lambda row: _compare(row.get(col), op, raw) != negate
+
+
+def _param_expr(name: str, value: str) -> str:
+    if name in ("or", "and"):
+        return f"{name}{value}"
+    return f"{name}.{value}"
+
+
+RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+# Lazily built equality indexes: table -> column -> value -> {id: row}
+INDEXES: dict[str, dict[str, dict[str, dict[str, dict]]]] = {}
+
+
+def _key(value: Any) -> str:
+    """Index key for a column value; booleans match filters in any case (supabase-py sends eq.True)."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _index(table: str, col: str) -> dict[str, dict[str, dict]]:
+    by_col = INDEXES.setdefault(table, {})
+    if col not in by_col:
+        index: dict[str, dict[str, dict]] = {}
+        for row in _table(table).values():
+            index.setdefault(_key(row.get(col)), {})[row["id"]] = row
+        by_col[col] = index
+    return by_col[col]
+
+
+def _reindex(table: str, row: dict, before: Optional[dict]) -> None:
+    """Keep built indexes in step with an insert (before=None), update or delete (row={})."""
+    for col, index in INDEXES.get(table, {}).items():
+        if before is not None:
+            index.get(_key(before.get(col)), {}).pop(before["id"], None)
+        if row:
+            index.setdefault(_key(row.get(col)), {})[row["id"]] = row
+
+
+def _candidates(table: str, expr: str) -> Optional[dict[str, dict]]:
+    """Rows that can match `expr` via an eq index, or None if it needs a full scan."""
+    if expr.startswith("and("):
+        for part in _split_top(expr[4:-1]):
+            found = _candidates(table, part)
+            if found is not None:
+                return found
+        return None
+    if expr.startswith("or("):
+        merged: dict[str, dict] = {}
+        for part in _split_top(expr[3:-1]):
+            found = _candidates(table, part)
+            if found is None:
+                return None
+            merged.update(found)
+        return merged
+    col, _, rest = expr.partition(".")
+    if col != "not" and rest.startswith("in."):
+        # Union of the eq lookups, like an index scan on `col = ANY(...)`
+        merged = {}
+        for option in _split_top(rest[3:].strip("()")):
+            merged.update(_candidates(table, f"{col}.eq.{option}") or {})
+        return merged
+    if col == "not" or not rest.startswith("eq."):
+        return None
+    value = rest[3:].strip('"')
+    if value.lower() in ("true", "false"):
+        value = value.lower()
+    if col == "id":
+        row = _table(table).get(value)
+        return {value: row} if row else {}
+    return _index(table, col).get(value, {})
+
+
+def _filtered(table: str, params) -> list[dict]:
+    exprs = [_param_expr(k, v) for k, v in params.multi_items() if k not in RESERVED]
+    rows = None
+    for expr in exprs:
+        rows = _candidates(table, expr)
+        if rows is not None:
+            break
+    if rows is None:
+        rows = _table(table)
+    conditions = [_condition(e) for e in exprs]
+    # Keep insertion order so unordered selects behave like a heap scan
+    return [row for row in rows.values() if all(c(row) for c in conditions)]
+
+
+def _ordered(rows: list[dict], order: Optional[str]) -> list[dict]:
+    if not order:
+        return rows
+    for term in reversed(order.split(",")):
+        col, *mods = term.split(".")
+        desc = "desc" in mods
+        rows = sorted(rows, key=lambda r: (r.get(col) is None, r.get(col) if r.get(col) is not None else ""), reverse=desc)
+    return rows
+
+
+def _projected(rows: list[dict], select: Optional[str]) -> list[dict]:
+    if not select or select.strip() == "*":
+        return rows
+    cols = [c.strip() for c in _split_top(select) if "(" not in c]
+    if "*" in cols:
+        return rows
+    return [{c: r.get(c) for c in cols} for r in rows]
+
+
+def _respond(request: Request, rows: list[dict], status: int = 200) -> Response:
+    if "vnd.pgrst.object" in request.headers.get("accept", ""):
+        if len(rows) != 1:
+            return _error(406, "PGRST116", "JSON object requested, multiple (or no) rows returned")
+        return JSONResponse(rows[0], status_code=status)
+    headers = {"content-range": f"0-{len(rows) - 1}/*" if rows else "*/0"}
+    return JSONResponse(rows, status_code=status, headers=headers)
+
+
+# ── PostgREST ────────────────────────────────────────────────
+
+
+# EXCLUDE USING gist (<key> WITH =, <range> WITH &&) constraints
+EXCLUSIONS = {"listing_bookings": ("listing_id", "period")}
+
+
+class ExclusionViolation(Exception):
+    pass
+
+
+def _check_exclusion(table: str, row: dict) -> None:
+    if table not in EXCLUSIONS:
+        return
+    key, col = EXCLUSIONS[table]
+    span = _range(row[col])
+    for other in _index(table, key).get(_key(row.get(key)), {}).values():
+        if other["id"] != row["id"] and _overlaps(span, _range(other[col])):
+            raise ExclusionViolation(f"{table}: {row[col]} overlaps {other[col]}")
+
+
+def _insert(table: str, row: dict, upsert: bool) -> dict:
+    rows = _table(table)
+    row = dict(row)
+    row.setdefault("id", str(uuid.uuid4()))
+    row["id"] = str(row["id"])
+    _check_exclusion(table, row)
+    if row["id"] in rows:
+        if not upsert:
+            raise KeyError(row["id"])
+        before = dict(rows[row["id"]])
+        rows[row["id"]].update(row)
+        _reindex(table, rows[row["id"]], before)
+        return rows[row["id"]]
+    row.setdefault("created_at", _now())
+    rows[row["id"]] = row
+    _reindex(table, row, None)
+    return row
+
+
+async def rest_table(request: Request) -> Response:
+    await asyncio.sleep(LATENCY_S)
+    table = request.path_params["table"]
+    params = request.query_params
+    prefer = request.headers.get("prefer", "")
+
+    if request.method in ("GET", "HEAD"):
+        rows = _ordered(_filtered(table, params), params.get("order"))
+        offset = int(params.get("offset", 0))
+        if "limit" in params:
+            rows = rows[offset:offset + int(params["limit"])]
+        elif offset:
+            rows = rows[offset:]
+        return _respond(request, _projected(rows, params.get("select")))
+
+    if request.method == "POST":
+        body = await request.json()
+        upsert = "merge-duplicates" in prefer
+        try:
+            written = [_insert(table, r, upsert) for r in (body if isinstance(body, list) else [body])]
+        except KeyError as e:
+            return _error(409, "23505", f"duplicate key value violates unique constraint ({e})")
+        except ExclusionViolation as e:
+            return _error(409, "23P01", f"conflicting key value violates exclusion constraint ({e})")
+        if "return=minimal" in prefer:
+            return Response(status_code=201)
+        return _respond(request, _projected(written, params.get("select")), 201)
+
+    if request.method == "PATCH":
+        body = await request.json()
+        rows = _filtered(table, params)
+        for row in rows:
+            before = dict(row)
+            row.update(body)
+            _reindex(table, row, before)
+        return _respond(request, _projected(rows, params.get("select")))
+
+    if request.method == "DELETE":
+        rows = _filtered(table, params)
+        store = _table(table)
+        for row in rows:
+            store.pop(row["id"], None)
+            _reindex(table, {}, row)
+        return _respond(request, rows)
+
+    return _error(405, "PGRST000", "Method not allowed")
+
+
+def _rpc_get_or_create_profile(args: dict):
+    profiles = _table("profiles")
+    uid = str(args["p_id"])
+    if uid not in profiles:
+        _insert("profiles", {"id": uid, "onboarding_completed": False}, upsert=False)
+    return [profiles[uid]]
+
+
+def _rpc_save_profile(args: dict):
+    uid = str(args["p_id"])
+    updates = args.get("p_updates") or {}
+    existing = _table("profiles").get(uid)
+    if existing and existing.get("onboarding_completed"):
+        blocked = sorted(set(updates) & set(args.get("p_locked") or []))
+        if blocked:
+            return _error(403, LOCKED_ERROR, f"Cannot modify fields after onboarding: {', '.join(blocked)}")
+    return [_insert("profiles", {**updates, "id": uid}, upsert=True)]
+
+
+def _rpc_similar_listing_images(args: dict):
+    owner, limit = str(args["p_owner_id"]), int(args.get("p_max_distance", 6))
+    found = []
+    for phash in args["p_phashes"]:
+        for row in _table("listing_images").values():
+            distance = bin((row["phash"] ^ phash) & (2 ** 64 - 1)).count("1")
+            if str(row["owner_id"]) != owner and distance <= limit:
+                found.append({"phash": phash, "listing_id": row["listing_id"], "distance": distance})
+    return found
+
+
+def _rpc_attachment_usage(args: dict):
+    day_ago = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+    rows = [r for r in _table("message_attachments").values() if str(r["user_id"]) == str(args["p_user_id"])]
+    return [{
+        "day_bytes": sum(r["size"] for r in rows if r["created_at"] > day_ago),
+        "total_bytes": sum(r["size"] for r in rows),
+    }]
+
+
+def _rpc_unread_message_counts(args: dict):
+    rows = [m for m in _index("messages", "receiver_id").get(_key(args["p_user_id"]), {}).values() if m.get("read_at") is None]
+    return [{"total": len(rows), "threads": len({(m["sender_id"], m.get("listing_id")) for m in rows})}]
+
+
+def _free(listing: dict, start: str, end: str) -> list[dict]:
+    if listing.get("available_from"):
+        start = max(start, listing["available_from"][:10])
+    if listing.get("available_to"):
+        end = min(end, (date.fromisoformat(listing["available_to"][:10]) + timedelta(days=1)).isoformat())
+    booked = sorted(_range(b["period"]) for b in _index("listing_bookings", "listing_id").get(listing["id"], {}).values())
+    windows, cursor = [], start
+    for lower, upper in booked:
+        if lower >= end:
+            break
+        if lower > cursor:
+            windows.append({"start_date": cursor, "end_date": lower})
+        cursor = max(cursor, upper)
+    if cursor < end:
+        windows.append({"start_date": cursor, "end_date": end})
+    return windows
+
+
+def _rpc_listing_free_windows(args: dict):
+    listing = _table("listings").get(str(args["p_listing_id"]))
+    return _free(listing, args["p_start"], args["p_end"]) if listing else []
+
+
+def _rpc_search_available_listings(args: dict):
+    move_in, move_out = args["p_move_in"], args.get("p_move_out")
+    stay = (move_in, move_out or "9999-12-31")
+    last_night = (date.fromisoformat(move_out) - timedelta(days=1)).isoformat() if move_out else None
+    rows = _index("listings", "city").get(args["p_city"], {}) if args.get("p_city") else _table("listings")
+    found = []
+    for row in rows.values():
+        if args.get("p_min_price") is not None and row["weekly_price"] < args["p_min_price"]:
+            continue
+        if args.get("p_max_price") is not None and row["weekly_price"] > args["p_max_price"]:
+            continue
+        if args.get("p_owner_id") and str(row["owner_id"]) != str(args["p_owner_id"]):
+            continue
+        if row.get("available_from") and row["available_from"][:10] > move_in:
+            continue
+        if row.get("available_to") and (not last_night or row["available_to"][:10] < last_night):
+            continue
+        bookings = _index("listing_bookings", "listing_id").get(row["id"], {}).values()
+        if not any(_overlaps(stay, _range(b["period"])) for b in bookings):
+            found.append(row)
+    return found
+
+
+VIEW_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _rpc_record_listing_views(args: dict):
+    """Same upsert as migration 025: counts add up, trending is a log2 sum scaled to VIEW_EPOCH."""
+    now = datetime.now(timezone.utc)
+    offset = (now - VIEW_EPOCH).total_seconds() / 86400
+    counts = _table("listing_view_counts")
+    for r in sorted(args["p_rows"], key=lambda r: r["listing_id"]):
+        listing = _table("listings").get(str(r["listing_id"]))
+        weight = r["views"] + 0.05 * r["impressions"]
+        if listing is None or weight <= 0:
+            continue
+        trending = math.log2(weight) + offset
+        row = counts.get(listing["id"], {"views": 0, "impressions": 0, "last_viewed_at": None})
+        if "trending" in row:
+            hi, lo = max(row["trending"], trending), min(row["trending"], trending)
+            trending = hi + math.log2(1 + 2 ** (lo - hi))
+        _insert("listing_view_counts", {
+            "id": listing["id"],
+            "listing_id": listing["id"],
+            "city": listing.get("city"),
+            "views": row["views"] + r["views"],
+            "impressions": row["impressions"] + r["impressions"],
+            "trending": trending,
+            "last_viewed_at": now.isoformat() if r["views"] else row["last_viewed_at"],
+            "updated_at": now.isoformat(),
+        }, upsert=True)
+    return []
+
+
+def _rpc_append_listing_images(args: dict):
+    """Same append as migration 029: skips described sources, PT400 past p_max_images."""
+    listing = _table("listings").get(str(args["p_listing_id"]))
+    if listing is None:
+        return [{"images": None, "image_variants": None}]
+    images = list(listing.get("images") or [])
+    variants = list(listing.get("image_variants") or [])
+    described = {v.get("source") for v in variants}
+    images += [i for i in args.get("p_images") or [] if i not in images and i not in described]
+    variants += [v for v in args.get("p_variants") or [] if v.get("source") not in described]
+    limit = args.get("p_max_images")
+    if limit is not None and len(images) > limit:
+        return _error(400, "PT400", f"A listing can have at most {limit} photos")
+    row = _insert("listings", {**listing, "images": images, "image_variants": variants}, upsert=True)
+    return [{"images": row["images"], "image_variants": row["image_variants"]}]
+
+
+RPC = {
+    "get_or_create_profile": _rpc_get_or_create_profile,
+    "save_profile": _rpc_save_profile,
+    "similar_listing_images": _rpc_similar_listing_images,
+    "attachment_usage": _rpc_attachment_usage,
+    "listing_free_windows": _rpc_listing_free_windows,
+    "search_available_listings": _rpc_search_available_listings,
+    "record_listing_views": _rpc_record_listing_views,
+    "append_listing_images": _rpc_append_listing_images,
+    "unread_message_counts": _rpc_unread_message_counts,
+}
+
+
+async def rest_rpc(request: Request) -> Response:
+    await asyncio.sleep(LATENCY_S)
+    fn = RPC.get(request.path_params["fn"])
+    if fn is None:
+        return _error(404, "PGRST202", f"Could not find the function {request.path_params['fn']}")
+    args = await request.json() if request.method == "POST" else dict(request.query_params)
+    result = fn(args)
+    if isinstance(result, Response):
+        return result
+    return _respond(request, result)
+
+
+# ── GoTrue ───────────────────────────────────────────────────
+
+
+async def auth_user(request: Request) -> Response:
+    await asyncio.sleep(LATENCY_S)
+    token = request.headers.get("authorization", "").removeprefix("Bearer ")
+    user = USERS_BY_TOKEN.get(token)
+    if user is None:
+        return JSONResponse({"code": 401, "msg": "invalid JWT"}, status_code=401)
+    return JSONResponse(user)
+
+
+# ── Stripe ───────────────────────────────────────────────────
+
+
+async def stripe_checkout_session(request: Request) -> Response:
+    await asyncio.sleep(LATENCY_S)
+    # Parsed by hand so the bench doesn't need python-multipart
+    form = dict(parse_qsl((await request.body()).decode()))
+    metadata = {k[len("metadata["):-1]: v for k, v in form.items() if k.startswith("metadata[")}
+    session_id = f"cs_test_{uuid.uuid4().hex}"
+    return JSONResponse({
+        "id": session_id,
+        "object": "checkout.session",
+        "url": f"https://checkout.stripe.test/{session_id}",
+        "metadata": metadata,
+        "amount_total": int(form.get("line_items[0][price_data][unit_amount]", 0) or 0),
+        "currency": "aud",
+        "mode": "payment",
+    })
+
+
+# ── Bench hooks ──────────────────────────────────────────────
+
+
+def _load_row(name: str, row: dict) -> None:
+    if name == "auth_users":
+        USERS_BY_TOKEN[row["token"]] = row["user"]
+        return
+    row.setdefault("created_at", _now())
+    row["id"] = str(row["id"])
+    _table(name)[row["id"]] = row
+
+
+async def bench_seed(request: Request) -> Response:
+    """Bulk load: {"tables": {name: [rows]}, "users": [{"token", "user"}]}"""
+    body = await request.json()
+    for name, rows in body.get("tables", {}).items():
+        for row in rows:
+            _load_row(name, row)
+        INDEXES.pop(name, None)
+    for entry in body.get("users", []):
+        _load_row("auth_users", entry)
+    return JSONResponse({t: len(rows) for t, rows in TABLES.items()})
+
+
+async def bench_load(request: Request) -> Response:
+    """Streamed NDJSON load into one table ("auth_users" rows are {"token", "user"})."""
+    name = request.path_params["table"]
+    count, pending = 0, b""
+    async for chunk in request.stream():
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                _load_row(name, json.loads(line))
+                count += 1
+    if pending.strip():
+        _load_row(name, json.loads(pending))
+        count += 1
+    INDEXES.pop(name, None)
+    return JSONResponse({"table": name, "rows": count})
+
+
+async def bench_reset(request: Request) -> Response:
+    TABLES.clear()
+    INDEXES.clear()
+    USERS_BY_TOKEN.clear()
+    return JSONResponse({"status": "ok"})
+
+
+async def bench_stats(request: Request) -> Response:
+    return JSONResponse({t: len(rows) for t, rows in TABLES.items()})
+
+
+app = Starlette(routes=[
+    Route("/rest/v1/rpc/{fn}", rest_rpc, methods=["GET", "POST"]),
+    Route("/rest/v1/{table}", rest_table, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+    Route("/auth/v1/user", auth_user, methods=["GET"]),
+    Route("/v1/checkout/sessions", stripe_checkout_session, methods=["POST"]),
+    Route("/__bench/seed", bench_seed, methods=["POST"]),
+    Route("/__bench/load/{table}", bench_load, methods=["POST"]),
+    Route("/__bench/reset", bench_reset, methods=["POST"]),
+    Route("/__bench/stats", bench_stats, methods=["GET"]),
+])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Supabase/Stripe upstream for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54329)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
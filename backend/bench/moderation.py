@@ -0,0 +1,113 @@
+"""
+Moderation throughput benchmark.
+
+Scans synthetic 5,000-character messages (the MessageCreate maximum) with the
+compiled automaton and, for comparison, with the one-regex-per-pattern
+approach of frontend/lib/profanityFilter.ts. Normalization and the automaton
+scan are also timed on their own.
+
+    cd backend
+    python -m bench.moderation --messages 2000 --length 5000
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+
+import moderation
+
+# frontend/lib/profanityFilter.ts, for comparison
+FRONTEND_PATTERNS = [re.compile(p, re.I) for p in (
+    r"\bn[i1!|]gg", r"\bf[a@]gg", r"\bk[i1!|]ke\b", r"\bch[i1!|]nk\b", r"\bsp[i1!|]c\b",
+    r"\bwetback", r"\btowelhead", r"\bcamel\s*jockey", r"\bwire\s*transfer\b",
+    r"\bwestern\s*union\b", r"\bsend\s*money\s*first\b", r"\bpay\s*before\s*viewing\b",
+    r"\bno\s*inspection\s*needed\b", r"\bbitcoin\b", r"\bcrypto\s*only\b",
+)]
+
+WORDS = (
+    "hi there the room is still available inspection on saturday works for me rent is weekly "
+    "bond four weeks bills included close to the station quiet street happy to chat can you "
+    "send photos of the kitchen parking out front western suburbs unit street money first "
+    "week free wifi transfer station viewing times spicy food night market"
+).split()
+
+
+def make_messages(count: int, length: int, hit_rate: float, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    phrases = ["send money first", "w3stern union", "bitcoin", "pay before viewing"]
+    messages = []
+    for _ in range(count):
+        words = []
+        size = 0
+        while size < length:
+            word = rng.choice(WORDS)
+            if rng.random() < 0.1:
+                word = word.capitalize() + rng.choice(",.!?")
+            words.append(word)
+            size += len(word) + 1
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(phrases))
+        messages.append(" ".join(words)[:length])
+    return messages
+
+
+def _time_each(fn, messages: list[str]) -> list[float]:
+    timings = []
+    for text in messages:
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _summary(timings: list[float], total_chars: int) -> dict:
+    ordered = sorted(timings)
+    total = sum(timings)
+    return {
+        "p50_us": round(statistics.median(ordered) * 1e6, 1),
+        "p99_us": round(ordered[int(len(ordered) * 0.99) - 1] * 1e6, 1),
+        "msgs_per_s": round(len(timings) / total),
+        "mb_per_s": round(total_chars / total / 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the moderation matcher")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--length", type=int, default=5000)
+    parser.add_argument("--hit-rate", type=float, default=0.05, help="fraction of messages containing a blocked phrase")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write results as JSON")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, args.length, args.hit_rate, args.seed)
+    total_chars = sum(map(len, messages))
+    automaton = moderation.reload(force=True).automaton
+    normalized = [moderation.normalize(m) for m in messages]
+
+    results = {
+        "normalize": _summary(_time_each(moderation.normalize, messages), total_chars),
+        "automaton scan": _summary(_time_each(automaton.scan, normalized), total_chars),
+        "moderation.scan (both)": _summary(_time_each(moderation.scan, messages), total_chars),
+        "regex per pattern": _summary(
+            _time_each(lambda t: [p for p in FRONTEND_PATTERNS if p.search(t)], messages), total_chars
+        ),
+    }
+    hits = sum(1 for m in messages if moderation.scan(m))
+
+    print(f"{args.messages} messages x {args.length} chars, {hits} with matches, "
+          f"{automaton.states} automaton states\n")
+    print(f"{'':<24}{'p50 µs':>10}{'p99 µs':>10}{'msgs/s':>10}{'MB/s':>8}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['p50_us']:>10}{r['p99_us']:>10}{r['msgs_per_s']:>10}{r['mb_per_s']:>8}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Run the benchmark: boot the fake upstream and the API, seed, load, report.
+
+Results are printed as a table and written as JSON. With --baseline the run
+fails (exit code 1) if any endpoint's p95 latency or throughput regresses by
+more than --tolerance against the baseline file.
+
+The load generator runs in this process with one thread per connection, so
+absolute numbers depend on the machine; compare runs from the same host.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+from bench import datagen
+from bench.scenarios import SCENARIOS, DEFAULT_MIX, Context
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+WEBHOOK_SECRET = "whsec_bench"
+# Syntactically valid (header.payload.signature) keys; the fake accepts anything
+FAKE_SUPABASE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYmVuY2gifQ.bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+@contextmanager
+def _process(args: list[str], env: dict, ready_url: str):
+    proc = subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env={**os.environ, **env})
+    try:
+        _wait_ready(ready_url)
+        yield proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+@contextmanager
+def serve(dataset: Path, upstream_latency_ms: float = 2):
+    """Boot the fake upstream, load `dataset` into it and start the API; yields the API base URL."""
+    upstream_port, api_port = _free_port(), _free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    api_url = f"http://127.0.0.1:{api_port}"
+
+    upstream_env = {"FAKE_UPSTREAM_LATENCY_MS": str(upstream_latency_ms)}
+    api_env = {
+        "SUPABASE_URL": upstream_url,
+        "SUPABASE_ANON_KEY": FAKE_SUPABASE_KEY,
+        "SUPABASE_SERVICE_ROLE_KEY": FAKE_SUPABASE_KEY,
+        "STRIPE_SECRET_KEY": "sk_test_bench",
+        "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "STRIPE_API_BASE": upstream_url,
+        "RESEND_API_KEY": "",
+        # Every simulated user shares one address; per-viewer caps would count them as one
+        "VIEWS_PER_VIEWER": "1000000000",
+    }
+
+    upstream_args = ["-m", "bench.fake_upstream", "--port", str(upstream_port)]
+    with _process(upstream_args, upstream_env, f"{upstream_url}/__bench/stats"):
+        print(f"Seeded: {datagen.upload(dataset, upstream_url)}")
+        api_args = ["-m", "uvicorn", "bench.app:app", "--port", str(api_port), "--log-level", "warning"]
+        with _process(api_args, api_env, f"{api_url}/"):
+            yield api_url
+
+
+def _parse_mix(mix: str) -> tuple[list[str], list[float]]:
+    names, weights = [], []
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def load_context(dataset: Path) -> Context:
+    """Scenario identities and listing ids from a bench.datagen output directory."""
+    owners, seekers, listings = [], [], []
+    with open(dataset / "auth_users.ndjson") as f:
+        for line in f:
+            entry = json.loads(line)
+            identity = {"id": entry["user"]["id"], "token": entry["token"]}
+            (owners if entry["user"]["user_metadata"]["user_type"] == "owner" else seekers).append(identity)
+    with open(dataset / "listings.ndjson") as f:
+        for line in f:
+            row = json.loads(line)
+            listings.append({"id": row["id"], "owner_id": row["owner_id"], "postcode": row["postcode"]})
+    bookings: Counter = Counter()
+    if (dataset / "listing_bookings.ndjson").exists():
+        with open(dataset / "listing_bookings.ndjson") as f:
+            for line in f:
+                bookings[json.loads(line)["listing_id"]] += 1
+    by_id = {listing["id"]: listing for listing in listings}
+    busy = [by_id[listing_id] for listing_id, _ in bookings.most_common(20)]
+    return Context(owners=owners, seekers=seekers, listings=listings, webhook_secret=WEBHOOK_SECRET, busy_listings=busy)
+
+
+def run_load(base_url: str, ctx: Context, mix: str, duration: float, concurrency: int, seed: int) -> dict:
+    """Drive the scenario mix for `duration` seconds and return per-endpoint samples."""
+    names, weights = _parse_mix(mix)
+    samples: dict[str, list[tuple[float, bool]]] = {}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(worker_id: int):
+        rng = random.Random(seed * 1000 + worker_id)
+        local: list[tuple[str, float, bool]] = []
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            while time.monotonic() < stop_at:
+                scenario = SCENARIOS[rng.choices(names, weights)[0]]
+                try:
+                    local.extend(scenario(client, ctx, rng))
+                except httpx.HTTPError:
+                    local.append(("transport_error", 0.0, False))
+        with lock:
+            for label, seconds, ok in local:
+                samples.setdefault(label, []).append((seconds, ok))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def summarise(samples: dict, duration: float) -> dict:
+    endpoints = {}
+    for label, values in sorted(samples.items()):
+        latencies = sorted(s for s, _ in values)
+        endpoints[label] = {
+            "count": len(values),
+            "errors": sum(1 for _, ok in values if not ok),
+            "rps": round(len(values) / duration, 2),
+            "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        }
+    return endpoints
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of `result` against `baseline`, as human-readable lines."""
+    problems = []
+    for label, base in baseline["endpoints"].items():
+        current = result["endpoints"].get(label)
+        if current is None:
+            problems.append(f"{label}: missing from this run")
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{label}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms (+{tolerance:.0%})")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"{label}: {current['rps']} rps < baseline {base['rps']} rps (-{tolerance:.0%})")
+        if current["errors"] > base["errors"]:
+            problems.append(f"{label}: {current['errors']} errors (baseline {base['errors']})")
+    return problems
+
+
+def print_table(endpoints: dict) -> None:
+    width = max([28, *(len(label) + 2 for label in endpoints)])
+    header = f"{'endpoint':<{width}}{'count':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for label, e in endpoints.items():
+        print(f"{label:<{width}}{e['count']:>8}{e['errors']:>6}{e['rps']:>9}{e['p50_ms']:>10}{e['p95_ms']:>10}{e['p99_ms']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MigRent API benchmark")
+    parser.add_argument("--dataset", help="bench.datagen output directory to load instead of generating one")
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--listings", type=int, default=2000)
+    parser.add_argument("--deals", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--bookings", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario=weight list (default {DEFAULT_MIX})")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of unmeasured load first")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--upstream-latency-ms", type=float, default=2, help="simulated Supabase/Stripe RTT")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="compare against this baseline file and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--write-baseline", help="write this run's results to a baseline file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="migrent-bench-") as scratch:
+        if args.dataset:
+            dataset = Path(args.dataset)
+        else:
+            dataset = Path(scratch)
+            datagen.generate(dataset, args.users, args.listings, args.deals, args.messages, args.seed,
+                             formats=frozenset({"ndjson"}), bookings=args.bookings)
+        ctx = load_context(dataset)
+
+        with serve(dataset, args.upstream_latency_ms) as api_url:
+            if args.warmup > 0:
+                run_load(api_url, ctx, args.mix, args.warmup, args.concurrency, args.seed + 1)
+            samples = run_load(api_url, ctx, args.mix, args.duration, args.concurrency, args.seed)
+
+    result = {
+        "meta": {
+            "dataset": args.dataset or {
+                "users": args.users,
+                "listings": args.listings,
+                "deals": args.deals,
+                "messages": args.messages,
+                "bookings": args.bookings,
+                "seed": args.seed,
+            },
+            "mix": args.mix,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "endpoints": summarise(samples, args.duration),
+    }
+    print_table(result["endpoints"])
+    Path(args.output).write_text(json.dumps(result, indent=2))
+    print(f"\nWrote {args.output}")
+
+    if args.write_baseline:
+        Path(args.write_baseline).write_text(json.dumps(result, indent=2) + "\n")
+        print(f"Wrote baseline {args.write_baseline}")
+
+    if args.baseline:
+        problems = compare(result, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        if problems:
+            print("\nRegressions against baseline:")
+            for line in problems:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Scripted user journeys for bench.run.
+
+Each scenario performs one iteration against the API with an httpx.Client and
+returns the requests it made as (endpoint label, seconds, ok) tuples. Labels
+are route templates so results line up with /metrics.
+"""
+
+import hmac
+import json
+import time
+import random
+import hashlib
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+import httpx
+
+Sample = tuple[str, float, bool]
+
+
+@dataclass
+class Context:
+    """Seeded identities and ids the scenarios pick from."""
+
+    owners: list[dict]
+    seekers: list[dict]
+    listings: list[dict]
+    webhook_secret: str
+    cities: list[str] = field(default_factory=lambda: ["Sydney", "Adelaide"])
+    # Listings with the most availability bookings
+    busy_listings: list[dict] = field(default_factory=list)
+    owners_by_id: dict[str, dict] = field(init=False)
+
+    def __post_init__(self):
+        self.owners_by_id = {o["id"]: o for o in self.owners}
+
+
+def _timed(client: httpx.Client, label: str, method: str, url: str, **kwargs) -> tuple[Sample, httpx.Response]:
+    start = time.perf_counter()
+    response = client.request(method, url, **kwargs)
+    return (label, time.perf_counter() - start, response.status_code < 400), response
+
+
+def _auth(identity: dict) -> dict:
+    return {"Authorization": f"Bearer {identity['token']}"}
+
+
+def browse_listings(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    params = {"city": rng.choice(ctx.cities)}
+    if rng.random() < 0.5:
+        params["max_price"] = rng.choice([300, 450, 600])
+    sample, _ = _timed(client, "GET /listings", "GET", "/listings", params=params)
+    return [sample]
+
+
+def view_trending(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    """Trending page: list, report the impressions, open one listing."""
+    headers = {"user-agent": f"bench-{rng.getrandbits(32):08x}"}
+    listed, response = _timed(client, "GET /listings?sort=trending", "GET", "/listings",
+                              params={"city": rng.choice(ctx.cities), "sort": "trending"})
+    shown = [row["id"] for row in response.json()[:20]] if response.status_code == 200 else []
+    samples = [listed]
+    if shown:
+        impressions, _ = _timed(client, "POST /listings/views", "POST", "/listings/views",
+                                json={"listing_ids": shown, "kind": "impression"}, headers=headers)
+        # Skewed towards the top, like real clicks
+        opened = shown[min(int(rng.expovariate(1 / 3)), len(shown) - 1)]
+        view, _ = _timed(client, "POST /listings/views", "POST", "/listings/views",
+                         json={"listing_ids": [opened]}, headers=headers)
+        samples += [impressions, view]
+    return samples
+
+
+def open_inbox(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    user = rng.choice(ctx.owners if rng.random() < 0.5 else ctx.seekers)
+    sample, _ = _timed(client, "GET /messages/threads", "GET", "/messages/threads", headers=_auth(user))
+    return [sample]
+
+
+def view_profile(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    user = rng.choice(ctx.seekers)
+    first, _ = _timed(client, "GET /profiles/me", "GET", "/profiles/me", headers=_auth(user))
+    other = rng.choice(ctx.owners)
+    second, _ = _timed(client, "GET /profiles/{user_id}", "GET", f"/profiles/{other['id']}")
+    return [first, second]
+
+
+def send_message(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    seeker = rng.choice(ctx.seekers)
+    listing = rng.choice(ctx.listings)
+    body = {
+        "sender_id": seeker["id"],
+        "receiver_id": listing["owner_id"],
+        "listing_id": listing["id"],
+        "message_text": "Hi! Is this room still available from next month?",
+    }
+    sample, _ = _timed(client, "POST /messages/send", "POST", "/messages/send", json=body, headers=_auth(seeker))
+    return [sample]
+
+
+def check_availability(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    pool = ctx.busy_listings if ctx.busy_listings and rng.random() < 0.5 else ctx.listings
+    listing = rng.choice(pool)
+    move_in = date.today() + timedelta(days=rng.randint(0, 180))
+    calendar, _ = _timed(
+        client, "GET /listings/{listing_id}/availability", "GET", f"/listings/{listing['id']}/availability",
+        params={"start": move_in.isoformat()},
+    )
+    params = {
+        "city": rng.choice(ctx.cities),
+        "move_in": move_in.isoformat(),
+        "move_out": (move_in + timedelta(weeks=rng.choice([4, 12, 26]))).isoformat(),
+    }
+    search, _ = _timed(client, "GET /listings?move_in", "GET", "/listings", params=params)
+    return [calendar, search]
+
+
+def view_similar(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    """Listing detail page: the "similar places" strip."""
+    listing = rng.choice(ctx.listings)
+    sample, _ = _timed(client, "GET /listings/{listing_id}/similar", "GET", f"/listings/{listing['id']}/similar")
+    return [sample]
+
+
+def check_rent(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    """Pricing a listing: the postcode's rent quartiles."""
+    params = {"postcode": rng.choice(ctx.listings)["postcode"]}
+    if rng.random() < 0.5:
+        params["place_type"] = rng.choice(["private_room", "shared_room", "entire_place"])
+    sample, _ = _timed(client, "GET /stats/rent", "GET", "/stats/rent", params=params)
+    return [sample]
+
+
+def _signed_event(secret: str, payload: dict) -> tuple[bytes, str]:
+    body = json.dumps(payload).encode()
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return body, f"t={timestamp},v1={signature}"
+
+
+def create_deal_and_pay(client: httpx.Client, ctx: Context, rng: random.Random) -> list[Sample]:
+    listing = rng.choice(ctx.listings)
+    owner = ctx.owners_by_id[listing["owner_id"]]
+    seeker = rng.choice(ctx.seekers)
+    body = {"owner_id": owner["id"], "seeker_id": seeker["id"], "listing_id": listing["id"]}
+    created, response = _timed(client, "POST /deals/create", "POST", "/deals/create", json=body, headers=_auth(owner))
+    if not created[2]:
+        return [created]
+
+    deal_id = response.json()["deal_id"]
+    payload, signature = _signed_event(ctx.webhook_secret, {
+        "id": f"evt_bench_{rng.getrandbits(48):x}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {
+            "id": f"cs_bench_{rng.getrandbits(48):x}",
+            "object": "checkout.session",
+            "amount_total": 9900,
+            "metadata": {"deal_id": deal_id, "fee_type": "owner"},
+        }},
+    })
+    paid, _ = _timed(
+        client, "POST /webhooks/stripe", "POST", "/webhooks/stripe",
+        content=payload, headers={"stripe-signature": signature, "content-type": "application/json"},
+    )
+    return [created, paid]
+
+
+SCENARIOS = {
+    "browse": browse_listings,
+    "inbox": open_inbox,
+    "profile": view_profile,
+    "send": send_message,
+    "deal": create_deal_and_pay,
+    "availability": check_availability,
+    "trending": view_trending,
+    "similar": view_similar,
+    "rent": check_rent,
+}
+
+DEFAULT_MIX = "browse=6,inbox=2,profile=2,send=1,deal=1,availability=2,trending=2,similar=2,rent=1"
@@ -0,0 +1,415 @@
+"""
+Platform-bypass detection over the message stream.
+
+Users who swap phone numbers, emails or payment handles in messages can
+settle a deal off-platform and skip the owner/seeker fees. send_message hands
+every stored message to submit(), which only enqueues it; a background thread
+scores it and writes bypass_flags rows in batches, so detection adds no
+latency to the send path.
+
+Scoring is incremental per conversation (listing + the two participants, or
+a direct conversation). Each message is matched against precompiled contact
+patterns; a signal counts once per sender per conversation, and the
+conversation score decays with a half-life of BYPASS_HALF_LIFE_HOURS. When the
+score reaches BYPASS_THRESHOLD, each participant whose own signals weigh at
+least half the threshold is flagged (so replying "sure, whatsapp?" alone does
+not flag the other side). A user is flagged once per conversation; the unique
+index from migration 019 makes repeated inserts no-ops.
+
+Conversation state is kept per worker process, bounded to BYPASS_MAX_THREADS
+(least recently active dropped first). A worker seeing a conversation for the
+first time (after a restart, an eviction, or because earlier messages went to
+another worker) rebuilds its state from the conversation's last
+BYPASS_HISTORY_MESSAGES messages within four half-lives and its existing
+bypass_flags rows, so the score doesn't depend on which worker got which
+message. The backfill job replays historical messages through the same
+detector:
+
+    cd backend
+    python -m bypass --since 2026-01-01            # write flags
+    python -m bypass --since 2026-01-01 --dry-run  # print them
+"""
+
+import os
+import re
+import sys
+import queue
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from prometheus_client import Counter
+
+from db import get_supabase_admin
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD = float(os.environ.get("BYPASS_THRESHOLD", "5"))
+HALF_LIFE_HOURS = float(os.environ.get("BYPASS_HALF_LIFE_HOURS", "72"))
+MAX_THREADS = int(os.environ.get("BYPASS_MAX_THREADS", "50000"))
+BATCH_SIZE = int(os.environ.get("BYPASS_BATCH_SIZE", "50"))
+FLUSH_INTERVAL = float(os.environ.get("BYPASS_FLUSH_INTERVAL", "2"))
+QUEUE_SIZE = int(os.environ.get("BYPASS_QUEUE_SIZE", "10000"))
+HISTORY_MESSAGES = int(os.environ.get("BYPASS_HISTORY_MESSAGES", "100"))
+
+MESSAGE_FIELDS = "id,sender_id,receiver_id,listing_id,message_text,created_at"
+
+SIGNALS_SEEN = Counter(
+    "bypass_signals_total",
+    "Contact or payment patterns found in messages",
+    ["signal"],
+)
+FLAGS_RAISED = Counter(
+    "bypass_flags_raised_total",
+    "bypass_flags rows queued by the message detector",
+)
+DROPPED = Counter(
+    "bypass_messages_dropped_total",
+    "Messages not scored because the detector queue was full",
+)
+
+_DIGIT = r"(?:[\s.()-]?\d)"
+_SPELLED = r"(?:zero|oh|one|two|three|four|five|six|seven|eight|nine)"
+
+# (signal, weight, pattern); patterns run on the lower-cased message text
+SIGNALS = [
+    ("phone", 3.0, re.compile(
+        rf"(?<!\d)(?:\+?61[\s.-]?|0)[2-478]{_DIGIT}{{8}}(?!\d)"  # Australian mobile/landline
+        rf"|(?<![\w+])\+\d{_DIGIT}{{7,13}}(?!\d)"                 # other international numbers
+        rf"|\b(?:{_SPELLED}[\s,.-]*){{8,}}\b"                     # "oh four one two ..."
+    )),
+    ("email", 3.0, re.compile(
+        r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+        r"|[\w.+-]+\s*(?:\[at\]|\(at\)|\s+at\s+)\s*[\w-]+\s*(?:\[dot\]|\(dot\)|\s+dot\s+)\s*(?:com|net|org|au|io|co)\b"
+    )),
+    ("payment", 3.0, re.compile(
+        r"\bpay\s?id\b|\bbsb\b[\s:#-]*\d{3}[\s-]?\d{3}"
+        r"|\bacc(?:ount)?\s*(?:no\.?|number|#)?[\s:.-]*\d{6,10}\b"
+        r"|paypal\.me/\w+|\b(?:paypal|venmo|cash\s?app|beem(?:\s?it)?|osko|revolut)\b"
+        r"|(?<![\w$])\$[a-z][\w-]{2,}"  # $cashtag, not $300
+    )),
+    ("off_platform_app", 1.5, re.compile(
+        r"\b(?:whats\s?app|telegram|signal\s+me|wechat|viber|kakao|line\s+id|snap(?:chat)?|insta(?:gram)?\s+dm)\b"
+    )),
+    ("fee_avoidance", 4.0, re.compile(
+        r"\b(?:avoid|skip|save|dodge|without|no)\s+(?:the\s+)?(?:platform\s+|app\s+|migrent\s+|booking\s+|service\s+)?fees?\b"
+        r"|\b(?:pay|deal|talk|chat|continue|book)\s+(?:you\s+|me\s+)?(?:directly|off\s?(?:the\s+)?(?:app|site|platform|migrent)|outside\s+(?:the\s+)?(?:app|site|platform|migrent))\b"
+        r"|\bcash\s+(?:only|in\s+hand)\b"
+    )),
+]
+
+
+def find_signals(text: Optional[str]) -> list[str]:
+    """Names of the signals present in a message."""
+    if not text:
+        return []
+    lowered = text.lower()
+    return [name for name, _, pattern in SIGNALS if pattern.search(lowered)]
+
+
+_WEIGHTS = {name: weight for name, weight, _ in SIGNALS}
+
+
+def thread_key(message: dict) -> str:
+    a, b = sorted((str(message["sender_id"]), str(message["receiver_id"])))
+    return f"{message.get('listing_id') or 'direct'}:{a}:{b}"
+
+
+def _timestamp(value) -> float:
+    if not value:
+        return datetime.now(timezone.utc).timestamp()
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:  # send_message stores naive UTC
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class _Thread:
+    __slots__ = ("score", "updated_at", "seen", "contributors", "message_ids", "flagged")
+
+    def __init__(self):
+        self.score = 0.0
+        self.updated_at = 0.0
+        self.seen: set[tuple[str, str]] = set()
+        self.contributors: dict[str, set[str]] = {}
+        self.message_ids: list[str] = []
+        self.flagged: set[str] = set()
+
+
+class Detector:
+    """
+    Incremental per-conversation bypass scoring. Not thread-safe; one consumer at a time.
+
+    With `history`, a conversation not in memory is first rebuilt from what
+    history(message, key, since) returns: earlier messages, oldest first, and
+    the ids of users already flagged in it.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD, half_life_hours: float = HALF_LIFE_HOURS,
+                 max_threads: int = MAX_THREADS,
+                 history: Optional[Callable[[dict, str, float], tuple[list[dict], set[str]]]] = None):
+        self.threshold = threshold
+        self.half_life = half_life_hours * 3600
+        self.max_threads = max_threads
+        self.history = history
+        self._threads: "OrderedDict[str, _Thread]" = OrderedDict()
+
+    def _score(self, thread: _Thread, message: dict, signals: list[str]) -> None:
+        at = _timestamp(message.get("created_at"))
+        if thread.updated_at and self.half_life > 0:
+            thread.score *= 0.5 ** (max(0.0, at - thread.updated_at) / self.half_life)
+        thread.updated_at = max(thread.updated_at, at)
+
+        sender = str(message["sender_id"])
+        for signal in signals:
+            if (sender, signal) not in thread.seen:
+                thread.seen.add((sender, signal))
+                thread.score += _WEIGHTS[signal]
+                thread.contributors.setdefault(sender, set()).add(signal)
+        if message.get("id"):
+            thread.message_ids = (thread.message_ids + [str(message["id"])])[-10:]
+
+    def _rebuild(self, message: dict, key: str) -> _Thread:
+        thread = _Thread()
+        if self.history is None:
+            return thread
+        since = _timestamp(message.get("created_at")) - 4 * self.half_life
+        try:
+            earlier, flagged = self.history(message, key, since)
+        except Exception:
+            logger.warning("Could not load the history of conversation %s", key, exc_info=True)
+            return thread
+        for past in earlier:
+            signals = find_signals(past.get("message_text"))
+            if signals and str(past.get("id")) != str(message.get("id")):
+                self._score(thread, past, signals)
+        thread.flagged = set(flagged)
+        return thread
+
+    def observe(self, message: dict) -> list[dict]:
+        """
+        Score one message.
+
+        Returns:
+            list: bypass_flags rows (without owner/seeker) for users newly
+            flagged by this message
+        """
+        signals = find_signals(message.get("message_text"))
+        if not signals:
+            return []
+
+        key = thread_key(message)
+        thread = self._threads.pop(key, None) or self._rebuild(message, key)
+        self._threads[key] = thread
+        if len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+
+        for signal in signals:
+            SIGNALS_SEEN.labels(signal).inc()
+        self._score(thread, message, signals)
+
+        if thread.score < self.threshold:
+            return []
+        flags = []
+        for user_id, user_signals in thread.contributors.items():
+            if user_id in thread.flagged or sum(_WEIGHTS[s] for s in user_signals) < self.threshold / 2:
+                continue
+            thread.flagged.add(user_id)
+            flags.append({
+                "source": "messages",
+                "thread_key": key,
+                "listing_id": message.get("listing_id"),
+                "flagged_user_id": user_id,
+                "score": round(thread.score, 2),
+                "signals": sorted(user_signals),
+                "message_ids": list(thread.message_ids),
+                "reason": f"Shared off-platform contact in messages: {', '.join(sorted(user_signals))}",
+            })
+        FLAGS_RAISED.inc(len(flags))
+        return flags
+
+
+def write_flags(rows: list[dict]) -> None:
+    """
+    Insert flag rows in one request, filling owner/seeker from the listing.
+
+    Rows already flagged for the same conversation and user are skipped.
+    """
+    if not rows:
+        return
+    sb = get_supabase_admin()
+    listing_ids = sorted({r["listing_id"] for r in rows if r.get("listing_id")})
+    owners = {}
+    if listing_ids:
+        res = sb.table("listings").select("id,owner_id").in_("id", listing_ids).execute()
+        owners = {row["id"]: row["owner_id"] for row in res.data}
+
+    for row in rows:
+        owner_id = owners.get(row.get("listing_id"))
+        _, a, b = row["thread_key"].split(":")
+        row["owner_id"] = owner_id
+        row["seeker_id"] = (b if a == owner_id else a) if owner_id else None
+
+    sb.table("bypass_flags").upsert(
+        rows, on_conflict="thread_key,flagged_user_id", ignore_duplicates=True
+    ).execute()
+
+
+def load_history(message: dict, key: str, since: float) -> tuple[list[dict], set[str]]:
+    """
+    A conversation's last HISTORY_MESSAGES messages from `since` up to
+    `message`, oldest first, and the users already flagged in it.
+    """
+    sb = get_supabase_admin()
+    a, b = str(message["sender_id"]), str(message["receiver_id"])
+    query = (
+        sb.table("messages").select(MESSAGE_FIELDS)
+        .or_(f"and(sender_id.eq.{a},receiver_id.eq.{b}),and(sender_id.eq.{b},receiver_id.eq.{a})")
+        .gte("created_at", datetime.fromtimestamp(since, timezone.utc).isoformat())
+        .lte("created_at", datetime.fromtimestamp(_timestamp(message.get("created_at")), timezone.utc).isoformat())
+    )
+    if message.get("listing_id"):
+        query = query.eq("listing_id", message["listing_id"])
+    else:
+        query = query.is_("listing_id", "null")
+    earlier = query.order("created_at", desc=True).order("id", desc=True).limit(HISTORY_MESSAGES).execute().data
+    flagged = sb.table("bypass_flags").select("flagged_user_id").eq("thread_key", key).execute().data
+    return earlier[::-1], {str(row["flagged_user_id"]) for row in flagged}
+
+
+# ── Background pipeline ──────────────────────────────────────
+
+
+class Pipeline:
+    """Consumes submitted messages on one thread and flushes flags in batches."""
+
+    def __init__(self):
+        self.detector = Detector(history=load_history)
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._pending: list[dict] = []
+        self._thread = threading.Thread(target=self._run, name="bypass-detector", daemon=True)
+        self._thread.start()
+
+    def submit(self, message: dict) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            DROPPED.inc()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        try:
+            write_flags(self._pending)
+            self._pending = []
+        except Exception:
+            # Kept for the next flush; bounded so an outage can't grow it forever
+            logger.warning("Failed to write %d bypass flags", len(self._pending), exc_info=True)
+            self._pending = self._pending[-BATCH_SIZE * 20:]
+
+    def _run(self) -> None:
+        while True:
+            try:
+                message = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self._flush()
+                continue
+            if message is None:
+                self._flush()
+                return
+            try:
+                self._pending.extend(self.detector.observe(message))
+            except Exception:
+                logger.exception("Bypass detector failed on message %s", message.get("id"))
+            if len(self._pending) >= BATCH_SIZE:
+                self._flush()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Score what is queued, flush and stop the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+_pipeline: Optional[Pipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def submit(message: dict) -> None:
+    """Queue a stored message row for bypass scoring (never blocks)."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = Pipeline()
+    _pipeline.submit(message)
+
+
+def shutdown() -> None:
+    """Flush pending flags; called from the lifespan handler on shutdown."""
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+# ── Backfill ─────────────────────────────────────────────────
+
+
+def backfill(since: Optional[str] = None, page_size: int = 1000, dry_run: bool = False) -> dict:
+    """
+    Replay stored messages, oldest first, through a fresh Detector.
+
+    Returns:
+        dict: messages scanned and flags raised
+    """
+    sb = get_supabase_admin()
+    detector = Detector(max_threads=sys.maxsize)
+    cursor: Optional[tuple[str, str]] = None
+    scanned, pending, raised = 0, [], 0
+
+    while True:
+        query = sb.table("messages").select(MESSAGE_FIELDS)
+        if since:
+            query = query.gte("created_at", since)
+        if cursor:
+            created_at, last_id = cursor
+            query = query.or_(f"created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{last_id})")
+        page = query.order("created_at").order("id").limit(page_size).execute().data
+        if not page:
+            break
+        for message in page:
+            pending.extend(detector.observe(message))
+        scanned += len(page)
+        cursor = (page[-1]["created_at"], page[-1]["id"])
+
+        if len(pending) >= BATCH_SIZE or len(page) < page_size:
+            raised += len(pending)
+            if dry_run:
+                for row in pending:
+                    print(f"{row['flagged_user_id']}  {row['thread_key']}  score={row['score']}  {row['reason']}")
+            else:
+                write_flags(pending)
+            pending = []
+        logger.info("Backfill: %d messages scanned, %d flags", scanned, raised)
+
+    if pending:
+        raised += len(pending)
+        if not dry_run:
+            write_flags(pending)
+    return {"messages": scanned, "flags": raised}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag platform bypass in historical messages")
+    parser.add_argument("--since", help="only messages created at or after this ISO date")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="print flags instead of writing them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(backfill(args.since, args.page_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
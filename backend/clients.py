@@ -0,0 +1,56 @@
+"""
+Lazily imported third-party SDKs.
+
+stripe and resend are among the slowest imports in the app and most requests
+never touch them, so routers go through these accessors instead of importing
+the SDKs at module level. The first call imports the SDK and sets its API key
+and its timeout/retry settings from resilience.py; startup.warm() makes that
+first call in the background after boot.
+"""
+
+import os
+from functools import lru_cache
+
+from resilience import RESEND, STRIPE
+
+
+class _TimeoutRequests:
+    """Stands in for the `requests` module inside resend, adding a default timeout."""
+
+    def __init__(self, requests, timeout: float):
+        self._requests = requests
+        self._timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self._timeout)
+        return self._requests.request(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._requests, name)
+
+
+@lru_cache(maxsize=None)
+def stripe():
+    """The stripe module, configured with STRIPE_SECRET_KEY."""
+    import stripe as sdk
+
+    sdk.api_key = os.environ.get("STRIPE_SECRET_KEY", "")
+    # The SDK retries connection errors, 409s and 5xx itself, sending an
+    # idempotency key so a retried POST cannot charge or create twice
+    sdk.max_network_retries = STRIPE.policy.retries
+    sdk.default_http_client = sdk.http_client.new_default_http_client(timeout=STRIPE.policy.timeout)
+    return sdk
+
+
+@lru_cache(maxsize=None)
+def resend():
+    """The resend module, configured with RESEND_API_KEY."""
+    import resend as sdk
+    from resend import request as transport
+
+    sdk.api_key = os.environ.get("RESEND_API_KEY", "")
+    # resend calls requests.request() without a timeout, which can hang a
+    # worker thread indefinitely
+    if not isinstance(transport.requests, _TimeoutRequests):
+        transport.requests = _TimeoutRequests(transport.requests, RESEND.policy.timeout)
+    return sdk
@@ -0,0 +1,156 @@
+"""
+Dashboard summary data access.
+
+The owner and seeker dashboards need the user's profile, their listings,
+their deals and their unread message counts. get_summary() fetches all four
+concurrently so the page costs one round-trip and roughly the latency of the
+slowest query rather than the sum.
+
+Listings, deals and unread counts are memoized per user for
+DASHBOARD_CACHE_TTL seconds, for at most DASHBOARD_CACHE_MAX_ENTRIES users
+(the most recently fetched); routes that write to those tables call
+invalidate() for the users whose dashboards changed. The memo is per worker
+process, so a write handled by another worker shows up after at most the TTL.
+The profile part always comes from profile_store, which is read fresh for
+each request.
+"""
+
+import os
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from db import get_supabase, get_supabase_admin
+from models import DealStatus
+from singleflight import Group
+import profile_store
+
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "30"))
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.environ.get("DASHBOARD_CACHE_MAX_ENTRIES", "10000"))
+
+LISTING_CARD_FIELDS = "id,title,address,city,postcode,weekly_price,images,image_variants,property_type,available_from,created_at"
+DEAL_FIELDS = "id,listing_id,owner_id,seeker_id,status,move_in_date,created_at"
+INACTIVE_DEAL_STATUSES = (DealStatus.completed.value, DealStatus.cancelled.value)
+
+# Shared by every request; each summary uses up to four threads at once
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("DASHBOARD_FETCH_THREADS", "12")),
+                           thread_name_prefix="dashboard")
+
+_memo: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+# Users with a fetch in flight, and those invalidated meanwhile, so a fetch
+# that raced a write does not memoize stale data
+_fetching: set[str] = set()
+_raced: set[str] = set()
+_memo_lock = threading.Lock()
+_summaries = Group("dashboard")
+
+
+def invalidate(*uids: Optional[str]) -> None:
+    """Drop memoized summaries after a write to listings, deals or messages."""
+    with _memo_lock:
+        for uid in uids:
+            if uid:
+                _memo.pop(str(uid), None)
+                if str(uid) in _fetching:
+                    _raced.add(str(uid))
+
+
+def _owned_listings(sb, uid: str) -> list[dict]:
+    res = (
+        sb.table("listings")
+        .select(LISTING_CARD_FIELDS)
+        .eq("owner_id", uid)
+        .order("created_at", desc=True)
+        .execute()
+    )
+    cards = []
+    for row in res.data:
+        images = row.pop("images", None) or []
+        variants = row.pop("image_variants", None) or []
+        # Processed photos have a card-sized WebP (images.py); older ones only the original
+        cover = variants[0]["card"] if variants else images[0] if images else None
+        cards.append({**row, "cover_image": cover, "image_count": len(images)})
+    return cards
+
+
+def _deals(sb, uid: str) -> dict:
+    res = (
+        sb.table("deals")
+        .select(DEAL_FIELDS)
+        .or_(f"owner_id.eq.{uid},seeker_id.eq.{uid}")
+        .order("created_at", desc=True)
+        .execute()
+    )
+    by_status = {status.value: 0 for status in DealStatus}
+    active = []
+    for deal in res.data:
+        by_status[deal["status"]] = by_status.get(deal["status"], 0) + 1
+        if deal["status"] not in INACTIVE_DEAL_STATUSES:
+            active.append({**deal, "role": "owner" if deal["owner_id"] == uid else "seeker"})
+    return {"by_status": by_status, "active": active}
+
+
+def _unread(sb, uid: str) -> dict:
+    # Counted in the database (migration 030) rather than fetching every unread row
+    res = get_supabase_admin().rpc("unread_message_counts", {"p_user_id": uid}).execute()
+    counts = res.data[0] if res.data else {}
+    return {"total": counts.get("total") or 0, "threads": counts.get("threads") or 0}
+
+
+def _remember(uid: str, summary: dict) -> None:
+    # Entries are in fetch order, so expired ones are always at the front
+    now = time.monotonic()
+    _memo[uid] = (now + DASHBOARD_CACHE_TTL, summary)
+    _memo.move_to_end(uid)
+    while _memo:
+        oldest, (expires, _) = next(iter(_memo.items()))
+        if expires >= now and len(_memo) <= DASHBOARD_CACHE_MAX_ENTRIES:
+            break
+        del _memo[oldest]
+
+
+def _fetch(uid: str) -> dict:
+    with _memo_lock:
+        _fetching.add(uid)
+        _raced.discard(uid)
+    try:
+        # One client for the three queries; each runs in its own context copy so query tracing still sees it
+        sb = get_supabase()
+        parts = {
+            name: _pool.submit(contextvars.copy_context().run, fn, sb, uid)
+            for name, fn in (("listings", _owned_listings), ("deals", _deals), ("unread_messages", _unread))
+        }
+        summary = {name: future.result() for name, future in parts.items()}
+    finally:
+        with _memo_lock:
+            _fetching.discard(uid)
+            raced = uid in _raced
+            _raced.discard(uid)
+    if DASHBOARD_CACHE_TTL > 0 and DASHBOARD_CACHE_MAX_ENTRIES > 0 and not raced:
+        with _memo_lock:
+            _remember(uid, summary)
+    return summary
+
+
+def get_summary(uid: str) -> dict:
+    """
+    Everything the dashboard renders for one user.
+
+    Returns:
+        dict: profile, listings (card projection), deals (counts by status and
+        active deals) and unread_messages (total and thread count)
+    """
+    uid = str(uid)
+    profile = _pool.submit(contextvars.copy_context().run, profile_store.get_profile, uid)
+
+    with _memo_lock:
+        hit = _memo.get(uid)
+    if hit is not None and hit[0] >= time.monotonic():
+        summary = hit[1]
+    else:
+        summary = _summaries.do(uid, lambda: _fetch(uid))
+
+    return {"profile": profile.result(), **summary}
@@ -2,11 +2,21 @@
 Database configuration and client initialization.
 
 Handles Supabase client creation with proper key selection and fallback logic.
+The supabase SDK is imported when the first client is built rather than at
+import time; configuration is checked by check_config() during app startup.
 """
 
 import os
 import logging
-from supabase import create_client, Client
+import threading
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
+
+from metrics import instrument_supabase
+from resilience import protect_supabase
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
@@ -15,32 +25,61 @@ SUPABASE_URL = os.environ.get("SUPABASE_URL", "").strip()
 SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY", "").strip()
 SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "").strip()
 
-# Validate required configuration
-if not SUPABASE_URL:
-    raise RuntimeError("SUPABASE_URL environment variable is not set")
+# now() is the start of the writing transaction, so a row can commit after
+# rows stamped later than it. Syncs that page by such a column re-read this
+# far behind what they have seen and de-duplicate by id.
+SYNC_OVERLAP_SECONDS = float(os.environ.get("SYNC_OVERLAP_SECONDS", "60"))
 
-if not SUPABASE_ANON_KEY:
-    raise RuntimeError("SUPABASE_ANON_KEY environment variable is not set")
+_admin_client = None
+_admin_lock = threading.Lock()
 
 
-def get_supabase() -> Client:
+def check_config() -> None:
+    """
+    Validate required configuration.
+
+    Raises:
+        RuntimeError: If SUPABASE_URL or SUPABASE_ANON_KEY is missing
+    """
+    if not SUPABASE_URL:
+        raise RuntimeError("SUPABASE_URL environment variable is not set")
+
+    if not SUPABASE_ANON_KEY:
+        raise RuntimeError("SUPABASE_ANON_KEY environment variable is not set")
+
+
+def _create_client(key: str) -> "Client":
+    from supabase import create_client
+
+    check_config()
+    client = create_client(SUPABASE_URL, key)
+    instrument_supabase(client)
+    protect_supabase(client)
+    return client
+
+
+def get_supabase() -> "Client":
     """
     Get Supabase client with anon key.
 
     Use this for client-side operations where you want RLS policies to apply.
+    A new client is built per call because sign-in stores the session on the
+    client, which must not leak between requests.
 
     Returns:
         Client: Supabase client using public/anon key
     """
-    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    return _create_client(SUPABASE_ANON_KEY)
 
 
-def get_supabase_admin() -> Client:
+def get_supabase_admin() -> "Client":
     """
     Get Supabase client with service role key for admin operations.
 
     Service role key has full database access and bypasses RLS policies.
-    Falls back to anon key if service role key is not configured.
+    Falls back to anon key if service role key is not configured. The client
+    never signs in, so one instance (and its connection pool) is shared by
+    the whole process.
 
     Returns:
         Client: Supabase client with admin/service role credentials
@@ -48,15 +87,56 @@ def get_supabase_admin() -> Client:
     Raises:
         RuntimeError: If neither service role key nor anon key is available
     """
-    # Try to use service role key first (admin access)
-    if SUPABASE_SERVICE_ROLE_KEY:
-        logger.debug("Using SUPABASE_SERVICE_ROLE_KEY for admin client")
-        return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-
-    # Fallback to anon key (will respect RLS policies)
-    logger.warning(
-        "SUPABASE_SERVICE_ROLE_KEY not set. Falling back to ANON_KEY. "
-        "This may cause RLS policy issues with updates. "
-        "Set SUPABASE_SERVICE_ROLE_KEY in environment for full admin access."
-    )
-    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    global _admin_client
+    if _admin_client is not None:
+        return _admin_client
+
+    with _admin_lock:
+        if _admin_client is None:
+            # Try to use service role key first (admin access)
+            if SUPABASE_SERVICE_ROLE_KEY:
+                logger.debug("Using SUPABASE_SERVICE_ROLE_KEY for admin client")
+                _admin_client = _create_client(SUPABASE_SERVICE_ROLE_KEY)
+            else:
+                # Fallback to anon key (will respect RLS policies)
+                logger.warning(
+                    "SUPABASE_SERVICE_ROLE_KEY not set. Falling back to ANON_KEY. "
+                    "This may cause RLS policy issues with updates. "
+                    "Set SUPABASE_SERVICE_ROLE_KEY in environment for full admin access."
+                )
+                _admin_client = _create_client(SUPABASE_ANON_KEY)
+    return _admin_client
+
+
+def pages_since(
+    new_query: Callable,
+    column: str,
+    since: Optional[str],
+    page_size: int = 1000,
+    id_column: str = "id",
+) -> Iterator[list[dict]]:
+    """
+    Pages of rows ordered by (`column`, `id_column`), starting SYNC_OVERLAP_SECONDS
+    before the `since` timestamp (from the first row when None).
+
+    `new_query` returns a fresh filtered select; rows in the overlap are
+    read again on every call, so callers must apply them idempotently.
+    """
+    cursor = None
+    start = None
+    if since:
+        start = (datetime.fromisoformat(since.replace("Z", "+00:00")) - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+    while True:
+        query = new_query()
+        if cursor:
+            value, last_id = cursor
+            query = query.or_(f"{column}.gt.{value},and({column}.eq.{value},{id_column}.gt.{last_id})")
+        elif start:
+            query = query.gte(column, start)
+        page = query.order(column).order(id_column).limit(page_size).execute().data
+        if not page:
+            return
+        yield page
+        cursor = (page[-1][column], page[-1][id_column])
+        if len(page) < page_size:
+            return
@@ -0,0 +1,429 @@
+"""
+Near-duplicate listing detection with MinHash and locality-sensitive hashing.
+
+Scammers copy a real listing, change a few words and repost it under their
+own account. Every listing gets a fingerprint: a MinHash signature over word
+3-grams of its title and description, plus a normalized address key
+("unit 3/12 Smith Street" and "3/12 smith st" agree). The fraction of equal
+MinHash values estimates the Jaccard similarity of two listings' texts.
+
+Signatures are split into BANDS bands of ROWS values; listings sharing any
+whole band land in the same LSH bucket, so a lookup is BANDS dict probes plus
+a comparison with the few candidates found, well under a millisecond however
+many listings there are. With 16 bands of 4, pairs above ~0.5 similarity are
+very likely to collide and pairs below ~0.2 rarely do.
+
+create_listing checks the index before inserting. A listing whose text is
+at least DUPLICATES_FLAG_SIMILARITY similar to another one, or at the same
+address as another owner's listing, is still created; the matches are
+recorded in duplicate_of / max_similarity for moderators. Texts with fewer
+than DUPLICATES_MIN_SHINGLES word 3-grams ("Private room. Close to station")
+say too little to compare, so they are only matched by address.
+
+Fingerprints are persisted in listing_fingerprints (migration 020). Each
+worker loads them during warm-up and then pages in rows created by other
+workers every DUPLICATES_SYNC_INTERVAL seconds, re-reading the last
+SYNC_OVERLAP_SECONDS in case a row committed late; its own inserts are
+indexed immediately. Fingerprint existing listings and list clusters of likely
+duplicates for moderators with:
+
+    cd backend
+    python -m duplicates --backfill                 # fingerprint unindexed listings
+    python -m duplicates --output clusters.json     # clusters only
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+import unicodedata
+from typing import Iterable, NamedTuple, Optional
+
+from prometheus_client import Counter
+
+from db import get_supabase_admin, pages_since
+
+logger = logging.getLogger(__name__)
+
+# Changing these invalidates every stored signature
+NUM_PERM = 64
+BANDS, ROWS = 16, 4
+SHINGLE_SIZE = 3
+_SEED = 20240521
+
+FLAG_SIMILARITY = float(os.environ.get("DUPLICATES_FLAG_SIMILARITY", "0.6"))
+MIN_SHINGLES = int(os.environ.get("DUPLICATES_MIN_SHINGLES", "10"))
+SYNC_INTERVAL = float(os.environ.get("DUPLICATES_SYNC_INTERVAL", "60"))
+
+CHECKS = Counter(
+    "listing_duplicate_checks_total",
+    "New listings checked against the near-duplicate index",
+    ["result"],
+)
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(_SEED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# ── Fingerprints ─────────────────────────────────────────────
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+_ADDRESS_WORDS = {
+    "street": "st", "road": "rd", "avenue": "ave", "av": "ave", "drive": "dr", "place": "pl",
+    "court": "ct", "crescent": "cres", "parade": "pde", "highway": "hwy", "lane": "ln",
+    "terrace": "tce", "boulevard": "blvd", "close": "cl", "circuit": "cct", "square": "sq",
+    "north": "n", "south": "s", "east": "e", "west": "w",
+}
+# Unit designators: "unit 3/12" and "3/12" are the same address
+_ADDRESS_NOISE = {"unit", "u", "apt", "apartment", "flat", "room", "level", "lvl", "no", "number"}
+
+
+def _words(text: Optional[str]) -> list[str]:
+    if not text:
+        return []
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return _WORD_RE.findall(text.lower())
+
+
+def address_key(address: Optional[str], postcode=None) -> Optional[str]:
+    """Normalized address for exact matching, e.g. "3 12 smith st 2000"."""
+    words = [_ADDRESS_WORDS.get(w, w) for w in _words(address) if w not in _ADDRESS_NOISE]
+    if not words:
+        return None
+    if postcode and str(postcode) not in words:
+        words.append(str(postcode))
+    return " ".join(words)
+
+
+def shingles(*texts: Optional[str]) -> set[str]:
+    """Word SHINGLE_SIZE-grams of the texts (or the words, for very short texts)."""
+    words = [w for text in texts for w in _words(text)]
+    if len(words) < SHINGLE_SIZE:
+        return set(words)
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(items: Iterable[str]) -> list[int]:
+    """NUM_PERM minimum hash values of `items` (stable across processes)."""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "little") % _PRIME
+        for item in items
+    ]
+    if not hashes:
+        return [_PRIME] * NUM_PERM
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(a: list[int], b: list[int]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class Fingerprint(NamedTuple):
+    signature: list[int]
+    address: Optional[str]
+    # Shingles behind the signature; None for stored fingerprints
+    size: Optional[int] = None
+
+    @property
+    def comparable(self) -> bool:
+        """Whether the text is long enough for its similarity to mean anything."""
+        if self.size is None:
+            # An empty text's signature is all _PRIME
+            return any(v != _PRIME for v in self.signature)
+        return self.size >= MIN_SHINGLES
+
+
+def fingerprint(title: Optional[str], description: Optional[str], address: Optional[str], postcode=None) -> Fingerprint:
+    items = shingles(title, description)
+    return Fingerprint(minhash(items), address_key(address, postcode), len(items))
+
+
+class Candidate(NamedTuple):
+    listing_id: str
+    owner_id: str
+    similarity: float
+    same_address: bool
+
+
+# ── LSH index ────────────────────────────────────────────────
+
+
+class LSHIndex:
+    """In-memory MinHash LSH index. Adds may race with lookups; both are GIL-atomic dict/set operations."""
+
+    def __init__(self):
+        self._bands: list[dict[tuple, set[str]]] = [{} for _ in range(BANDS)]
+        self._addresses: dict[str, set[str]] = {}
+        self._entries: dict[str, tuple[str, Fingerprint]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, listing_id: str) -> bool:
+        return listing_id in self._entries
+
+    def add(self, listing_id: str, owner_id: str, fp: Fingerprint) -> None:
+        listing_id = str(listing_id)
+        if listing_id in self._entries or len(fp.signature) != NUM_PERM:
+            return
+        self._entries[listing_id] = (str(owner_id), fp)
+        # Short texts would share one huge bucket per band and never count as matches anyway
+        if fp.comparable:
+            for band, bucket in enumerate(self._bands):
+                key = tuple(fp.signature[band * ROWS:(band + 1) * ROWS])
+                bucket.setdefault(key, set()).add(listing_id)
+        if fp.address:
+            self._addresses.setdefault(fp.address, set()).add(listing_id)
+
+    def query(self, fp: Fingerprint, min_similarity: float = 0.0, exclude: Optional[str] = None) -> list[Candidate]:
+        """
+        Listings that share an LSH band or the address with `fp`; only the
+        address when `fp`'s text is too short to compare.
+
+        Returns:
+            list: Candidates at or above `min_similarity` (any similarity for
+            address matches), most similar first
+        """
+        found: set[str] = set()
+        if fp.comparable:
+            for band, bucket in enumerate(self._bands):
+                hit = bucket.get(tuple(fp.signature[band * ROWS:(band + 1) * ROWS]))
+                if hit:
+                    found.update(hit)
+        same_address = self._addresses.get(fp.address, set()) if fp.address else set()
+        found.update(same_address)
+        found.discard(exclude)
+
+        candidates = []
+        for listing_id in found:
+            owner_id, other = self._entries[listing_id]
+            score = similarity(fp.signature, other.signature)
+            if score >= min_similarity or listing_id in same_address:
+                candidates.append(Candidate(listing_id, owner_id, round(score, 3), listing_id in same_address))
+        candidates.sort(key=lambda c: c.similarity, reverse=True)
+        return candidates
+
+
+_index = LSHIndex()
+# Latest created_at indexed; syncs re-read SYNC_OVERLAP_SECONDS behind it
+_since: Optional[str] = None
+_synced_at = 0.0
+_sync_lock = threading.Lock()
+
+
+def _fetch_fingerprints(since: Optional[str]):
+    sb = get_supabase_admin()
+    return pages_since(
+        lambda: sb.table("listing_fingerprints").select("listing_id,owner_id,minhash,address_key,created_at"),
+        "created_at",
+        since,
+        id_column="listing_id",
+    )
+
+
+def sync() -> int:
+    """
+    Page in fingerprints stored since the last sync (all of them the first time).
+
+    Returns:
+        int: Number of fingerprints added; 0 if another thread is already syncing
+    """
+    global _since, _synced_at
+    if not _sync_lock.acquire(blocking=False):
+        return 0
+    try:
+        added = 0
+        for page in _fetch_fingerprints(_since):
+            for row in page:
+                if row["listing_id"] not in _index:
+                    _index.add(row["listing_id"], row["owner_id"], Fingerprint(row["minhash"], row.get("address_key")))
+                    added += 1
+            _since = max(_since or "", page[-1]["created_at"])
+        _synced_at = time.monotonic()
+        if added:
+            logger.info("Duplicate index: %d fingerprints added (%d total)", added, len(_index))
+        return added
+    finally:
+        _sync_lock.release()
+
+
+def index() -> LSHIndex:
+    """The worker's index, synced first if it is older than SYNC_INTERVAL."""
+    global _synced_at
+    if time.monotonic() - _synced_at > SYNC_INTERVAL:
+        try:
+            sync()
+        except Exception:
+            # Stale is better than failing listing creation; retry next interval
+            _synced_at = time.monotonic()
+            logger.warning("Duplicate index sync failed", exc_info=True)
+    return _index
+
+
+# ── Create-time check ────────────────────────────────────────
+
+
+def check(fp: Fingerprint, owner_id: str) -> list[Candidate]:
+    """
+    Look up a new listing's near-duplicates. Never rejects the listing;
+    moderators review what record() stores.
+
+    Returns:
+        list: Candidates worth recording: similar text, or another owner's
+        listing at the same address
+    """
+    owner_id = str(owner_id)
+    candidates = [
+        c for c in index().query(fp, FLAG_SIMILARITY)
+        if (fp.comparable and c.similarity >= FLAG_SIMILARITY) or (c.same_address and c.owner_id != owner_id)
+    ]
+    if candidates:
+        logger.info("Listing by %s resembles %s", owner_id, [c.listing_id for c in candidates])
+    CHECKS.labels("flagged" if candidates else "clean").inc()
+    return candidates
+
+
+def record(listing_id: str, owner_id: str, fp: Fingerprint, candidates: list[Candidate]) -> None:
+    """Store a new listing's fingerprint and index it in this worker. Failures are logged, not raised."""
+    _index.add(listing_id, owner_id, fp)
+    try:
+        get_supabase_admin().table("listing_fingerprints").insert({
+            "listing_id": str(listing_id),
+            "owner_id": str(owner_id),
+            "minhash": fp.signature,
+            "address_key": fp.address,
+            "duplicate_of": [c.listing_id for c in candidates],
+            "max_similarity": max((c.similarity for c in candidates), default=0),
+        }).execute()
+    except Exception:
+        logger.warning("Failed to store fingerprint for listing %s", listing_id, exc_info=True)
+
+
+# ── Batch clustering ─────────────────────────────────────────
+
+LISTING_FIELDS = "id,owner_id,title,description,address,postcode"
+
+
+def _listings(page_size: int = 1000):
+    sb = get_supabase_admin()
+    last_id = None
+    while True:
+        query = sb.table("listings").select(LISTING_FIELDS)
+        if last_id:
+            query = query.gt("id", last_id)
+        page = query.order("id").limit(page_size).execute().data
+        if not page:
+            return
+        yield page
+        last_id = page[-1]["id"]
+
+
+def cluster(threshold: float = FLAG_SIMILARITY, backfill: bool = False) -> list[dict]:
+    """
+    Group every listing with its near-duplicates (connected components).
+
+    Listings are linked when their texts are at least `threshold` similar or
+    different owners list the same address. With `backfill`, listings that
+    have no stored fingerprint get one.
+
+    Returns:
+        list: Clusters of two or more listings, multi-owner clusters first
+    """
+    sb = get_supabase_admin()
+    stored = set()
+    if backfill:
+        for page in _fetch_fingerprints(None):
+            stored.update(row["listing_id"] for row in page)
+
+    local = LSHIndex()
+    rows: dict[str, dict] = {}
+    parent: dict[str, str] = {}
+
+    def find(x: str) -> str:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    best: dict[str, float] = {}
+    for page in _listings():
+        missing = []
+        for listing in page:
+            lid, owner = str(listing["id"]), str(listing["owner_id"])
+            fp = fingerprint(listing.get("title"), listing.get("description"), listing.get("address"), listing.get("postcode"))
+            rows[lid] = listing
+            parent[lid] = lid
+            matches = [
+                c for c in local.query(fp, threshold)
+                if (fp.comparable and c.similarity >= threshold) or (c.same_address and c.owner_id != owner)
+            ]
+            for c in matches:
+                parent[find(c.listing_id)] = find(lid)
+                best[lid] = max(best.get(lid, 0), c.similarity)
+                best[c.listing_id] = max(best.get(c.listing_id, 0), c.similarity)
+            local.add(lid, owner, fp)
+            if backfill and lid not in stored:
+                missing.append({
+                    "listing_id": lid,
+                    "owner_id": owner,
+                    "minhash": fp.signature,
+                    "address_key": fp.address,
+                    "duplicate_of": [c.listing_id for c in matches],
+                    "max_similarity": max((c.similarity for c in matches), default=0),
+                })
+        if missing:
+            sb.table("listing_fingerprints").upsert(missing, on_conflict="listing_id", ignore_duplicates=True).execute()
+        logger.info("Clustered %d listings", len(rows))
+
+    groups: dict[str, list[str]] = {}
+    for lid in rows:
+        groups.setdefault(find(lid), []).append(lid)
+
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        owners = {str(rows[m]["owner_id"]) for m in members}
+        clusters.append({
+            "size": len(members),
+            "owners": len(owners),
+            "max_similarity": max(best.get(m, 0) for m in members),
+            "listings": [
+                {k: rows[m].get(k) for k in ("id", "owner_id", "title", "address", "postcode")}
+                for m in members
+            ],
+        })
+    clusters.sort(key=lambda c: (c["owners"], c["size"], c["max_similarity"]), reverse=True)
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate listings for moderators")
+    parser.add_argument("--threshold", type=float, default=FLAG_SIMILARITY, help="minimum text similarity")
+    parser.add_argument("--backfill", action="store_true", help="store fingerprints for listings that have none")
+    parser.add_argument("--output", help="write clusters as JSON")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    clusters = cluster(args.threshold, args.backfill)
+    for c in clusters[:50]:
+        print(f"{c['size']} listings, {c['owners']} owners, similarity {c['max_similarity']}")
+        for listing in c["listings"]:
+            print(f"    {listing['id']}  owner {listing['owner_id']}  {listing.get('title') or listing.get('address')}")
+    print(f"{len(clusters)} clusters", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(clusters, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
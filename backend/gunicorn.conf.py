@@ -0,0 +1,68 @@
+"""
+Gunicorn settings for production: N uvicorn workers under one master.
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Every setting can be overridden from the environment:
+
+  WEB_CONCURRENCY               worker processes (default: CPU count)
+  GUNICORN_PRELOAD              import the app (and heavy SDKs) once in the
+                                master so workers share those pages
+                                copy-on-write (default 1)
+  GUNICORN_MAX_REQUESTS         recycle a worker after this many requests to
+                                bound memory growth; 0 disables (default 1000)
+  GUNICORN_MAX_REQUESTS_JITTER  random extra requests per worker so they don't
+                                all restart together (default 100)
+  GUNICORN_GRACEFUL_TIMEOUT     seconds a worker gets to finish in-flight
+                                requests after SIGTERM (deploys, recycling)
+                                before it is killed (default 30)
+  GUNICORN_TIMEOUT              seconds a silent worker may block the event
+                                loop before the master restarts it (default 60)
+
+Each worker keeps its own in-memory state: rate limit counters (see
+RATE_LIMIT_STORAGE_URI), dashboard summaries (DASHBOARD_CACHE_TTL) and admin
+role cache (ADMIN_ROLE_CACHE_TTL). Prometheus values are shared through
+PROMETHEUS_MULTIPROC_DIR, which is created here when not set.
+"""
+
+import os
+import glob
+import tempfile
+import multiprocessing
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+
+# metrics.py reads this at import, so it has to be in the environment before
+# the app is loaded (preload) or workers fork. Stale files from a previous
+# run would be summed into the new one, so the directory starts empty.
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="migrent-prometheus-")
+for stale in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(stale)
+
+
+def on_starting(server):
+    if preload_app:
+        # Import-only (no threads or sockets), so it is safe before fork
+        from startup import preload_sdks
+
+        preload_sdks()
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (in-flight requests) from /metrics
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,127 @@
+"""
+Liveness and readiness probes.
+
+GET /health/live answers as long as the process can serve requests; it never
+touches upstreams, so a Supabase outage does not get healthy workers
+restarted.
+
+GET /health/ready returns 503 while the process is warming up or draining for
+shutdown (see startup.py), or when a required dependency check fails:
+
+  - supabase: a one-row PostgREST select, sent directly with a
+    HEALTH_CHECK_TIMEOUT timeout rather than through the shared client's
+    retries and deadline, so a slow Supabase fails the probe quickly
+  - stripe: an unauthenticated request to the API host (any non-5xx answer
+    means it is reachable); skipped while its circuit breaker is open
+  - warm: startup.warm() has finished
+
+Only HEALTH_REQUIRED_CHECKS (default "supabase") fail readiness; other failing
+checks report "degraded" with 200, so a Stripe outage does not take every
+instance out of rotation. Dependency results are cached for HEALTH_CACHE_TTL
+seconds per worker and concurrent probes share one check, so probe frequency
+never adds upstream load. GET /ready is kept as an alias.
+"""
+
+import os
+import time
+from typing import Callable
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+import db
+import clients
+from resilience import OPEN, STRIPE
+from singleflight import Group
+from startup import DRAINING, READY, WARMUP_TIMINGS
+
+HEALTH_CACHE_TTL = float(os.environ.get("HEALTH_CACHE_TTL", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))
+REQUIRED_CHECKS = frozenset(
+    name.strip() for name in os.environ.get("HEALTH_REQUIRED_CHECKS", "supabase").split(",") if name.strip()
+)
+
+
+def check_supabase() -> None:
+    import httpx
+
+    db.check_config()
+    key = db.SUPABASE_SERVICE_ROLE_KEY or db.SUPABASE_ANON_KEY
+    res = httpx.get(
+        f"{db.SUPABASE_URL}/rest/v1/profiles",
+        params={"select": "id", "limit": "1"},
+        headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        timeout=HEALTH_CHECK_TIMEOUT,
+    )
+    if res.status_code >= 400:
+        raise RuntimeError(f"HTTP {res.status_code}")
+
+
+def check_stripe() -> None:
+    import httpx
+
+    if STRIPE.breaker.state == OPEN:
+        raise RuntimeError("circuit open")
+    res = httpx.get(f"{clients.stripe().api_base}/v1", timeout=HEALTH_CHECK_TIMEOUT)
+    if res.status_code >= 500:
+        raise RuntimeError(f"HTTP {res.status_code}")
+
+
+CHECKS: dict[str, Callable[[], None]] = {
+    "supabase": check_supabase,
+    "stripe": check_stripe,
+}
+
+_checks = Group("health")
+_cached: tuple[float, dict] = (0.0, {})
+
+
+def _refresh() -> dict:
+    global _cached
+    results = {}
+    for name, check in CHECKS.items():
+        start = time.perf_counter()
+        try:
+            check()
+            results[name] = {"ok": True}
+        except Exception as e:
+            results[name] = {"ok": False, "error": f"{type(e).__name__}: {e}"[:200]}
+        results[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+    _cached = (time.monotonic(), results)
+    return results
+
+
+def dependency_checks() -> dict:
+    """
+    Results of every dependency check, at most HEALTH_CACHE_TTL seconds old.
+
+    Returns:
+        dict: check name -> {"ok", "ms", optional "error"}
+    """
+    checked_at, results = _cached
+    if time.monotonic() - checked_at < HEALTH_CACHE_TTL:
+        return results
+    return _checks.do("dependencies", _refresh)
+
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/health/live", include_in_schema=False)
+def live():
+    return {"status": "ok"}
+
+
+@router.get("/health/ready", include_in_schema=False)
+@router.get("/ready", include_in_schema=False)
+def ready():
+    if DRAINING.is_set():
+        return JSONResponse({"status": "draining"}, status_code=503)
+    if not READY.is_set():
+        return JSONResponse({"status": "warming"}, status_code=503)
+
+    checks = {**dependency_checks(), "warm": {"ok": True, "timings": WARMUP_TIMINGS}}
+    failed = {name for name, result in checks.items() if not result["ok"]}
+    if failed & REQUIRED_CHECKS:
+        return JSONResponse({"status": "unavailable", "checks": checks}, status_code=503)
+    return {"status": "degraded" if failed else "ready", "checks": checks}
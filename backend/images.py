@@ -0,0 +1,452 @@
+"""
+Listing photo pipeline: WebP variants and perceptual hashes.
+
+Uploaded photos are decoded once and re-encoded as WebP at each width in
+VARIANTS (never upscaled), so cards load a ~30 KB thumbnail instead of a
+multi-megabyte camera original. Decoding and encoding are CPU-bound, so they
+run in a process pool (IMAGE_WORKERS processes per API worker) rather than on
+the request threads; JPEGs are decoded at reduced scale when the largest
+variant allows it.
+
+Photos are read and processed one per pool worker at a time, and each
+photo's variants are stored as soon as they are encoded, so an upload of
+twenty 10 MB photos never holds more than a few originals in memory. New
+photos are added to the listing with append_listing_images() (migration
+029), one UPDATE, so concurrent uploads to a listing can't drop each other's
+photos.
+
+Variants are stored in the object store (object_store.py) under keys derived
+from the sha256 of the original file. A file already processed for any
+listing is not processed again; its stored variants are reused.
+
+Each photo also gets a 64-bit difference hash (dHash): the brightness
+gradient of a 9x8 grayscale thumbnail. Re-compressed, resized or lightly
+edited copies of a photo hash within a few bits of each other. Photos within
+IMAGE_PHASH_MAX_DISTANCE bits of another owner's photo are recorded in
+listing_images.reused_from for moderators: the same "stock" room photos
+showing up under different owners is a common scam pattern.
+
+Existing listings whose images are plain URLs can be ingested with:
+
+    cd backend
+    python -m images --backfill [--limit 100]
+"""
+
+import io
+import os
+import sys
+import time
+import hashlib
+import logging
+import argparse
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Optional
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Histogram
+
+from db import get_supabase_admin
+from object_store import get_store
+import dashboard_store
+
+logger = logging.getLogger(__name__)
+
+# (name, max width); the largest is the "full" gallery image
+VARIANTS = (("thumb", 320), ("card", 640), ("full", 1600))
+WEBP_QUALITY = int(os.environ.get("IMAGE_WEBP_QUALITY", "80"))
+MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", "50000000"))
+WORKERS = int(os.environ.get("IMAGE_WORKERS", "2"))
+PHASH_MAX_DISTANCE = int(os.environ.get("IMAGE_PHASH_MAX_DISTANCE", "6"))
+
+# Same limit as ListingCreate.images
+MAX_IMAGES_PER_LISTING = 20
+ACCEPTED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "GIF"}
+
+PROCESSED = Counter(
+    "listing_images_total",
+    "Listing photos received by the image pipeline",
+    ["result"],
+)
+REUSED = Counter(
+    "listing_images_reused_total",
+    "Listing photos nearly identical to another owner's photo",
+)
+PROCESS_SECONDS = Histogram(
+    "image_processing_seconds",
+    "Time to decode, resize and encode one batch of photos",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+# ── Processing (runs in the pool's worker processes) ─────────
+
+
+def dhash(image) -> int:
+    """64-bit difference hash of a Pillow image, as a signed int (Postgres bigint)."""
+    from PIL import Image
+
+    small = image.convert("L").resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col + 1] > pixels[row * 9 + col])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def process(data: bytes) -> dict:
+    """
+    Decode one photo and encode every variant.
+
+    Returns:
+        dict: width/height of the full variant, phash, and
+        variants {name: (width, height, webp bytes)}
+
+    Raises:
+        InvalidImage: If the data is not a supported image or is too large
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format not in ACCEPTED_FORMATS:
+            raise InvalidImage(f"Unsupported image format {image.format}")
+        largest = VARIANTS[-1][1]
+        # JPEG only: decode at 1/2, 1/4 or 1/8 scale if still at least `largest` wide
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except InvalidImage:
+        raise
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        raise InvalidImage("Image is too large")
+    except Exception as e:
+        raise InvalidImage(f"Not a valid image ({e.__class__.__name__})")
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    variants = {}
+    for name, width in VARIANTS:
+        variant = image.copy()
+        variant.thumbnail((width, width * 2), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        variant.save(out, "WEBP", quality=WEBP_QUALITY, method=4)
+        variants[name] = (variant.width, variant.height, out.getvalue())
+
+    full_width, full_height, _ = variants[VARIANTS[-1][0]]
+    return {"width": full_width, "height": full_height, "phash": dhash(image), "variants": variants}
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def pool() -> ProcessPoolExecutor:
+    """This process's image pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs threads (uvicorn, warm-up) is unsafe;
+            # recycle workers so Pillow's memory high-water mark doesn't stick
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=200,
+            )
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# ── Storage & bookkeeping ────────────────────────────────────
+
+
+def content_key(content_hash: str, variant: str) -> str:
+    return f"listings/{content_hash[:2]}/{content_hash}/{variant}.webp"
+
+
+def _store(content_hash: str, processed: dict) -> dict:
+    store = get_store()
+    urls = {
+        name: store.put(content_key(content_hash, name), encoded, "image/webp")
+        for name, (_, _, encoded) in processed["variants"].items()
+    }
+    return {**urls, "width": processed["width"], "height": processed["height"]}
+
+
+def _known(content_hashes: list[str]) -> dict[str, dict]:
+    """Already processed photos by content hash."""
+    if not content_hashes:
+        return {}
+    res = (
+        get_supabase_admin().table("listing_images")
+        .select("content_hash,phash,width,height,variants")
+        .in_("content_hash", content_hashes)
+        .execute()
+    )
+    return {row["content_hash"]: row for row in res.data}
+
+
+def _reused(phashes: list[int], owner_id: str) -> dict[int, list[str]]:
+    """Other owners' listings with a photo near each hash."""
+    if not phashes:
+        return {}
+    res = get_supabase_admin().rpc("similar_listing_images", {
+        "p_phashes": phashes,
+        "p_owner_id": str(owner_id),
+        "p_max_distance": PHASH_MAX_DISTANCE,
+    }).execute()
+    found: dict[int, set[str]] = {}
+    for row in res.data or []:
+        found.setdefault(row["phash"], set()).add(row["listing_id"])
+    return {h: sorted(ids) for h, ids in found.items()}
+
+
+def _file_reader(file: BinaryIO) -> Callable[[], bytes]:
+    def read() -> bytes:
+        file.seek(0)
+        return file.read()
+    return read
+
+
+def ingest(listing: dict, photos: list[tuple[Callable[[], bytes], Optional[str]]], append: bool,
+           skip_invalid: bool = False, max_images: Optional[int] = None) -> dict:
+    """
+    Process photos and record them on a listing.
+
+    Args:
+        listing: Row with id and owner_id
+        photos: (read, source URL) pairs, where read() returns the file
+            contents and may be called more than once; the source is None for
+            uploads, whose "full" variant becomes the listing image
+        append: Add the photos to listing.images (uploads) rather than
+            describing images it already has (backfill)
+        skip_invalid: Log and leave out photos that can't be processed
+            instead of raising
+        max_images: Fail with PT400 (nothing recorded) if listing.images
+            would grow past this
+
+    Returns:
+        dict: The listing's updated images and image_variants
+
+    Raises:
+        InvalidImage: If a photo can't be processed and not `skip_invalid`
+            (nothing is recorded on the listing)
+    """
+    owner_id = str(listing["owner_id"])
+    hashes = [hashlib.sha256(read()).hexdigest() for read, _ in photos]
+    known = _known(sorted(set(hashes)))
+
+    readers = {h: read for h, (read, _) in zip(hashes, photos) if h not in known}
+    entries: dict[str, dict] = {}
+    phashes: dict[str, int] = {}
+    started = time.perf_counter()
+    # At most WORKERS originals are in flight; each result is stored right away
+    in_flight: deque = deque()
+    pending = iter(readers.items())
+    while True:
+        for h, read in pending:
+            in_flight.append((h, pool().submit(process, read())))
+            if len(in_flight) >= WORKERS:
+                break
+        if not in_flight:
+            break
+        h, future = in_flight.popleft()
+        try:
+            processed = future.result()
+        except InvalidImage as e:
+            PROCESSED.labels("invalid").inc()
+            if not skip_invalid:
+                for _, other in in_flight:
+                    other.cancel()
+                raise
+            logger.warning("Listing %s: skipping photo %s (%s)", listing["id"], h[:12], e)
+            continue
+        entries[h] = _store(h, processed)
+        phashes[h] = processed["phash"]
+    if readers:
+        PROCESS_SECONDS.observe(time.perf_counter() - started)
+    PROCESSED.labels("processed").inc(len(entries))
+    PROCESSED.labels("deduplicated").inc(len(hashes) - len(readers))
+    for h, row in known.items():
+        entries[h] = {**row["variants"], "width": row["width"], "height": row["height"]}
+        phashes[h] = row["phash"]
+    photos = [(read, source) for h, (read, source) in zip(hashes, photos) if h in entries]
+    hashes = [h for h in hashes if h in entries]
+
+    try:
+        reused = _reused(sorted(set(phashes.values())), owner_id)
+    except Exception:
+        # Reuse detection is for moderators; never fail the upload over it
+        logger.warning("Photo reuse lookup failed for listing %s", listing["id"], exc_info=True)
+        reused = {}
+
+    images, variants, rows = [], [], []
+    for h, (_, source) in zip(hashes, photos):
+        source = source or entries[h]["full"]
+        if any(v["source"] == source for v in variants):
+            continue
+        if append:
+            images.append(source)
+        variants.append({"source": source, **entries[h]})
+        matches = reused.get(phashes[h], [])
+        if matches:
+            REUSED.inc()
+            logger.info("Listing %s photo %s resembles listings %s", listing["id"], h[:12], matches)
+        rows.append({
+            "listing_id": listing["id"],
+            "owner_id": owner_id,
+            "content_hash": h,
+            "phash": phashes[h],
+            "width": entries[h]["width"],
+            "height": entries[h]["height"],
+            "variants": {name: entries[h][name] for name, _ in VARIANTS},
+            "source_url": source,
+            "reused_from": matches,
+        })
+
+    sb = get_supabase_admin()
+    # Photos the listing already has are skipped inside the same UPDATE
+    res = sb.rpc("append_listing_images", {
+        "p_listing_id": str(listing["id"]),
+        "p_images": images,
+        "p_variants": variants,
+        "p_max_images": max_images,
+    }).execute()
+    if rows:
+        sb.table("listing_images").upsert(rows, on_conflict="listing_id,content_hash", ignore_duplicates=True).execute()
+    dashboard_store.invalidate(owner_id)
+    written = res.data[0] if res.data else {}
+    return {"images": written.get("images") or [], "image_variants": written.get("image_variants") or []}
+
+
+def add_uploads(listing_id: str, user_id: str, uploads: list[tuple[str, BinaryIO]]) -> dict:
+    """
+    Handle POST /listings/{id}/images for the listing's owner. Uploads are
+    files (the request's spooled temporary files), read as they are processed.
+
+    Raises:
+        HTTPException: 404 unknown listing, 403 not the owner, 400 too many
+            photos or an invalid image
+    """
+    from postgrest.exceptions import APIError  # loaded with the client; deferred for startup time
+
+    res = (
+        get_supabase_admin().table("listings")
+        .select("id,owner_id,images")
+        .eq("id", listing_id)
+        .execute()
+    )
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    listing = res.data[0]
+    if str(listing["owner_id"]) != str(user_id):
+        raise HTTPException(status_code=403, detail="You can only add photos to your own listings")
+    # Checked again when the photos are appended, against the row as it is then
+    if len(listing.get("images") or []) + len(uploads) > MAX_IMAGES_PER_LISTING:
+        raise HTTPException(status_code=400, detail=f"A listing can have at most {MAX_IMAGES_PER_LISTING} photos")
+
+    try:
+        return ingest(listing, [(_file_reader(file), None) for _, file in uploads], append=True,
+                      max_images=MAX_IMAGES_PER_LISTING)
+    except InvalidImage as e:
+        raise HTTPException(status_code=400, detail=f"Could not process photo: {e}")
+    except APIError as e:
+        if e.code == "PT400":
+            raise HTTPException(status_code=400, detail=e.message)
+        raise
+
+
+# ── Backfill ─────────────────────────────────────────────────
+
+
+def _download(url: str) -> bytes:
+    import httpx
+
+    with httpx.stream("GET", url, timeout=20, follow_redirects=True) as response:
+        response.raise_for_status()
+        data = bytearray()
+        for chunk in response.iter_bytes():
+            data += chunk
+            if len(data) > MAX_BYTES:
+                raise InvalidImage("Image is too large")
+        return bytes(data)
+
+
+def backfill(limit: Optional[int] = None, page_size: int = 100) -> dict:
+    """
+    Ingest listings that have image URLs but no variants yet.
+
+    Photos that can't be downloaded or decoded are skipped and logged; the
+    listing keeps serving its original URLs for them.
+
+    Returns:
+        dict: Listings and photos processed, photos skipped
+    """
+    sb = get_supabase_admin()
+    done = {"listings": 0, "photos": 0, "skipped": 0}
+    last_id = None
+    while limit is None or done["listings"] < limit:
+        query = (
+            sb.table("listings").select("id,owner_id,images,image_variants")
+            .eq("image_variants", "[]").neq("images", "{}")
+        )
+        if last_id:
+            query = query.gt("id", last_id)
+        page = query.order("id").limit(page_size).execute().data
+        if not page:
+            break
+        for listing in page:
+            last_id = listing["id"]
+            photos = []
+            for url in listing.get("images") or []:
+                try:
+                    data = _download(url)
+                    photos.append((lambda data=data: data, url))
+                except Exception as e:
+                    done["skipped"] += 1
+                    logger.warning("Listing %s: skipping %s (%s)", listing["id"], url, e)
+            if photos:
+                recorded = ingest(listing, photos, append=False, skip_invalid=True)["image_variants"]
+                done["photos"] += len(recorded)
+                done["skipped"] += len(photos) - len(recorded)
+            done["listings"] += 1
+            if limit is not None and done["listings"] >= limit:
+                break
+        logger.info("Backfill: %s", done)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Listing photo pipeline")
+    parser.add_argument("--backfill", action="store_true", help="process existing listing image URLs")
+    parser.add_argument("--limit", type=int, help="stop after this many listings")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.print_help()
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    try:
+        print(backfill(args.limit))
+    finally:
+        shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,10 @@
+import os
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in each worker's memory by default, so with N workers a client
+# effectively gets N times each limit. Point this at shared storage (e.g.
+# redis://host:6379, needs the redis package) to enforce limits across workers.
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://")
+
+limiter = Limiter(key_func=get_remote_address, storage_uri=RATE_LIMIT_STORAGE_URI)
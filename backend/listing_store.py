@@ -0,0 +1,73 @@
+"""
+Listing data access.
+
+Listing searches are the hottest read in the app: a shared link or a busy
+city page sends many identical queries at once. Identical searches that are
+in flight at the same time share one upstream call (singleflight), keyed by
+the normalized filter set.
+
+Searches with stay dates go through the search_available_listings function
+(migration 024), which drops listings with an overlapping booking using the
+listing_bookings GiST index. sort=trending re-orders the shared result per
+caller (listing_views.rank), so it doesn't split the coalescing key.
+"""
+
+from datetime import date
+from typing import Optional
+
+from db import get_supabase, get_supabase_admin
+import listing_views
+from singleflight import Group
+
+_searches = Group("listing_search")
+
+
+def search_listings(
+    city: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    owner_id: Optional[str] = None,
+    move_in: Optional[date] = None,
+    move_out: Optional[date] = None,
+    sort: Optional[str] = None,
+) -> list[dict]:
+    """
+    Listings matching every given filter, most trending first with sort="trending".
+
+    Returns:
+        list: Listing rows (shared between coalesced callers; do not mutate)
+    """
+    key = (
+        city or None,
+        None if min_price is None else float(min_price),
+        None if max_price is None else float(max_price),
+        str(owner_id) if owner_id else None,
+        move_in.isoformat() if move_in else None,
+        move_out.isoformat() if move_in and move_out else None,
+    )
+
+    def fetch() -> list[dict]:
+        if key[4]:
+            return get_supabase_admin().rpc("search_available_listings", {
+                "p_move_in": key[4],
+                "p_move_out": key[5],
+                "p_city": key[0],
+                "p_min_price": key[1],
+                "p_max_price": key[2],
+                "p_owner_id": key[3],
+            }).execute().data
+        query = get_supabase().table("listings").select("*")
+        if key[0]:
+            query = query.eq("city", key[0])
+        if key[1] is not None:
+            query = query.gte("weekly_price", key[1])
+        if key[2] is not None:
+            query = query.lte("weekly_price", key[2])
+        if key[3]:
+            query = query.eq("owner_id", key[3])
+        return query.execute().data
+
+    rows = _searches.do(key, fetch)
+    if sort == "trending":
+        return listing_views.rank(rows, key[0])
+    return rows
@@ -0,0 +1,218 @@
+"""
+Listing view and impression counters, and the trending ranking built on them.
+
+POST /listings/views only bumps a counter in this worker's memory. A
+background thread flushes the aggregated increments every
+VIEWS_FLUSH_INTERVAL seconds (sooner once VIEWS_FLUSH_ROWS listings are
+pending) with a single record_listing_views call, one upsert for the whole
+batch, so a listing that is viewed a thousand times between flushes costs
+one row write. A viewer (the client address: tokens and user agents are
+unverified and free to rotate) counts once per listing and kind every
+VIEWS_DEDUP_SECONDS, and for at most VIEWS_PER_VIEWER listings of each kind
+in that window, per worker; the endpoint is rate limited as well.
+
+Trending scores are time-decayed and kept per listing by that same upsert
+(migration 025 explains the log-space encoding): ordering by the stored
+value is ordering by the decayed score now. sort=trending on GET /listings
+ranks the matching listings by each worker's cached copy of the top
+TRENDING_TOP_N listings for the city, refreshed every
+TRENDING_REFRESH_INTERVAL seconds; listings outside it keep the search's
+order, after the ranked ones.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from prometheus_client import Counter
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+from db import get_supabase_admin
+from singleflight import Group
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.environ.get("VIEWS_FLUSH_INTERVAL", "10"))
+FLUSH_ROWS = int(os.environ.get("VIEWS_FLUSH_ROWS", "2000"))
+DEDUP_SECONDS = float(os.environ.get("VIEWS_DEDUP_SECONDS", "1800"))
+DEDUP_MAX_ENTRIES = int(os.environ.get("VIEWS_DEDUP_MAX_ENTRIES", "200000"))
+# Distinct listings one viewer can add to each kind's counts per VIEWS_DEDUP_SECONDS
+PER_VIEWER = int(os.environ.get("VIEWS_PER_VIEWER", "500"))
+TRENDING_TOP_N = int(os.environ.get("TRENDING_TOP_N", "500"))
+TRENDING_REFRESH_INTERVAL = float(os.environ.get("TRENDING_REFRESH_INTERVAL", "60"))
+
+# Pending listings kept through a failing flush; beyond this, increments are dropped
+MAX_PENDING = FLUSH_ROWS * 20
+
+KINDS = ("view", "impression")
+
+RECORDED = Counter(
+    "listing_views_total",
+    "Listing views and impressions received",
+    ["kind", "result"],
+)
+FLUSHES = Counter(
+    "listing_view_flushes_total",
+    "Batched view counter writes",
+    ["outcome"],
+)
+DROPPED = Counter(
+    "listing_views_dropped_total",
+    "View increments dropped because flushes kept failing",
+)
+
+
+class ViewCounter:
+    """Per-worker view and impression counts, flushed in batches on one thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # listing_id -> [views, impressions]
+        self._pending: dict[str, list[int]] = {}
+        # (viewer, listing_id, kind) -> monotonic time it was last counted
+        self._seen: "OrderedDict[tuple, float]" = OrderedDict()
+        # (viewer, kind) -> [monotonic start of its window, listings counted in it]
+        self._budgets: "OrderedDict[tuple, list]" = OrderedDict()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="listing-views", daemon=True)
+        self._thread.start()
+
+    def record(self, listing_ids: list[str], kind: str, viewer: Optional[str] = None) -> int:
+        """Count one view or impression of each listing; returns how many were counted."""
+        column = KINDS.index(kind)
+        now = time.monotonic()
+        counted = capped = 0
+        with self._lock:
+            budget = None
+            if viewer is not None:
+                budget = self._budgets.get((viewer, kind))
+                if budget is None or now - budget[0] >= DEDUP_SECONDS:
+                    budget = self._budgets[(viewer, kind)] = [now, 0]
+                self._budgets.move_to_end((viewer, kind))
+                if len(self._budgets) > DEDUP_MAX_ENTRIES:
+                    self._budgets.popitem(last=False)
+            for listing_id in listing_ids:
+                if budget is not None:
+                    key = (viewer, listing_id, kind)
+                    last = self._seen.get(key)
+                    if last is not None and now - last < DEDUP_SECONDS:
+                        continue
+                    if budget[1] >= PER_VIEWER:
+                        capped += 1
+                        continue
+                    budget[1] += 1
+                    self._seen[key] = now
+                    self._seen.move_to_end(key)
+                    if len(self._seen) > DEDUP_MAX_ENTRIES:
+                        self._seen.popitem(last=False)
+                self._pending.setdefault(listing_id, [0, 0])[column] += 1
+                counted += 1
+            if len(self._pending) >= FLUSH_ROWS:
+                self._wake.set()
+        RECORDED.labels(kind, "counted").inc(counted)
+        RECORDED.labels(kind, "duplicate").inc(len(listing_ids) - counted - capped)
+        RECORDED.labels(kind, "capped").inc(capped)
+        return counted
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        rows = [{"listing_id": k, "views": v, "impressions": i} for k, (v, i) in batch.items()]
+        try:
+            get_supabase_admin().rpc("record_listing_views", {"p_rows": rows}).execute()
+            FLUSHES.labels("ok").inc()
+        except Exception:
+            FLUSHES.labels("error").inc()
+            logger.warning("Failed to write view counts for %d listings", len(rows), exc_info=True)
+            # Merged back for the next flush; bounded so an outage can't grow it forever
+            with self._lock:
+                for listing_id, (views, impressions) in batch.items():
+                    if listing_id not in self._pending and len(self._pending) >= MAX_PENDING:
+                        DROPPED.inc(views + impressions)
+                        continue
+                    counts = self._pending.setdefault(listing_id, [0, 0])
+                    counts[0] += views
+                    counts[1] += impressions
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self, timeout: float = 5) -> None:
+        """Flush what is pending and stop the thread."""
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        self.flush()
+
+
+def viewer_key(request: Request) -> str:
+    """Short, stable id of whoever sent `request` (their address), for de-duplicating their views."""
+    return hashlib.blake2b(get_remote_address(request).encode(), digest_size=8).hexdigest()
+
+
+_counter: Optional[ViewCounter] = None
+_counter_lock = threading.Lock()
+
+
+def record(listing_ids: list[str], kind: str = "view", viewer: Optional[str] = None) -> int:
+    """Count views or impressions (never blocks on the database)."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = ViewCounter()
+    return _counter.record(listing_ids, kind, viewer)
+
+
+def shutdown() -> None:
+    """Write pending counts; called from the lifespan handler on shutdown."""
+    if _counter is not None:
+        _counter.stop()
+
+
+# ── Trending ─────────────────────────────────────────────────
+
+
+_trending: dict[Optional[str], tuple[float, dict[str, float]]] = {}
+_refreshes = Group("trending")
+
+
+def top(city: Optional[str] = None) -> dict[str, float]:
+    """listing_id -> trending score (log scale) of the top listings in a city, or overall."""
+    cached = _trending.get(city)
+    if cached and time.monotonic() - cached[0] < TRENDING_REFRESH_INTERVAL:
+        return cached[1]
+
+    def fetch() -> dict[str, float]:
+        query = get_supabase_admin().table("listing_view_counts").select("listing_id,trending")
+        if city:
+            query = query.eq("city", city)
+        rows = query.order("trending", desc=True).limit(TRENDING_TOP_N).execute().data
+        scores = {str(r["listing_id"]): float(r["trending"]) for r in rows}
+        _trending[city] = (time.monotonic(), scores)
+        return scores
+
+    try:
+        return _refreshes.do(city, fetch)
+    except Exception:
+        if cached:
+            logger.warning("Trending refresh failed; serving the previous ranking", exc_info=True)
+            return cached[1]
+        raise
+
+
+def rank(listings: list[dict], city: Optional[str] = None) -> list[dict]:
+    """`listings` ordered by trending score; unranked listings keep their order, last."""
+    scores = top(city)
+    return sorted(listings, key=lambda l: scores.get(str(l["id"]), float("-inf")), reverse=True)
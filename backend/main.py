@@ -20,6 +20,10 @@ from routes_verification import router as verification_router
 from routes_referrals import router as referrals_router
 from routes_account import router as account_router
 from routes_messages import router as messages_router
+from routes_admin_analytics import router as admin_analytics_router
+from routes_dashboard import router as dashboard_router
+from routes_saved_searches import router as saved_searches_router
+from routes_stats import router as stats_router
 
 # ── Startup validation ──────────────────────────────────────
 REQUIRED_ENV = ["SUPABASE_URL", "SUPABASE_ANON_KEY", "STRIPE_SECRET_KEY", "STRIPE_WEBHOOK_SECRET"]
@@ -29,7 +33,19 @@ if missing:
 
 logger.info(f"PORT env var = {os.environ.get('PORT', 'not set')}")
 
-app = FastAPI(title="MigRent AI", version="0.1.0")
+# ── App & startup ───────────────────────────────────────────
+# Heavy SDKs (stripe, resend, supabase) load lazily; startup.lifespan warms
+# them in the background and flips GET /ready once done.
+from startup import lifespan
+from health import router as health_router
+from responses import FastJSONResponse, CompressionMiddleware
+
+app = FastAPI(
+    title="MigRent AI",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 # ── Rate limiting ───────────────────────────────────────────
 from limiter import limiter
@@ -39,6 +55,13 @@ from slowapi.errors import RateLimitExceeded
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# ── Admission control ───────────────────────────────────────
+from admission import AdmissionMiddleware
+
+# Added before CORS so shed responses still carry CORS headers, and before
+# metrics so they are counted
+app.add_middleware(AdmissionMiddleware)
+
 # ── CORS ────────────────────────────────────────────────────
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "")
 allowed_origins = [
@@ -56,6 +79,15 @@ app.add_middleware(
     allow_headers=["Authorization", "Content-Type"],
 )
 
+# ── Metrics & query tracing ─────────────────────────────────
+from metrics import MetricsMiddleware, router as metrics_router
+from tracing import QueryTraceMiddleware
+
+# Compression sits inside tracing/metrics so their timings include it
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryTraceMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(auth_router)
 app.include_router(listings_router)
 app.include_router(matches_router)
@@ -67,10 +99,24 @@ app.include_router(verification_router)
 app.include_router(referrals_router)
 app.include_router(messages_router)
 app.include_router(account_router)
+app.include_router(admin_analytics_router)
+app.include_router(dashboard_router)
+app.include_router(saved_searches_router)
+app.include_router(stats_router)
 app.include_router(webhook_router)
-
+app.include_router(metrics_router)
+app.include_router(health_router)
 # Note: each router defines its own prefix (/auth, /listings, /matches, /deals)
 
+# ── Uploaded media (local object store only) ────────────────
+import object_store
+
+if object_store.OBJECT_STORE == "local":
+    from fastapi.staticfiles import StaticFiles
+
+    object_store.MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
+    app.mount("/media", StaticFiles(directory=object_store.MEDIA_ROOT), name="media")
+
 
 @app.get("/")
 def health():
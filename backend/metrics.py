@@ -0,0 +1,216 @@
+"""
+Prometheus metrics for the API and its upstream dependencies.
+
+Exposes GET /metrics with:
+  - request latency histograms per route template (e.g. /profiles/{user_id})
+  - in-flight request gauge and per-route error counters
+  - outbound call histograms labelled by dependency and operation
+    (Supabase table/operation, Stripe, Resend)
+
+Each worker process records into its own prometheus_client values. When
+running several workers, set PROMETHEUS_MULTIPROC_DIR to an empty, writable
+directory before the process starts; /metrics then aggregates every worker's
+files so any worker can answer a scrape.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Optional
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", "")
+
+REQUEST_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Single upstream calls are usually faster than whole requests, so start lower
+DEPENDENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"],
+    buckets=REQUEST_BUCKETS,
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by route template and status code",
+    ["method", "route", "status"],
+)
+REQUEST_ERRORS = Counter(
+    "http_request_errors_total",
+    "HTTP requests that ended in a 5xx or an unhandled exception",
+    ["method", "route"],
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    multiprocess_mode="livesum",
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_call_duration_seconds",
+    "Outbound call latency by dependency and operation",
+    ["dependency", "operation", "outcome"],
+    buckets=DEPENDENCY_BUCKETS,
+)
+
+
+# ── Inbound requests ─────────────────────────────────────────
+
+
+def route_template(scope: dict) -> str:
+    """Route path template matched for this request, or "unmatched"."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and in-flight count per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            method = scope["method"]
+            route = route_template(scope)
+            REQUEST_LATENCY.labels(method, route).observe(elapsed)
+            REQUESTS.labels(method, route, str(status)).inc()
+            if status >= 500:
+                REQUEST_ERRORS.labels(method, route).inc()
+
+
+# ── Outbound calls ───────────────────────────────────────────
+
+
+@contextmanager
+def track_dependency(dependency: str, operation: str):
+    """Time an outbound call, e.g. `with track_dependency("stripe", "checkout.create"):`."""
+    outcome = "ok"
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        DEPENDENCY_LATENCY.labels(dependency, operation, outcome).observe(time.perf_counter() - start)
+
+
+_POSTGREST_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+def supabase_operation(request: httpx.Request) -> str:
+    """Label a Supabase HTTP call as "<table>.<operation>", "rpc.<fn>" or "auth.<path>"."""
+    parts = [p for p in urlsplit(str(request.url)).path.split("/") if p]
+    # /rest/v1/<table> | /rest/v1/rpc/<fn> | /auth/v1/<endpoint>
+    if len(parts) >= 3 and parts[0] == "rest":
+        if parts[2] == "rpc" and len(parts) >= 4:
+            return f"rpc.{parts[3]}"
+        op = _POSTGREST_OPERATIONS.get(request.method, request.method.lower())
+        if op == "insert" and "merge-duplicates" in request.headers.get("prefer", ""):
+            op = "upsert"
+        return f"{parts[2]}.{op}"
+    if len(parts) >= 3 and parts[0] == "auth":
+        return f"auth.{parts[2]}"
+    return parts[0] if parts else "unknown"
+
+
+# Called as hook(request, response_or_None, elapsed_seconds) after every
+# Supabase call; tracing.py registers its per-request recorder here.
+SUPABASE_CALL_HOOKS: list[Callable[[httpx.Request, Optional[httpx.Response], float], None]] = []
+
+
+class InstrumentedTransport:
+    """
+    httpx transport wrapper that times every Supabase call, including failed connects.
+
+    Duck-types httpx.BaseTransport so this module doesn't import httpx (and
+    its dependency tree) at startup.
+    """
+
+    def __init__(self, inner: httpx.BaseTransport):
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = None
+        start = time.perf_counter()
+        try:
+            response = self.inner.handle_request(request)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            outcome = "ok" if response is not None and response.status_code < 500 else "error"
+            DEPENDENCY_LATENCY.labels("supabase", supabase_operation(request), outcome).observe(elapsed)
+            for hook in SUPABASE_CALL_HOOKS:
+                hook(request, response, elapsed)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def __enter__(self):
+        self.inner.__enter__()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.inner.__exit__(*exc_info)
+
+
+def instrument_supabase(client) -> None:
+    """Wrap the transports of a Supabase client's PostgREST and auth HTTP sessions."""
+    import httpx  # already loaded by supabase
+
+    for session in (client.postgrest.session, getattr(client.auth, "_http_client", None)):
+        if isinstance(session, httpx.Client) and not isinstance(session._transport, InstrumentedTransport):
+            session._transport = InstrumentedTransport(session._transport)
+
+
+# ── GET /metrics ─────────────────────────────────────────────
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,80 @@
+-- Migration 016: Single-round-trip profile reads/writes
+-- Run this in your Supabase SQL Editor
+--
+-- save_profile() replaces the read-onboarding / upsert / re-select sequence in
+-- routes_profiles with one RPC. Locked fields are enforced inside the same
+-- transaction (row is locked with FOR UPDATE) and the written row is returned.
+-- get_or_create_profile() replaces the read-then-insert in GET /profiles/me.
+
+-- ============================================================
+-- 1. save_profile — conditional upsert that returns the row
+-- ============================================================
+-- Raises SQLSTATE PT403 (PostgREST maps PTxyz to HTTP xyz) when an onboarded
+-- profile tries to change one of p_locked.
+
+CREATE OR REPLACE FUNCTION save_profile(
+  p_id uuid,
+  p_updates jsonb,
+  p_locked text[] DEFAULT '{}'
+)
+RETURNS SETOF profiles
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_onboarded boolean;
+  v_blocked text;
+  v_row jsonb := p_updates || jsonb_build_object('id', p_id);
+  v_cols text;
+  v_sets text;
+BEGIN
+  SELECT onboarding_completed INTO v_onboarded
+  FROM profiles WHERE id = p_id
+  FOR UPDATE;
+
+  IF coalesce(v_onboarded, false) THEN
+    SELECT string_agg(k, ', ' ORDER BY k) INTO v_blocked
+    FROM jsonb_object_keys(p_updates) AS k
+    WHERE k = ANY(p_locked);
+
+    IF v_blocked IS NOT NULL THEN
+      RAISE EXCEPTION 'Cannot modify fields after onboarding: %', v_blocked
+        USING ERRCODE = 'PT403';
+    END IF;
+  END IF;
+
+  SELECT string_agg(format('%I', k), ', '),
+         string_agg(format('%I = excluded.%I', k, k), ', ') FILTER (WHERE k <> 'id')
+  INTO v_cols, v_sets
+  FROM jsonb_object_keys(v_row) AS k;
+
+  RETURN QUERY EXECUTE format(
+    'INSERT INTO profiles (%s) SELECT %s FROM jsonb_populate_record(NULL::profiles, $1) '
+    'ON CONFLICT (id) DO UPDATE SET %s RETURNING *',
+    v_cols, v_cols, coalesce(v_sets, 'id = excluded.id')
+  ) USING v_row;
+END;
+$$;
+
+-- ============================================================
+-- 2. get_or_create_profile — read, inserting an empty row if missing
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION get_or_create_profile(p_id uuid)
+RETURNS SETOF profiles
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  INSERT INTO profiles (id) VALUES (p_id) ON CONFLICT (id) DO NOTHING;
+  RETURN QUERY SELECT * FROM profiles WHERE id = p_id;
+END;
+$$;
+
+-- Only the backend (service role) calls these; they bypass RLS.
+REVOKE ALL ON FUNCTION save_profile(uuid, jsonb, text[]) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION get_or_create_profile(uuid) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION save_profile(uuid, jsonb, text[]) TO service_role;
+GRANT EXECUTE ON FUNCTION get_or_create_profile(uuid) TO service_role;
@@ -0,0 +1,196 @@
+-- Migration 017: Precomputed rollups for the admin analytics dashboard
+-- Run this in your Supabase SQL Editor
+--
+-- The admin dashboard used to pull every payment/listing row into the browser
+-- and aggregate there. These tables hold the aggregates instead; GET
+-- /admin/analytics reads them with a single admin_analytics_summary() call.
+
+-- ============================================================
+-- 1. ROLLUP TABLES
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS analytics_daily_revenue (
+  day date NOT NULL,
+  fee_type text NOT NULL,
+  amount_cents bigint NOT NULL DEFAULT 0,
+  payments int NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, fee_type)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_daily_signups (
+  day date PRIMARY KEY,
+  signups int NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS analytics_listing_locations (
+  city text NOT NULL DEFAULT '',
+  suburb text NOT NULL DEFAULT '',
+  listings int NOT NULL DEFAULT 0,
+  active_listings int NOT NULL DEFAULT 0,
+  PRIMARY KEY (city, suburb)
+);
+
+-- Backend only (service role)
+ALTER TABLE analytics_daily_revenue ENABLE ROW LEVEL SECURITY;
+ALTER TABLE analytics_daily_signups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE analytics_listing_locations ENABLE ROW LEVEL SECURITY;
+
+-- Source indexes so each refresh only touches the recent days
+CREATE INDEX IF NOT EXISTS idx_payment_events_created_at ON payment_events(created_at);
+CREATE INDEX IF NOT EXISTS idx_profiles_created_at ON profiles(created_at);
+
+-- ============================================================
+-- 2. DAILY REFRESH — recompute revenue/signups from p_since onwards
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION refresh_admin_rollups(p_since date DEFAULT current_date - 1)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  DELETE FROM analytics_daily_revenue WHERE day >= p_since;
+  INSERT INTO analytics_daily_revenue (day, fee_type, amount_cents, payments)
+  SELECT created_at::date, coalesce(fee_type, 'other'), sum(coalesce(amount, 0)), count(*)
+  FROM payment_events
+  WHERE created_at >= p_since
+    AND event_type = 'checkout.session.completed'
+  GROUP BY 1, 2;
+
+  DELETE FROM analytics_daily_signups WHERE day >= p_since;
+  INSERT INTO analytics_daily_signups (day, signups)
+  SELECT created_at::date, count(*)
+  FROM profiles
+  WHERE created_at >= p_since
+  GROUP BY 1;
+END;
+$$;
+
+-- ============================================================
+-- 3. LISTING LOCATIONS — maintained by trigger on listings
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION bump_listing_location(p_city text, p_suburb text, p_active boolean, p_delta int)
+RETURNS void
+LANGUAGE sql
+AS $$
+  INSERT INTO analytics_listing_locations (city, suburb, listings, active_listings)
+  VALUES (coalesce(p_city, ''), coalesce(p_suburb, ''), p_delta, CASE WHEN p_active THEN p_delta ELSE 0 END)
+  ON CONFLICT (city, suburb) DO UPDATE SET
+    listings = analytics_listing_locations.listings + excluded.listings,
+    active_listings = analytics_listing_locations.active_listings + excluded.active_listings;
+$$;
+
+CREATE OR REPLACE FUNCTION track_listing_location()
+RETURNS trigger
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM bump_listing_location(OLD.city, OLD.suburb, coalesce(OLD.status, 'active') = 'active', -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM bump_listing_location(NEW.city, NEW.suburb, coalesce(NEW.status, 'active') = 'active', 1);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_listing_location ON listings;
+CREATE TRIGGER trg_listing_location
+  AFTER INSERT OR DELETE OR UPDATE OF city, suburb, status ON listings
+  FOR EACH ROW EXECUTE FUNCTION track_listing_location();
+
+-- ============================================================
+-- 4. SUMMARY — everything the dashboard needs in one call
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION admin_analytics_summary(p_days int DEFAULT 180, p_top_locations int DEFAULT 10)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT jsonb_build_object(
+    'totals', jsonb_build_object(
+      'users', (SELECT coalesce(sum(signups), 0) FROM analytics_daily_signups),
+      'listings', (SELECT coalesce(sum(listings), 0) FROM analytics_listing_locations),
+      'active_listings', (SELECT coalesce(sum(active_listings), 0) FROM analytics_listing_locations),
+      'revenue_cents', (SELECT coalesce(sum(amount_cents), 0) FROM analytics_daily_revenue),
+      'month_revenue_cents', (
+        SELECT coalesce(sum(amount_cents), 0) FROM analytics_daily_revenue
+        WHERE day >= date_trunc('month', current_date)
+      )
+    ),
+    'revenue_by_day', coalesce((
+      SELECT jsonb_agg(jsonb_build_object('day', day, 'fee_type', fee_type,
+                                          'amount_cents', amount_cents, 'payments', payments)
+                       ORDER BY day, fee_type)
+      FROM analytics_daily_revenue WHERE day > current_date - p_days
+    ), '[]'::jsonb),
+    'revenue_by_month', coalesce((
+      SELECT jsonb_agg(jsonb_build_object('month', month, 'amount_cents', total) ORDER BY month)
+      FROM (
+        SELECT to_char(date_trunc('month', day), 'YYYY-MM') AS month, sum(amount_cents) AS total
+        FROM analytics_daily_revenue
+        WHERE day >= date_trunc('month', current_date) - interval '11 months'
+        GROUP BY 1
+      ) t
+    ), '[]'::jsonb),
+    'revenue_by_fee_type', coalesce((
+      SELECT jsonb_agg(jsonb_build_object('fee_type', fee_type, 'amount_cents', total) ORDER BY fee_type)
+      FROM (SELECT fee_type, sum(amount_cents) AS total FROM analytics_daily_revenue GROUP BY fee_type) t
+    ), '[]'::jsonb),
+    'signups_by_day', coalesce((
+      SELECT jsonb_agg(jsonb_build_object('day', day, 'signups', signups) ORDER BY day)
+      FROM analytics_daily_signups WHERE day > current_date - p_days
+    ), '[]'::jsonb),
+    'listings_by_location', coalesce((
+      SELECT jsonb_agg(to_jsonb(t) ORDER BY t.active_listings DESC)
+      FROM (
+        SELECT city, suburb, listings, active_listings FROM analytics_listing_locations
+        WHERE listings > 0
+        ORDER BY active_listings DESC
+        LIMIT p_top_locations
+      ) t
+    ), '[]'::jsonb),
+    'refreshed_at', now()
+  );
+$$;
+
+REVOKE ALL ON FUNCTION refresh_admin_rollups(date) FROM PUBLIC, anon, authenticated;
+REVOKE ALL ON FUNCTION admin_analytics_summary(int, int) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION refresh_admin_rollups(date) TO service_role;
+GRANT EXECUTE ON FUNCTION admin_analytics_summary(int, int) TO service_role;
+
+-- ============================================================
+-- 5. BACKFILL + SCHEDULE
+-- ============================================================
+
+SELECT refresh_admin_rollups('1970-01-01');
+
+TRUNCATE analytics_listing_locations;
+INSERT INTO analytics_listing_locations (city, suburb, listings, active_listings)
+SELECT coalesce(city, ''), coalesce(suburb, ''), count(*),
+       count(*) FILTER (WHERE coalesce(status, 'active') = 'active')
+FROM listings
+GROUP BY 1, 2;
+
+-- Re-aggregate yesterday and today every 10 minutes (needs pg_cron:
+-- Supabase Dashboard → Database → Extensions). Without pg_cron, call
+-- POST /admin/analytics/refresh from any external scheduler instead.
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+    PERFORM cron.schedule(
+      'refresh-admin-rollups',
+      '*/10 * * * *',
+      'SELECT refresh_admin_rollups(current_date - 1)'
+    );
+  END IF;
+END;
+$$;
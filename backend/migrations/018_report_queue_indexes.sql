@@ -0,0 +1,71 @@
+-- Migration 018: Indexes and grouping function for the admin moderation queue
+-- Run this in your Supabase SQL Editor
+
+-- ============================================================
+-- 1. INDEXES
+-- ============================================================
+
+-- create_report duplicate check: reporter_id + listing_id among pending reports
+CREATE INDEX IF NOT EXISTS idx_reports_pending_dup
+  ON reports(reporter_id, listing_id)
+  WHERE status = 'pending';
+
+-- Queue ordering / keyset pagination: newest first within a status
+CREATE INDEX IF NOT EXISTS idx_reports_status_created
+  ON reports(status, created_at DESC, id DESC);
+
+-- Grouping by reported item
+CREATE INDEX IF NOT EXISTS idx_reports_item
+  ON reports(item_type, item_id);
+
+-- ============================================================
+-- 2. REPORT QUEUE — reports grouped by reported item
+-- ============================================================
+-- One row per (item_type, item_id), newest activity first. Page with
+-- (p_before, p_before_item) = (last_reported_at, item_id) of the last row.
+
+CREATE OR REPLACE FUNCTION report_queue(
+  p_status text DEFAULT 'pending',
+  p_item_type text DEFAULT NULL,
+  p_reason text DEFAULT NULL,
+  p_before timestamptz DEFAULT NULL,
+  p_before_item text DEFAULT NULL,
+  p_limit int DEFAULT 50
+)
+RETURNS TABLE (
+  item_type text,
+  item_id text,
+  report_count bigint,
+  reasons text[],
+  first_reported_at timestamptz,
+  last_reported_at timestamptz,
+  report_ids uuid[]
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT * FROM (
+    SELECT
+      coalesce(r.item_type, 'listing') AS item_type,
+      coalesce(r.item_id, r.listing_id::text) AS item_id,
+      count(*) AS report_count,
+      array_agg(DISTINCT r.reason) AS reasons,
+      min(r.created_at) AS first_reported_at,
+      max(r.created_at) AS last_reported_at,
+      array_agg(r.id ORDER BY r.created_at DESC) AS report_ids
+    FROM reports r
+    WHERE (p_status IS NULL OR r.status = p_status)
+      AND (p_item_type IS NULL OR coalesce(r.item_type, 'listing') = p_item_type)
+      AND (p_reason IS NULL OR r.reason = p_reason)
+    GROUP BY 1, 2
+  ) g
+  WHERE p_before IS NULL
+     OR (g.last_reported_at, g.item_id) < (p_before, coalesce(p_before_item, ''))
+  ORDER BY g.last_reported_at DESC, g.item_id DESC
+  LIMIT p_limit;
+$$;
+
+REVOKE ALL ON FUNCTION report_queue(text, text, text, timestamptz, text, int) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION report_queue(text, text, text, timestamptz, text, int) TO service_role;
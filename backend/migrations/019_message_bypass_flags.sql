@@ -0,0 +1,35 @@
+-- Migration 019: Bypass flags raised from message content
+-- Run this in your Supabase SQL Editor
+
+-- ============================================================
+-- 1. COLUMNS
+-- ============================================================
+-- Flags used to come only from cancel_deal. The message detector (bypass.py)
+-- also flags conversations where users swap phone numbers, emails or payment
+-- handles. Direct conversations have no listing, so owner/seeker are unknown.
+
+ALTER TABLE bypass_flags ADD COLUMN IF NOT EXISTS source text NOT NULL DEFAULT 'deal_cancel';
+ALTER TABLE bypass_flags ADD COLUMN IF NOT EXISTS listing_id uuid;
+-- "<listing_id or direct>:<user a>:<user b>" with the two user ids sorted
+ALTER TABLE bypass_flags ADD COLUMN IF NOT EXISTS thread_key text;
+ALTER TABLE bypass_flags ADD COLUMN IF NOT EXISTS score real;
+ALTER TABLE bypass_flags ADD COLUMN IF NOT EXISTS signals text[] DEFAULT '{}';
+ALTER TABLE bypass_flags ADD COLUMN IF NOT EXISTS message_ids uuid[] DEFAULT '{}';
+
+ALTER TABLE bypass_flags ALTER COLUMN owner_id DROP NOT NULL;
+ALTER TABLE bypass_flags ALTER COLUMN seeker_id DROP NOT NULL;
+
+-- ============================================================
+-- 2. INDEXES
+-- ============================================================
+
+-- One message flag per user per conversation; lets every worker and the
+-- backfill insert with ON CONFLICT DO NOTHING. Deal flags have no thread_key
+-- (NULLs never conflict).
+CREATE UNIQUE INDEX IF NOT EXISTS idx_bypass_flags_thread_user
+  ON bypass_flags(thread_key, flagged_user_id);
+
+-- Admin review queue
+CREATE INDEX IF NOT EXISTS idx_bypass_flags_unreviewed
+  ON bypass_flags(source, created_at DESC)
+  WHERE reviewed = false;
@@ -0,0 +1,40 @@
+-- Migration 020: MinHash fingerprints for near-duplicate listing detection
+-- Run this in your Supabase SQL Editor
+--
+-- Scammers repost the same listing with small edits. create_listing stores a
+-- MinHash signature of every new listing's title/description plus its
+-- normalized address; each API worker keeps them in an in-memory LSH index
+-- (duplicates.py) to find near-duplicates at create time. Existing listings
+-- are fingerprinted by `python -m duplicates --backfill`.
+
+-- ============================================================
+-- 1. FINGERPRINTS
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS listing_fingerprints (
+  listing_id uuid PRIMARY KEY REFERENCES listings(id) ON DELETE CASCADE,
+  owner_id uuid NOT NULL,
+  -- NUM_PERM (64, duplicates.py) minimum hashes (values < 2^61)
+  minhash bigint[] NOT NULL,
+  address_key text,
+  -- Listings it resembled when it was fingerprinted, for moderators
+  duplicate_of uuid[] NOT NULL DEFAULT '{}',
+  max_similarity real NOT NULL DEFAULT 0,
+  created_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Backend only (service role)
+ALTER TABLE listing_fingerprints ENABLE ROW LEVEL SECURITY;
+
+-- ============================================================
+-- 2. INDEXES
+-- ============================================================
+
+-- Workers page new fingerprints in by (created_at, listing_id)
+CREATE INDEX IF NOT EXISTS idx_listing_fingerprints_created
+  ON listing_fingerprints(created_at, listing_id);
+
+-- Moderator queue: listings that resembled another at create time
+CREATE INDEX IF NOT EXISTS idx_listing_fingerprints_suspect
+  ON listing_fingerprints(max_similarity DESC)
+  WHERE max_similarity > 0;
@@ -0,0 +1,80 @@
+-- Migration 021: Processed listing photos and perceptual hashes
+-- Run this in your Supabase SQL Editor
+--
+-- Photos uploaded to POST /listings/{id}/images (or ingested from existing
+-- listings.images URLs by `python -m images --backfill`) are re-encoded as
+-- WebP at several widths (images.py). listings.image_variants holds the
+-- variant URLs for the cards and gallery; listing_images keeps one row per
+-- photo with its perceptual hash, used to spot stock or stolen photos reused
+-- across owners.
+
+-- ============================================================
+-- 1. COLUMNS & TABLES
+-- ============================================================
+
+-- [{"source": <url in images>, "thumb": url, "card": url, "full": url,
+--   "width": int, "height": int}, ...] in the same order as images
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS image_variants jsonb NOT NULL DEFAULT '[]';
+
+CREATE TABLE IF NOT EXISTS listing_images (
+  id uuid DEFAULT gen_random_uuid() PRIMARY KEY,
+  listing_id uuid NOT NULL REFERENCES listings(id) ON DELETE CASCADE,
+  owner_id uuid NOT NULL,
+  -- sha256 of the original file; identical uploads are processed once
+  content_hash text NOT NULL,
+  -- 64-bit difference hash (signed), compared by Hamming distance
+  phash bigint NOT NULL,
+  width int,
+  height int,
+  variants jsonb NOT NULL,
+  source_url text,
+  -- Other owners' listings with a near-identical photo at upload time
+  reused_from uuid[] NOT NULL DEFAULT '{}',
+  created_at timestamptz NOT NULL DEFAULT now(),
+  UNIQUE (listing_id, content_hash)
+);
+
+-- Backend only (service role)
+ALTER TABLE listing_images ENABLE ROW LEVEL SECURITY;
+
+-- ============================================================
+-- 2. INDEXES
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_listing_images_content_hash ON listing_images(content_hash);
+
+-- Covering index so similar_listing_images() scans the index only
+CREATE INDEX IF NOT EXISTS idx_listing_images_phash
+  ON listing_images(phash) INCLUDE (owner_id, listing_id);
+
+-- Moderator queue
+CREATE INDEX IF NOT EXISTS idx_listing_images_reused
+  ON listing_images(created_at DESC)
+  WHERE cardinality(reused_from) > 0;
+
+-- ============================================================
+-- 3. REUSE LOOKUP — other owners' photos within a Hamming distance
+-- ============================================================
+-- A linear scan of 8-byte hashes; a few hundred thousand photos take
+-- tens of milliseconds, once per upload.
+
+CREATE OR REPLACE FUNCTION similar_listing_images(
+  p_phashes bigint[],
+  p_owner_id uuid,
+  p_max_distance int DEFAULT 6
+)
+RETURNS TABLE (phash bigint, listing_id uuid, distance int)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT q.phash, li.listing_id, bit_count((li.phash # q.phash)::bit(64))::int AS distance
+  FROM unnest(p_phashes) AS q(phash)
+  JOIN listing_images li
+    ON bit_count((li.phash # q.phash)::bit(64)) <= p_max_distance
+  WHERE li.owner_id <> p_owner_id;
+$$;
+
+REVOKE ALL ON FUNCTION similar_listing_images(bigint[], uuid, int) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION similar_listing_images(bigint[], uuid, int) TO service_role;
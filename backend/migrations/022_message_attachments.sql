@@ -0,0 +1,53 @@
+-- Migration 022: Message attachment uploads and per-user quotas
+-- Run this in your Supabase SQL Editor
+--
+-- POST /messages/attachments streams a file into the object store and
+-- returns its URL for send_message (attachments.py). Files are stored by
+-- content hash, so identical files are stored once; this table records who
+-- uploaded what, for quotas and moderation.
+
+-- ============================================================
+-- 1. TABLE
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS message_attachments (
+  id uuid DEFAULT gen_random_uuid() PRIMARY KEY,
+  user_id uuid NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+  -- sha256 of the file contents
+  content_hash text NOT NULL,
+  size bigint NOT NULL,
+  -- Detected from the file's magic bytes, not the client's Content-Type
+  content_type text NOT NULL,
+  filename text,
+  url text NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  -- Re-uploading the same file doesn't count against the quota twice
+  UNIQUE (user_id, content_hash)
+);
+
+-- Backend only (service role)
+ALTER TABLE message_attachments ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_message_attachments_user_created
+  ON message_attachments(user_id, created_at);
+
+-- ============================================================
+-- 2. QUOTA USAGE
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION attachment_usage(p_user_id uuid)
+RETURNS TABLE (day_bytes bigint, total_bytes bigint)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT
+    coalesce(sum(size) FILTER (WHERE created_at > now() - interval '1 day'), 0)::bigint,
+    coalesce(sum(size), 0)::bigint
+  FROM message_attachments
+  WHERE user_id = p_user_id;
+$$;
+
+REVOKE ALL ON FUNCTION attachment_usage(uuid) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION attachment_usage(uuid) TO service_role;
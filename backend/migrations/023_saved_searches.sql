@@ -0,0 +1,60 @@
+-- Migration 023: Saved searches and new-listing alerts
+-- Run this in your Supabase SQL Editor
+--
+-- Seekers save a set of /listings filters. When a listing is created, each
+-- API worker matches it against its in-memory inverted index of saved
+-- searches (search_alerts.py) and records one search_alerts row per match;
+-- `python -m search_alerts --digest` emails unsent alerts, one email per user.
+
+-- ============================================================
+-- 1. TABLES
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS saved_searches (
+  id uuid DEFAULT gen_random_uuid() PRIMARY KEY,
+  user_id uuid NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+  name text,
+  city text,
+  postcode int,
+  min_price numeric,
+  max_price numeric,
+  -- Boolean listing columns that must be true (models.SEARCH_AMENITIES)
+  amenities text[] NOT NULL DEFAULT '{}',
+  notify boolean NOT NULL DEFAULT true,
+  -- Deleting only deactivates, so workers can sync removals incrementally
+  active boolean NOT NULL DEFAULT true,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS search_alerts (
+  id uuid DEFAULT gen_random_uuid() PRIMARY KEY,
+  saved_search_id uuid NOT NULL REFERENCES saved_searches(id) ON DELETE CASCADE,
+  user_id uuid NOT NULL,
+  listing_id uuid NOT NULL REFERENCES listings(id) ON DELETE CASCADE,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  -- Set once the digest job has handled it (emailed if the search has notify)
+  notified_at timestamptz,
+  read_at timestamptz,
+  UNIQUE (saved_search_id, listing_id)
+);
+
+-- Backend only (service role)
+ALTER TABLE saved_searches ENABLE ROW LEVEL SECURITY;
+ALTER TABLE search_alerts ENABLE ROW LEVEL SECURITY;
+
+-- ============================================================
+-- 2. INDEXES
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches(user_id) WHERE active;
+
+-- Workers page changes in by (updated_at, id)
+CREATE INDEX IF NOT EXISTS idx_saved_searches_updated ON saved_searches(updated_at, id);
+
+CREATE INDEX IF NOT EXISTS idx_search_alerts_user ON search_alerts(user_id, created_at DESC);
+
+-- Digest queue
+CREATE INDEX IF NOT EXISTS idx_search_alerts_unsent
+  ON search_alerts(created_at)
+  WHERE notified_at IS NULL;
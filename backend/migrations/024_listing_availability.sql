@@ -0,0 +1,106 @@
+-- Migration 024: Listing availability calendar
+-- Run this in your Supabase SQL Editor (needs Postgres 14+ for multiranges)
+--
+-- Booked and owner-blocked dates per listing, as dateranges
+-- [move-in, move-out). The exclusion constraint makes overlapping bookings of
+-- one listing impossible, so two deals racing for the same dates can't both
+-- succeed; its GiST index also serves every overlap query below
+-- (availability.py).
+
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- ============================================================
+-- 1. TABLE
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS listing_bookings (
+  id uuid DEFAULT gen_random_uuid() PRIMARY KEY,
+  listing_id uuid NOT NULL REFERENCES listings(id) ON DELETE CASCADE,
+  -- No upper bound = open-ended stay
+  period daterange NOT NULL CHECK (NOT isempty(period) AND NOT lower_inf(period)),
+  -- 'deal': held by a deal (released when it is cancelled); 'blocked': set by the owner
+  source text NOT NULL DEFAULT 'deal' CHECK (source IN ('deal', 'blocked')),
+  deal_id uuid UNIQUE REFERENCES deals(id) ON DELETE CASCADE,
+  created_by uuid REFERENCES auth.users(id) ON DELETE SET NULL,
+  note text,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  CONSTRAINT listing_bookings_no_overlap EXCLUDE USING gist (listing_id WITH =, period WITH &&)
+);
+
+-- Backend only (service role)
+ALTER TABLE listing_bookings ENABLE ROW LEVEL SECURITY;
+
+-- ============================================================
+-- 2. FREE WINDOWS
+-- ============================================================
+
+-- Free date ranges [start_date, end_date) of a listing within [p_start, p_end),
+-- inside the listing's own available_from..available_to (inclusive) window
+CREATE OR REPLACE FUNCTION listing_free_windows(p_listing_id uuid, p_start date, p_end date)
+RETURNS TABLE (start_date date, end_date date)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH bounds AS (
+    SELECT CASE
+      WHEN l.available_to < l.available_from THEN 'empty'::daterange
+      ELSE daterange(p_start, p_end) * daterange(l.available_from, l.available_to, '[]')
+    END AS span
+    FROM listings l
+    WHERE l.id = p_listing_id
+  )
+  SELECT lower(free), upper(free)
+  FROM bounds,
+       unnest(datemultirange(bounds.span) - coalesce(
+         (SELECT range_agg(b.period)
+          FROM listing_bookings b
+          WHERE b.listing_id = p_listing_id AND b.period && bounds.span),
+         '{}'::datemultirange
+       )) AS free
+  ORDER BY 1;
+$$;
+
+REVOKE ALL ON FUNCTION listing_free_windows(uuid, date, date) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION listing_free_windows(uuid, date, date) TO service_role;
+
+-- ============================================================
+-- 3. SEARCH BY STAY DATES
+-- ============================================================
+
+-- GET /listings filters plus "free from p_move_in to p_move_out" (NULL
+-- move-out = open-ended stay). The NOT EXISTS probe is one GiST index scan
+-- per candidate listing, however many bookings the listing has.
+CREATE OR REPLACE FUNCTION search_available_listings(
+  p_move_in date,
+  p_move_out date DEFAULT NULL,
+  p_city text DEFAULT NULL,
+  p_min_price numeric DEFAULT NULL,
+  p_max_price numeric DEFAULT NULL,
+  p_owner_id uuid DEFAULT NULL
+)
+RETURNS SETOF listings
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT l.*
+  FROM listings l
+  WHERE (p_city IS NULL OR l.city = p_city)
+    AND (p_min_price IS NULL OR l.weekly_price >= p_min_price)
+    AND (p_max_price IS NULL OR l.weekly_price <= p_max_price)
+    AND (p_owner_id IS NULL OR l.owner_id = p_owner_id)
+    AND (l.available_from IS NULL OR l.available_from <= p_move_in)
+    AND (l.available_to IS NULL OR (p_move_out IS NOT NULL AND l.available_to >= p_move_out - 1))
+    AND NOT EXISTS (
+      SELECT 1
+      FROM listing_bookings b
+      WHERE b.listing_id = l.id
+        AND b.period && daterange(p_move_in, p_move_out)
+    );
+$$;
+
+REVOKE ALL ON FUNCTION search_available_listings(date, date, text, numeric, numeric, uuid) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION search_available_listings(date, date, text, numeric, numeric, uuid) TO service_role;
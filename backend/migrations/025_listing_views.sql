@@ -0,0 +1,80 @@
+-- Migration 025: Listing view counters and trending scores
+-- Run this in your Supabase SQL Editor
+--
+-- API workers count views and impressions in memory and flush the
+-- aggregated increments every few seconds with one record_listing_views
+-- call (listing_views.py), so this table sees one row write per listing per
+-- flush rather than one per view.
+
+-- ============================================================
+-- 1. TABLE
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS listing_view_counts (
+  listing_id uuid PRIMARY KEY REFERENCES listings(id) ON DELETE CASCADE,
+  -- Copied from the listing on each flush, for per-city rankings
+  city text,
+  views bigint NOT NULL DEFAULT 0,
+  impressions bigint NOT NULL DEFAULT 0,
+  -- log2 of the time-decayed score, scaled to 2025-01-01 (see below)
+  trending double precision NOT NULL,
+  last_viewed_at timestamptz,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Backend only (service role)
+ALTER TABLE listing_view_counts ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_listing_view_counts_city_trending
+  ON listing_view_counts(city, trending DESC);
+
+CREATE INDEX IF NOT EXISTS idx_listing_view_counts_trending
+  ON listing_view_counts(trending DESC);
+
+-- ============================================================
+-- 2. BATCHED INCREMENTS
+-- ============================================================
+
+-- p_rows: [{"listing_id", "views", "impressions"}, ...]
+--
+-- A view adds 1 to a listing's trending score and an impression 0.05; the
+-- score halves every 24 hours. Rather than decaying every row as time
+-- passes, a view at time t adds 2^((t - 2025-01-01) / 24h) and the column
+-- holds log2 of the running sum (combined with log-sum-exp, so it never
+-- overflows). Every listing is scaled to the same instant, so ordering by
+-- `trending` is ordering by the decayed score now, and a flush only touches
+-- the listings that were viewed.
+CREATE OR REPLACE FUNCTION record_listing_views(p_rows jsonb)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  INSERT INTO listing_view_counts AS c
+    (listing_id, city, views, impressions, trending, last_viewed_at, updated_at)
+  SELECT
+    r.listing_id,
+    l.city,
+    r.views,
+    r.impressions,
+    ln(r.views + 0.05 * r.impressions) / ln(2)
+      + (extract(epoch FROM now()) - extract(epoch FROM timestamptz '2025-01-01 00:00+00')) / 86400.0,
+    CASE WHEN r.views > 0 THEN now() END,
+    now()
+  FROM jsonb_to_recordset(p_rows) AS r(listing_id uuid, views bigint, impressions bigint)
+  JOIN listings l ON l.id = r.listing_id
+  WHERE r.views + r.impressions > 0
+  -- Same lock order in every worker's flush
+  ORDER BY r.listing_id
+  ON CONFLICT (listing_id) DO UPDATE SET
+    city = EXCLUDED.city,
+    views = c.views + EXCLUDED.views,
+    impressions = c.impressions + EXCLUDED.impressions,
+    trending = greatest(c.trending, EXCLUDED.trending)
+      + ln(1 + power(2, -abs(c.trending - EXCLUDED.trending))) / ln(2),
+    last_viewed_at = coalesce(EXCLUDED.last_viewed_at, c.last_viewed_at),
+    updated_at = now();
+$$;
+
+REVOKE ALL ON FUNCTION record_listing_views(jsonb) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION record_listing_views(jsonb) TO service_role;
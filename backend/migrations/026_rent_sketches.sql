@@ -0,0 +1,32 @@
+-- Migration 026: Rent distribution sketches
+-- Run this in your Supabase SQL Editor
+--
+-- Weekly price quantile sketches (KLL) per postcode, and per postcode and
+-- property or place type, written by `python -m rent_stats --rebuild`
+-- (rent_stats.py). API workers load them at start-up and add listings
+-- created after the build, so GET /stats/rent never scans listings.
+
+-- ============================================================
+-- 1. TABLE
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS rent_sketches (
+  postcode int NOT NULL,
+  -- '' for every listing in the postcode
+  dimension text NOT NULL DEFAULT '' CHECK (dimension IN ('', 'property_type', 'place_type')),
+  value text NOT NULL DEFAULT '',
+  listings int NOT NULL,
+  -- {"k": ..., "n": ..., "levels": [[prices], ...]}; a few KB at most
+  sketch jsonb NOT NULL,
+  built_at timestamptz NOT NULL,
+  -- Last listing (created_at, id) the build read; workers page in listings after it
+  through_created_at timestamptz,
+  through_id uuid,
+  PRIMARY KEY (postcode, dimension, value)
+);
+
+-- Backend only (service role)
+ALTER TABLE rent_sketches ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_rent_sketches_built_at
+  ON rent_sketches(built_at DESC);
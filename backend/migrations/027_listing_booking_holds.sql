@@ -0,0 +1,86 @@
+-- Migration 027: Expiring holds for unpaid deals
+-- Run this in your Supabase SQL Editor (after 024)
+--
+-- A deal books its dates when it is created, before the owner fee is paid.
+-- Those bookings now carry expires_at (the end of the deal's Stripe
+-- checkout window) and stop counting once it passes; the owner-paid webhook
+-- clears it, making the booking permanent. Expired rows are ignored below
+-- and deleted by availability.book before it inserts, so the exclusion
+-- constraint never blocks on them (availability.py).
+
+-- ============================================================
+-- 1. COLUMN
+-- ============================================================
+
+ALTER TABLE listing_bookings ADD COLUMN IF NOT EXISTS expires_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS idx_listing_bookings_expires_at
+  ON listing_bookings(listing_id, expires_at)
+  WHERE expires_at IS NOT NULL;
+
+-- ============================================================
+-- 2. FREE WINDOWS (ignoring expired holds)
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION listing_free_windows(p_listing_id uuid, p_start date, p_end date)
+RETURNS TABLE (start_date date, end_date date)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH bounds AS (
+    SELECT CASE
+      WHEN l.available_to < l.available_from THEN 'empty'::daterange
+      ELSE daterange(p_start, p_end) * daterange(l.available_from, l.available_to, '[]')
+    END AS span
+    FROM listings l
+    WHERE l.id = p_listing_id
+  )
+  SELECT lower(free), upper(free)
+  FROM bounds,
+       unnest(datemultirange(bounds.span) - coalesce(
+         (SELECT range_agg(b.period)
+          FROM listing_bookings b
+          WHERE b.listing_id = p_listing_id
+            AND b.period && bounds.span
+            AND (b.expires_at IS NULL OR b.expires_at > now())),
+         '{}'::datemultirange
+       )) AS free
+  ORDER BY 1;
+$$;
+
+-- ============================================================
+-- 3. SEARCH BY STAY DATES (ignoring expired holds)
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION search_available_listings(
+  p_move_in date,
+  p_move_out date DEFAULT NULL,
+  p_city text DEFAULT NULL,
+  p_min_price numeric DEFAULT NULL,
+  p_max_price numeric DEFAULT NULL,
+  p_owner_id uuid DEFAULT NULL
+)
+RETURNS SETOF listings
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT l.*
+  FROM listings l
+  WHERE (p_city IS NULL OR l.city = p_city)
+    AND (p_min_price IS NULL OR l.weekly_price >= p_min_price)
+    AND (p_max_price IS NULL OR l.weekly_price <= p_max_price)
+    AND (p_owner_id IS NULL OR l.owner_id = p_owner_id)
+    AND (l.available_from IS NULL OR l.available_from <= p_move_in)
+    AND (l.available_to IS NULL OR (p_move_out IS NOT NULL AND l.available_to >= p_move_out - 1))
+    AND NOT EXISTS (
+      SELECT 1
+      FROM listing_bookings b
+      WHERE b.listing_id = l.id
+        AND b.period && daterange(p_move_in, p_move_out)
+        AND (b.expires_at IS NULL OR b.expires_at > now())
+    );
+$$;
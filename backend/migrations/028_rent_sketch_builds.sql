@@ -0,0 +1,42 @@
+-- Migration 028: Complete rent sketch builds
+-- Run this in your Supabase SQL Editor (after 026)
+--
+-- A rebuild used to upsert over the previous build in batches, so a worker
+-- syncing halfway through loaded a mix of both. Each build's sketches now
+-- keep their own rows, and a build only becomes visible once its row in
+-- rent_sketch_builds is written, after every sketch is stored. The previous
+-- build is kept until the next one completes, so a worker still loading it
+-- isn't cut short (rent_stats.py).
+
+-- ============================================================
+-- 1. SKETCHES PER BUILD
+-- ============================================================
+
+-- Old single-build rows; the next `python -m rent_stats --rebuild` writes them again
+TRUNCATE rent_sketches;
+
+ALTER TABLE rent_sketches DROP CONSTRAINT IF EXISTS rent_sketches_pkey;
+ALTER TABLE rent_sketches ADD PRIMARY KEY (built_at, postcode, dimension, value);
+ALTER TABLE rent_sketches DROP COLUMN IF EXISTS through_created_at;
+ALTER TABLE rent_sketches DROP COLUMN IF EXISTS through_id;
+
+DROP INDEX IF EXISTS idx_rent_sketches_built_at;
+
+-- ============================================================
+-- 2. COMPLETED BUILDS
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS rent_sketch_builds (
+  built_at timestamptz PRIMARY KEY,
+  sketches int NOT NULL,
+  listings int NOT NULL,
+  -- Newest listing created_at the build read; workers page in listings from shortly before it
+  through_created_at timestamptz,
+  -- Listings the build read within SYNC_OVERLAP_SECONDS of through_created_at,
+  -- so the first sync after loading doesn't count them twice
+  through_ids uuid[] NOT NULL DEFAULT '{}',
+  completed_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- Backend only (service role)
+ALTER TABLE rent_sketch_builds ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,63 @@
+-- Migration 029: Append listing photos in one statement
+-- Run this in your Supabase SQL Editor (after 021)
+--
+-- images.py used to read listings.images/image_variants, append in Python
+-- and write both arrays back, so two uploads to the same listing at once
+-- could each overwrite the other's photos. append_listing_images() appends
+-- under the row lock the UPDATE takes, skipping photos the listing already
+-- has, and returns the arrays as written.
+
+-- ============================================================
+-- 1. append_listing_images — atomic append, returns the new arrays
+-- ============================================================
+-- p_images: URLs to add to images (empty when describing existing URLs)
+-- p_variants: image_variants entries to add; entries whose "source" is
+--   already described are skipped, and so are their p_images URLs
+-- Raises SQLSTATE PT400 (HTTP 400) if images would exceed p_max_images.
+
+CREATE OR REPLACE FUNCTION append_listing_images(
+  p_listing_id uuid,
+  p_images text[],
+  p_variants jsonb,
+  p_max_images int DEFAULT NULL
+)
+RETURNS TABLE (images text[], image_variants jsonb)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_images text[];
+  v_variants jsonb;
+BEGIN
+  UPDATE listings l
+  SET images = coalesce(l.images, '{}') || ARRAY(
+        SELECT i FROM unnest(p_images) WITH ORDINALITY AS n(i, ord)
+        WHERE NOT i = ANY(coalesce(l.images, '{}'))
+          AND NOT EXISTS (
+            SELECT 1 FROM jsonb_array_elements(l.image_variants) e WHERE e->>'source' = i
+          )
+        ORDER BY ord
+      ),
+      image_variants = l.image_variants || coalesce((
+        SELECT jsonb_agg(v ORDER BY ord)
+        FROM jsonb_array_elements(p_variants) WITH ORDINALITY AS n(v, ord)
+        WHERE NOT EXISTS (
+          SELECT 1 FROM jsonb_array_elements(l.image_variants) e WHERE e->>'source' = v->>'source'
+        )
+      ), '[]'::jsonb)
+  WHERE l.id = p_listing_id
+  RETURNING l.images, l.image_variants INTO v_images, v_variants;
+
+  IF p_max_images IS NOT NULL AND cardinality(v_images) > p_max_images THEN
+    RAISE EXCEPTION 'A listing can have at most % photos', p_max_images
+      USING ERRCODE = 'PT400';
+  END IF;
+
+  RETURN QUERY SELECT v_images, v_variants;
+END;
+$$;
+
+-- Only the backend (service role) calls this; it bypasses RLS.
+REVOKE ALL ON FUNCTION append_listing_images(uuid, text[], jsonb, int) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION append_listing_images(uuid, text[], jsonb, int) TO service_role;
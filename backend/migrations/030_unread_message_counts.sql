@@ -0,0 +1,37 @@
+-- Migration 030: Count unread messages in the database
+-- Run this in your Supabase SQL Editor (after 014)
+--
+-- The dashboard used to fetch every unread message a user had and count
+-- them, and their threads, in Python. unread_message_counts() returns just
+-- the two numbers, read from a partial index over unread messages
+-- (dashboard_store.py).
+
+-- ============================================================
+-- 1. INDEX
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_messages_unread
+  ON messages(receiver_id, sender_id, listing_id)
+  WHERE read_at IS NULL;
+
+-- ============================================================
+-- 2. COUNTS
+-- ============================================================
+-- threads: distinct (sender, listing) pairs; direct messages (listing_id
+-- NULL) from one sender count as one thread.
+
+CREATE OR REPLACE FUNCTION unread_message_counts(p_user_id uuid)
+RETURNS TABLE (total bigint, threads bigint)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  SELECT count(*), count(DISTINCT (sender_id, listing_id))
+  FROM messages
+  WHERE receiver_id = p_user_id
+    AND read_at IS NULL;
+$$;
+
+REVOKE ALL ON FUNCTION unread_message_counts(uuid) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION unread_message_counts(uuid) TO service_role;
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, Literal
+from uuid import UUID
 from datetime import datetime, date
 from enum import Enum
 
@@ -94,6 +95,45 @@ class MatchOut(BaseModel):
     match_score: int
 
 
+# Boolean listing columns a saved search can require
+SEARCH_AMENITIES = (
+    "furnished", "bills_included", "parking", "pets_allowed", "internet_included",
+    "air_conditioning", "dishwasher", "couples_ok", "instant_book",
+)
+
+
+class SavedSearchCreate(BaseModel):
+    name: Optional[str] = Field(None, max_length=80)
+    city: Optional[str] = Field(None, max_length=100)
+    postcode: Optional[int] = Field(None, ge=800, le=9999)
+    min_price: Optional[float] = Field(None, ge=0, le=50000)
+    max_price: Optional[float] = Field(None, gt=0, le=50000)
+    # Subset of SEARCH_AMENITIES the listing must have
+    amenities: list[str] = Field(default=[], max_length=len(SEARCH_AMENITIES))
+    notify: bool = True
+
+    @field_validator("amenities")
+    @classmethod
+    def known_amenities(cls, v: list[str]) -> list[str]:
+        unknown = sorted(set(v) - set(SEARCH_AMENITIES))
+        if unknown:
+            raise ValueError(f"Unknown amenities: {', '.join(unknown)}")
+        return sorted(set(v))
+
+
+class AvailabilityBlock(BaseModel):
+    start_date: date
+    # Day the block ends (not blocked); None blocks from start_date on
+    end_date: Optional[date] = None
+    note: Optional[str] = Field(None, max_length=200)
+
+
+class ListingViews(BaseModel):
+    # Detail page views, or listings shown in search results ("impression")
+    listing_ids: list[UUID] = Field(..., min_length=1, max_length=100)
+    kind: Literal["view", "impression"] = "view"
+
+
 # ── Profile models ──────────────────────────────────────────
 
 
@@ -0,0 +1,284 @@
+"""
+Server-side content moderation for messages and listings.
+
+The blocklist lives in moderation_rules.json (or MODERATION_RULES_PATH). Every
+phrase in every rule is compiled into one Aho-Corasick automaton, so a text is
+scanned in a single linear pass however many phrases there are, instead of
+testing one regex after another.
+
+Text and phrases go through the same normalization first: Unicode
+compatibility folding with accents stripped, lower-casing, leetspeak folding
+(digits always; @ $ ! | + only between letters, so "n!gg" folds but
+"spic!" keeps its word boundary), words spelled out one character at a time
+with punctuation joined back up ("W.E.S.T.E.R.N" and "s-p-i-c" become
+"western" and "spic"), sentence punctuation (. , ; : ? !) turned into a
+" . " break that multi-word phrases can't match across (so "Bond? No,
+inspection needed first." doesn't read as "no inspection needed"), and every
+other non-alphanumeric run collapsed to one space. Multi-word phrases also
+match with the spaces removed ("westernunion").
+
+Rules match at a word start; "word" rules must also end at a word boundary
+(so list plurals and spelling variants as phrases), "prefix" rules may run on. A rule's action is "block" (the
+request is rejected with 400) or "flag" (allowed, counted and logged).
+
+The rules file is re-read when its mtime changes, checked at most every
+MODERATION_RELOAD_INTERVAL seconds, so rule edits apply without a restart. A
+file that fails to load is logged and the previous rules stay in force.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = Path(os.environ.get("MODERATION_RULES_PATH", Path(__file__).with_name("moderation_rules.json")))
+RELOAD_INTERVAL = float(os.environ.get("MODERATION_RELOAD_INTERVAL", "10"))
+
+MATCHES = Counter(
+    "moderation_matches_total",
+    "Texts that matched a moderation rule",
+    ["source", "category", "action"],
+)
+
+BLOCK, FLAG = "block", "flag"
+
+_ALWAYS_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t"})
+# Only folded when sandwiched between letters/digits, else they are punctuation
+_INNER_LEET = {"@": "a", "$": "s", "!": "i", "|": "i", "+": "t"}
+_INNER_LEET_RE = re.compile(r"(?<=[a-z0-9])[@$!|+](?=[a-z0-9])")
+_SEPARATORS_RE = re.compile(r"[^a-z0-9]+")
+# Sentence punctuation (with any separators around it) ends a phrase; kept as " . " rather than a space
+_BREAK_RE = re.compile(r"[^a-z0-9]*[.,;:?!][^a-z0-9]*")
+_BREAK_SEPARATORS_RE = re.compile(r"[^a-z0-9.]+")
+# Three or more single characters joined by punctuation (no spaces), e.g. "u.n.i.o.n"
+_SPELLED_OUT_RE = re.compile(r"(?<![a-z0-9])[a-z0-9](?:[^a-z0-9\s]+[a-z0-9](?![a-z0-9])){2,}")
+# A character between two punctuation marks, which every such run has; far cheaper to look for first
+_SPELLED_OUT_HINT_RE = re.compile(r"[^a-z0-9\s][a-z0-9][^a-z0-9\s]")
+
+
+def normalize(text: str) -> str:
+    """Fold `text` to lower-case [a-z0-9 .] with leetspeak undone, single spaces and " . " breaks."""
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    text = text.lower()
+    text = _INNER_LEET_RE.sub(lambda m: _INNER_LEET[m.group()], text)
+    text = text.translate(_ALWAYS_LEET)
+    if _SPELLED_OUT_HINT_RE.search(text):
+        text = _SPELLED_OUT_RE.sub(lambda m: _SEPARATORS_RE.sub("", m.group()), text)
+    text = _BREAK_RE.sub(" . ", text)
+    return _BREAK_SEPARATORS_RE.sub(" ", text).strip(" .")
+
+
+class Rule:
+    __slots__ = ("id", "category", "action", "whole_word")
+
+    def __init__(self, id: str, category: str, action: str, whole_word: bool):
+        self.id = id
+        self.category = category
+        self.action = action
+        self.whole_word = whole_word
+
+
+class Match:
+    __slots__ = ("rule", "phrase")
+
+    def __init__(self, rule: Rule, phrase: str):
+        self.rule = rule
+        self.phrase = phrase
+
+    def __repr__(self):
+        return f"Match({self.rule.id!r}, {self.phrase!r})"
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over normalized phrases.
+
+    Phrases are stored with a leading space and texts are scanned with one
+    added, so every match starts at a word boundary by construction. That
+    also means the root state only leaves on a space, which lets scan() jump
+    from the root straight to the next word instead of visiting each letter.
+    """
+
+    def __init__(self, phrases: Iterable[tuple[str, Rule]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # Per state: (phrase, rule) for every phrase ending here
+        self._out: list[list[tuple[str, Rule]]] = [[]]
+        for phrase, rule in phrases:
+            self._add(phrase, rule)
+        self._link()
+
+    def _add(self, phrase: str, rule: Rule) -> None:
+        state = 0
+        for c in " " + phrase:
+            nxt = self._goto[state].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][c] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((phrase, rule))
+
+    def _link(self) -> None:
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for c, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and c not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(c, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        # Resolve the failure links into a full transition table (a DFA), so
+        # scanning is one dict lookup per character. States are numbered in
+        # insertion order, so resolve them breadth-first (parents first).
+        self._delta: list[dict[str, int]] = [dict(self._goto[0])]
+        self._delta.extend({} for _ in range(len(self._goto) - 1))
+        for state in queue:
+            self._delta[state] = {**self._delta[self._fail[state]], **self._goto[state]}
+
+    @property
+    def states(self) -> int:
+        return len(self._goto)
+
+    def scan(self, text: str) -> list[Match]:
+        """Every rule matched in normalized `text`, one pass, at most one match per rule."""
+        delta, out = self._delta, self._out
+        text = f" {text} "
+        found: dict[str, Match] = {}
+        state = 0
+        i, end = 0, len(text) - 1
+        while i < end:
+            if state == 0:
+                # Nothing leaves the root except a space: skip to the next word
+                i = text.find(" ", i)
+                if i >= end:
+                    break
+            state = delta[state].get(text[i], 0)
+            if out[state]:
+                for phrase, rule in out[state]:
+                    if rule.whole_word and text[i + 1] != " ":
+                        continue
+                    found.setdefault(rule.id, Match(rule, phrase))
+            i += 1
+        return list(found.values())
+
+
+class RuleSet:
+    def __init__(self, rules: list[Rule], automaton: Automaton, version, mtime: float):
+        self.rules = rules
+        self.automaton = automaton
+        self.version = version
+        self.mtime = mtime
+
+
+def compile_rules(spec: dict, mtime: float = 0.0) -> RuleSet:
+    """
+    Build a RuleSet from a parsed rules file.
+
+    Raises:
+        ValueError: If a rule has an unknown action or match type, or no phrases
+    """
+    rules, phrases = [], []
+    for raw in spec.get("rules", []):
+        action = raw.get("action", BLOCK)
+        match = raw.get("match", "word")
+        if action not in (BLOCK, FLAG) or match not in ("word", "prefix") or not raw.get("phrases"):
+            raise ValueError(f"Invalid moderation rule: {raw.get('id')!r}")
+        rule = Rule(raw["id"], raw.get("category", raw["id"]), action, match == "word")
+        rules.append(rule)
+        for phrase in raw["phrases"]:
+            folded = normalize(phrase)
+            if not folded:
+                continue
+            phrases.append((folded, rule))
+            if " " in folded:
+                phrases.append((folded.replace(" ", ""), rule))
+    return RuleSet(rules, Automaton(phrases), spec.get("version"), mtime)
+
+
+_lock = threading.Lock()
+_ruleset: Optional[RuleSet] = None
+_checked_at = 0.0
+# mtime of a file version that failed to load, so it is only reported once
+_rejected_mtime: Optional[float] = None
+
+
+def reload(force: bool = False) -> RuleSet:
+    """Reload the rules file if it changed (or `force`); keeps the old rules if it is invalid."""
+    global _ruleset, _checked_at, _rejected_mtime
+    with _lock:
+        _checked_at = time.monotonic()
+        mtime = None
+        try:
+            mtime = RULES_PATH.stat().st_mtime
+            if force or _ruleset is None or mtime not in (_ruleset.mtime, _rejected_mtime):
+                _ruleset = compile_rules(json.loads(RULES_PATH.read_text()), mtime)
+                logger.info("Loaded %d moderation rules (version %s, %d states) from %s",
+                            len(_ruleset.rules), _ruleset.version, _ruleset.automaton.states, RULES_PATH)
+        except Exception:
+            if _ruleset is None:
+                raise
+            _rejected_mtime = mtime
+            logger.exception("Failed to reload moderation rules from %s; keeping version %s",
+                             RULES_PATH, _ruleset.version)
+        return _ruleset
+
+
+def ruleset() -> RuleSet:
+    """The current rules, re-checking the file at most every RELOAD_INTERVAL seconds."""
+    current = _ruleset
+    if current is None or (RELOAD_INTERVAL > 0 and time.monotonic() - _checked_at > RELOAD_INTERVAL):
+        return reload()
+    return current
+
+
+def scan(text: Optional[str]) -> list[Match]:
+    """Rules matched by `text` (empty when clean)."""
+    if not text:
+        return []
+    return ruleset().automaton.scan(normalize(text))
+
+
+def enforce(source: str, *texts: Optional[str]) -> list[Match]:
+    """
+    Scan user-submitted texts, counting every match.
+
+    Args:
+        source: Label for metrics and logs, e.g. "message" or "listing"
+        texts: Fields to check; None and empty strings are skipped
+
+    Returns:
+        list: Matches of "flag" rules (the caller may store or ignore them)
+
+    Raises:
+        HTTPException: 400 if any "block" rule matched
+    """
+    matches = scan("\n".join(t for t in texts if t))
+    for m in matches:
+        MATCHES.labels(source, m.rule.category, m.rule.action).inc()
+    blocked = sorted({m.rule.category for m in matches if m.rule.action == BLOCK})
+    if blocked:
+        logger.info("Blocked %s: rules %s", source, [m.rule.id for m in matches])
+        raise HTTPException(
+            status_code=400,
+            detail=f"Your {source} contains content that isn't allowed on MigRent ({', '.join(blocked)}). Please edit it and try again.",
+        )
+    flagged = [m for m in matches if m.rule.action == FLAG]
+    if flagged:
+        logger.info("Flagged %s: rules %s", source, [m.rule.id for m in flagged])
+    return flagged
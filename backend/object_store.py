@@ -0,0 +1,123 @@
+"""
+Object storage for user uploads (listing photos, message attachments).
+
+OBJECT_STORE selects the backend:
+
+- "local" (default): files under MEDIA_ROOT, served by the API itself at
+  /media. For development and single-instance deployments; every worker
+  must share the directory.
+- "supabase": a public Supabase Storage bucket (STORAGE_BUCKET, default
+  "public"), written with the service role key.
+
+Keys are content-addressed by the callers, so writes are idempotent and
+objects never change once written (served with a one-year cache lifetime).
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+
+from db import get_supabase_admin
+
+OBJECT_STORE = os.environ.get("OBJECT_STORE", "local")
+MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT", Path(__file__).with_name("media")))
+# Public base URL for local objects; set it to the API's public origin + /media
+# when the frontend is served from another host
+MEDIA_BASE_URL = os.environ.get("MEDIA_BASE_URL", "/media").rstrip("/")
+STORAGE_BUCKET = os.environ.get("STORAGE_BUCKET", "public")
+
+CACHE_SECONDS = 31536000
+
+Source = Union[bytes, str, Path]
+
+
+class LocalStore:
+    """Filesystem store; writes go to a temp file and are renamed into place."""
+
+    def __init__(self, root: Path = MEDIA_ROOT, base_url: str = MEDIA_BASE_URL):
+        self.root = Path(root)
+        self.base_url = base_url
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid object key: {key!r}")
+        return path
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def put(self, key: str, data: Source, content_type: str) -> str:
+        """
+        Store `data` (bytes, or the path of a file to copy) under `key`.
+
+        Returns:
+            str: Public URL of the object
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if isinstance(data, bytes):
+                    out.write(data)
+                else:
+                    with open(data, "rb") as src:
+                        shutil.copyfileobj(src, out)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+
+class SupabaseStore:
+    """Public Supabase Storage bucket."""
+
+    def __init__(self, bucket: str = STORAGE_BUCKET):
+        self.bucket = bucket
+
+    def _bucket(self):
+        return get_supabase_admin().storage.from_(self.bucket)
+
+    def exists(self, key: str) -> bool:
+        folder, _, name = key.rpartition("/")
+        return any(entry["name"] == name for entry in self._bucket().list(folder, {"search": name}))
+
+    def put(self, key: str, data: Source, content_type: str) -> str:
+        """
+        Store `data` (bytes, or the path of a file to stream) under `key`.
+
+        Returns:
+            str: Public URL of the object
+        """
+        self._bucket().upload(key, data, {
+            "content-type": content_type,
+            "cache-control": str(CACHE_SECONDS),
+            "upsert": "true",
+        })
+        return self.url(key)
+
+    def url(self, key: str) -> str:
+        return self._bucket().get_public_url(key)
+
+
+_store: Optional[Union[LocalStore, SupabaseStore]] = None
+
+
+def get_store() -> Union[LocalStore, SupabaseStore]:
+    """The configured store (created on first use)."""
+    global _store
+    if _store is None:
+        if OBJECT_STORE == "supabase":
+            _store = SupabaseStore()
+        elif OBJECT_STORE == "local":
+            _store = LocalStore()
+        else:
+            raise RuntimeError(f"Unknown OBJECT_STORE {OBJECT_STORE!r} (expected 'local' or 'supabase')")
+    return _store
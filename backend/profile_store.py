@@ -0,0 +1,108 @@
+"""
+Profile data access.
+
+Reads and writes to the profiles table go through here so that each save is a
+single round-trip (see migrations/016_profile_save_functions.sql). Reads are
+not cached, so a write handled by one worker is visible to the next request
+on every worker; concurrent reads of the same profile share one upstream call
+(singleflight).
+"""
+
+import logging
+from typing import Optional
+
+from fastapi import HTTPException
+from db import get_supabase_admin
+from singleflight import Group
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_PROFILE_FIELDS = "id,name,preferred_name,about_me,most_useless_skill,interests,badges,custom_pfp,occupation,verified"
+ONBOARDING_FIELDS = "onboarding_completed,onboarding_completed_at"
+
+_profile_reads = Group("profile")
+_public_profile_reads = Group("public_profile")
+
+
+def get_profile(uid: str) -> dict:
+    """
+    Get the full profile row for a user, creating an empty row if missing.
+
+    Returns:
+        dict: The profile row (callers must not mutate it)
+    """
+    uid = str(uid)
+
+    def fetch() -> dict:
+        sb = get_supabase_admin()
+        res = sb.rpc("get_or_create_profile", {"p_id": uid}).execute()
+        return res.data[0] if res.data else {"id": uid}
+
+    return _profile_reads.do(uid, fetch)
+
+
+def get_onboarding(uid: str) -> dict:
+    """
+    A user's onboarding state, read without creating a profile.
+
+    Returns:
+        dict: onboarding_completed (False without a profile) and onboarding_completed_at
+    """
+    res = get_supabase_admin().table("profiles").select(ONBOARDING_FIELDS).eq("id", str(uid)).execute()
+    profile = res.data[0] if res.data else {}
+    return {
+        "onboarding_completed": profile.get("onboarding_completed") or False,
+        "onboarding_completed_at": profile.get("onboarding_completed_at"),
+    }
+
+
+def get_public_profile(uid: str) -> Optional[dict]:
+    """
+    Get the public subset of a user's profile.
+
+    Returns:
+        dict | None: PUBLIC_PROFILE_FIELDS of the row, or None if there is no profile
+    """
+    uid = str(uid)
+
+    def fetch() -> Optional[dict]:
+        sb = get_supabase_admin()
+        res = sb.table("profiles").select(PUBLIC_PROFILE_FIELDS).eq("id", uid).execute()
+        return res.data[0] if res.data else None
+
+    return _public_profile_reads.do(uid, fetch)
+
+
+def save_profile(uid: str, updates: dict, locked: set[str] = frozenset()) -> dict:
+    """
+    Upsert profile fields and return the written row in one call.
+
+    Args:
+        uid: Profile id
+        updates: Column values to write
+        locked: Fields that may not change once onboarding is completed
+
+    Returns:
+        dict: The profile row after the write
+
+    Raises:
+        HTTPException: 403 if a locked field is changed after onboarding
+    """
+    from postgrest.exceptions import APIError  # loaded with the client; deferred for startup time
+
+    uid = str(uid)
+    sb = get_supabase_admin()
+    try:
+        res = sb.rpc("save_profile", {
+            "p_id": uid,
+            "p_updates": updates,
+            "p_locked": sorted(locked),
+        }).execute()
+    except APIError as e:
+        if e.code == "PT403":
+            raise HTTPException(status_code=403, detail=e.message)
+        raise
+
+    if not res.data:
+        return {**updates, "id": uid}
+    return res.data[0]
@@ -0,0 +1,383 @@
+"""
+Market rent statistics: weekly price quantiles per postcode.
+
+Every postcode has a quantile sketch of its listings' weekly prices, and so
+does every (postcode, property_type) and (postcode, place_type) pair, so
+GET /stats/rent can answer "what do rooms in 2000 go for" without scanning
+listings. The sketches are KLL sketches: levels of sorted samples, where a
+sample at level h stands for 2^h listings. When a level outgrows its
+capacity, every other sample is promoted to the level above. With K = 200
+the 25th/50th/75th percentiles are within about 1% of rank of the exact
+answer, a sketch never holds more than ~3K prices, and two sketches merge
+by concatenating their levels. Postcodes with fewer than K listings keep
+every price, so their quantiles are exact.
+
+`python -m rent_stats --rebuild` (run from cron, e.g. nightly) reads every
+listing and writes the sketches to rent_sketches (migration 026), then
+marks the build complete in rent_sketch_builds (migration 028); workers
+only ever load completed builds, so a rebuild in progress is invisible.
+Rebuilds are also what drop deleted listings and old prices from the
+statistics. Each worker loads the latest build during warm-up and then
+pages in listings created after it every RENT_STATS_SYNC_INTERVAL seconds,
+in the background; its own inserts are added immediately. Without a build,
+workers fill their sketches from listings directly.
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException
+
+from db import SYNC_OVERLAP_SECONDS, get_supabase_admin, pages_since
+
+logger = logging.getLogger(__name__)
+
+K = 200
+SYNC_INTERVAL = float(os.environ.get("RENT_STATS_SYNC_INTERVAL", "60"))
+# Fewer listings than this and only the count is returned
+MIN_LISTINGS = int(os.environ.get("RENT_STATS_MIN_LISTINGS", "3"))
+
+DIMENSIONS = ("property_type", "place_type")
+LISTING_FIELDS = "id,postcode,property_type,place_type,weekly_price,created_at"
+SKETCH_FIELDS = "postcode,dimension,value,sketch"
+BUILD_FIELDS = "built_at,sketches,listings,through_created_at,through_ids"
+# Completed builds kept; the one before the latest may still be loading on a worker
+KEEP_BUILDS = 2
+
+_rng = random.Random()
+
+
+# ── KLL sketch ───────────────────────────────────────────────
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang and Liberty). Not thread-safe."""
+
+    def __init__(self, k: int = K):
+        self.k = k
+        self.n = 0
+        self.levels: list[list[float]] = [[]]
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self) -> None:
+        while True:
+            for level, items in enumerate(self.levels):
+                if len(items) > self._capacity(level):
+                    break
+            else:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items.sort()
+            # An odd sample out stays behind; the rest pair up and one of each pair moves up
+            keep = [items.pop()] if len(items) % 2 else []
+            self.levels[level + 1].extend(items[_rng.randint(0, 1)::2])
+            self.levels[level] = keep
+
+    def add(self, value: float) -> None:
+        self.levels[0].append(value)
+        self.n += 1
+        if len(self.levels[0]) > self._capacity(0):
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self._compress()
+
+    def quantiles(self, qs: tuple[float, ...]) -> list[Optional[float]]:
+        """Approximate values at each rank fraction in `qs` (0 = min, 1 = max)."""
+        weighted = sorted((v, 1 << level) for level, items in enumerate(self.levels) for v in items)
+        total = sum(w for _, w in weighted)
+        if not total:
+            return [None] * len(qs)
+        out = []
+        for q in qs:
+            target, seen = q * total, 0
+            for value, weight in weighted:
+                seen += weight
+                if seen >= target:
+                    break
+            out.append(value)
+        return out
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "n": self.n, "levels": [[round(v, 2) for v in items] for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KLLSketch":
+        sketch = cls(int(data.get("k", K)))
+        sketch.n = int(data["n"])
+        sketch.levels = [[float(v) for v in items] for items in data["levels"]] or [[]]
+        return sketch
+
+
+# ── Per-postcode sketches ────────────────────────────────────
+
+
+def _type(value) -> str:
+    # ListingForm sends "Private room", datagen "private_room"
+    return (value or "").strip().lower().replace(" ", "_")
+
+
+def _keys(row: dict) -> list[tuple[int, str, str]]:
+    postcode = int(row["postcode"])
+    keys = [(postcode, "", "")]
+    for dimension in DIMENSIONS:
+        if _type(row.get(dimension)):
+            keys.append((postcode, dimension, _type(row.get(dimension))))
+    return keys
+
+
+class RentIndex:
+    """Sketches keyed by (postcode, dimension, value), with quantiles cached until the next add."""
+
+    def __init__(self):
+        self._sketches: dict[tuple[int, str, str], KLLSketch] = {}
+        self._summaries: dict[tuple[int, str, str], dict] = {}
+        # id -> created_at of listings added since the build was loaded, so a sync's
+        # overlap and this worker's own inserts aren't counted twice; see prune()
+        self._seen: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    def add(self, row: dict) -> None:
+        try:
+            price = float(row["weekly_price"])
+            keys = _keys(row)
+        except (KeyError, TypeError, ValueError):
+            return
+        if price <= 0:
+            return
+        with self._lock:
+            if str(row["id"]) in self._seen:
+                return
+            self._seen[str(row["id"])] = row.get("created_at") or datetime.now(timezone.utc).isoformat()
+            for key in keys:
+                self._sketches.setdefault(key, KLLSketch()).add(price)
+                self._summaries.pop(key, None)
+
+    def load(self, rows: list[dict], seen: dict[str, str]) -> None:
+        """Replace every sketch with a stored build, which already counts the listings in `seen`."""
+        sketches = {(int(r["postcode"]), r["dimension"], r["value"]): KLLSketch.from_dict(r["sketch"]) for r in rows}
+        with self._lock:
+            self._sketches, self._summaries, self._seen = sketches, {}, dict(seen)
+
+    def seen_since(self, created_at: str) -> list[str]:
+        with self._lock:
+            return [listing_id for listing_id, seen in self._seen.items() if seen >= created_at]
+
+    def prune(self, before: str) -> None:
+        """Forget listings created before `before`; no sync reads them again."""
+        with self._lock:
+            self._seen = {listing_id: seen for listing_id, seen in self._seen.items() if seen >= before}
+
+    def summary(self, key: tuple[int, str, str]) -> Optional[dict]:
+        with self._lock:
+            cached = self._summaries.get(key)
+            if cached is not None:
+                return cached
+            sketch = self._sketches.get(key)
+            if sketch is None:
+                return None
+            p25, median, p75 = sketch.quantiles((0.25, 0.5, 0.75))
+            cached = self._summaries[key] = {"listings": len(sketch), "p25": p25, "median": median, "p75": p75}
+            return cached
+
+    def rows(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"postcode": p, "dimension": d, "value": v, "listings": len(s), "sketch": s.to_dict()}
+                for (p, d, v), s in self._sketches.items()
+            ]
+
+
+_index = RentIndex()
+_built_at: Optional[str] = None
+_since: Optional[str] = None
+_synced_at = 0.0
+_sync_lock = threading.Lock()
+
+
+def _shift(timestamp: str, seconds: float) -> str:
+    return (datetime.fromisoformat(timestamp.replace("Z", "+00:00")) + timedelta(seconds=seconds)).isoformat()
+
+
+def _listings(since: Optional[str]):
+    sb = get_supabase_admin()
+    return pages_since(lambda: sb.table("listings").select(LISTING_FIELDS), "created_at", since)
+
+
+def _load_build(build: dict, page_size: int = 1000) -> None:
+    global _built_at, _since
+    sb = get_supabase_admin()
+    rows, offset = [], 0
+    while True:
+        page = (
+            sb.table("rent_sketches").select(SKETCH_FIELDS)
+            .eq("built_at", build["built_at"])
+            .order("postcode").order("dimension").order("value")
+            .range(offset, offset + page_size - 1)
+            .execute()
+        ).data
+        rows.extend(page)
+        offset += page_size
+        if len(page) < page_size:
+            break
+    through = build.get("through_created_at")
+    _index.load(rows, {str(listing_id): through for listing_id in build.get("through_ids") or []})
+    _built_at, _since = build["built_at"], through
+    logger.info("Rent statistics: loaded %d sketches built at %s", len(rows), build["built_at"])
+
+
+def sync() -> int:
+    """
+    Load a newer completed build if there is one, then add listings created
+    since (all listings when nothing has been built yet).
+
+    Returns:
+        int: Listings read; 0 if another thread is already syncing
+    """
+    global _since, _synced_at
+    if not _sync_lock.acquire(blocking=False):
+        return 0
+    try:
+        latest = (
+            get_supabase_admin().table("rent_sketch_builds").select(BUILD_FIELDS)
+            .order("built_at", desc=True).limit(1).execute()
+        ).data
+        if latest and latest[0]["built_at"] != _built_at:
+            _load_build(latest[0])
+        added = 0
+        for page in _listings(_since):
+            for row in page:
+                _index.add(row)
+            added += len(page)
+            _since = max(_since or "", page[-1]["created_at"])
+        if _since:
+            # Past the overlap a later sync re-reads, so these can't be counted twice
+            _index.prune(_shift(_since, -2 * SYNC_OVERLAP_SECONDS))
+        _synced_at = time.monotonic()
+        if added:
+            logger.info("Rent statistics: %d listings read (%d sketches)", added, len(_index))
+        return added
+    finally:
+        _sync_lock.release()
+
+
+def _sync_in_background() -> None:
+    try:
+        sync()
+    except Exception:
+        logger.warning("Rent statistics sync failed", exc_info=True)
+
+
+def added(row: dict) -> None:
+    """Count a listing inserted on this worker right away."""
+    _index.add(row)
+
+
+def rent(postcode: int, property_type: Optional[str] = None, place_type: Optional[str] = None) -> dict:
+    """
+    Weekly price quartiles of the listings in a postcode, optionally of one
+    property or place type. Quartiles are None below MIN_LISTINGS listings.
+
+    Raises:
+        HTTPException: 400 if both types are given
+    """
+    global _synced_at
+    if property_type and place_type:
+        raise HTTPException(status_code=400, detail="Filter by property_type or place_type, not both")
+    if time.monotonic() - _synced_at > SYNC_INTERVAL:
+        # Serve what we have; the refresh never holds up a request
+        _synced_at = time.monotonic()
+        threading.Thread(target=_sync_in_background, name="rent-stats-sync", daemon=True).start()
+
+    dimension = "property_type" if property_type else "place_type" if place_type else ""
+    value = _type(property_type or place_type)
+    stats = _index.summary((postcode, dimension, value)) or {"listings": 0, "p25": None, "median": None, "p75": None}
+    if stats["listings"] < MIN_LISTINGS:
+        stats = {**stats, "p25": None, "median": None, "p75": None}
+    return {"postcode": postcode, "property_type": property_type, "place_type": place_type, **stats}
+
+
+# ── Stored builds ────────────────────────────────────────────
+
+
+def rebuild(batch_size: int = 500) -> dict:
+    """
+    Sketch every listing, store the result and mark it as the latest
+    complete build; builds before the previous one are deleted.
+
+    Returns:
+        dict: Listings read and sketches written
+    """
+    index = RentIndex()
+    through, read = None, 0
+    for page in _listings(None):
+        for row in page:
+            index.add(row)
+        read += len(page)
+        through = max(through or "", page[-1]["created_at"])
+
+    built_at = datetime.now(timezone.utc).isoformat()
+    rows = [{**row, "built_at": built_at} for row in index.rows()]
+    sb = get_supabase_admin()
+    for start in range(0, len(rows), batch_size):
+        sb.table("rent_sketches").insert(rows[start:start + batch_size]).execute()
+    # Workers see the build from here on, with every sketch in place
+    sb.table("rent_sketch_builds").insert({
+        "built_at": built_at,
+        "sketches": len(rows),
+        "listings": read,
+        "through_created_at": through,
+        "through_ids": index.seen_since(_shift(through, -SYNC_OVERLAP_SECONDS)) if through else [],
+    }).execute()
+
+    builds = (
+        sb.table("rent_sketch_builds").select("built_at")
+        .order("built_at", desc=True).limit(KEEP_BUILDS).execute()
+    ).data
+    if len(builds) == KEEP_BUILDS:
+        # Also clears sketches of rebuilds that stopped before completing
+        oldest = builds[-1]["built_at"]
+        sb.table("rent_sketches").delete().lt("built_at", oldest).execute()
+        sb.table("rent_sketch_builds").delete().lt("built_at", oldest).execute()
+    done = {"listings": read, "sketches": len(rows), "built_at": built_at}
+    logger.info("Rent statistics rebuilt: %s", done)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Market rent statistics")
+    parser.add_argument("--rebuild", action="store_true", help="sketch every listing and store the build")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(rebuild())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Timeouts, retries, circuit breakers and bulkheads for upstream dependencies.
+
+Every outbound call to Supabase, Stripe or Resend goes through a Dependency,
+which applies four guards:
+
+  - timeout: each attempt is bounded (the SDK defaults are 80-120 s, longer
+    than a request should ever hang a worker thread), and Supabase calls
+    also share an overall deadline across their retries
+  - retries: only for idempotent operations, with capped exponential backoff
+    and full jitter. Supabase GET/HEAD calls are retried here on connection
+    errors and 502/503/504; Stripe retries are delegated to the SDK, which
+    adds idempotency keys; Resend sends are never retried
+  - circuit breaker: after <DEP>_CIRCUIT_FAILURES consecutive failures the
+    dependency is skipped for <DEP>_CIRCUIT_RESET seconds, then one probe call
+    decides whether it closes again
+  - bulkhead: at most <DEP>_MAX_CONCURRENCY calls in flight per worker, so a
+    slow dependency cannot take every thread in the pool
+
+A call rejected by the breaker or bulkhead raises DependencyUnavailable, an
+HTTPException that renders as 503 with Retry-After. Client errors (4xx) never
+count as failures.
+
+Every setting is read from the environment per dependency, e.g.
+SUPABASE_TIMEOUT=5, STRIPE_MAX_CONCURRENCY=8.
+"""
+
+from __future__ import annotations
+
+import os
+import math
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
+
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+
+from metrics import track_dependency
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_STATE = Gauge(
+    "dependency_circuit_state",
+    "Circuit breaker state per dependency (0 closed, 1 half-open, 2 open)",
+    ["dependency"],
+    multiprocess_mode="max",
+)
+REJECTIONS = Counter(
+    "dependency_rejections_total",
+    "Outbound calls refused without being attempted",
+    ["dependency", "reason"],
+)
+RETRIES = Counter(
+    "dependency_retries_total",
+    "Outbound call attempts that were retried after a failure",
+    ["dependency"],
+)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+RETRYABLE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+
+
+class DependencyUnavailable(HTTPException):
+    """An upstream call was refused because its dependency is failing or saturated."""
+
+    def __init__(self, dependency: str, reason: str, retry_after: float = 1):
+        super().__init__(
+            status_code=503,
+            detail=f"{dependency.capitalize()} is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        self.dependency = dependency
+        self.reason = reason
+
+
+class Policy:
+    """Per-dependency limits, read from <NAME>_* environment variables."""
+
+    def __init__(self, name: str, *, timeout: float, deadline: float, retries: int,
+                 max_concurrency: int, circuit_failures: int = 5, circuit_reset: float = 30):
+        def env(key, default, cast=float):
+            return cast(os.environ.get(f"{name.upper()}_{key}", default))
+
+        self.timeout = env("TIMEOUT", timeout)
+        self.deadline = env("DEADLINE", deadline)
+        self.retries = env("RETRIES", retries, int)
+        self.max_concurrency = env("MAX_CONCURRENCY", max_concurrency, int)
+        self.circuit_failures = env("CIRCUIT_FAILURES", circuit_failures, int)
+        self.circuit_reset = env("CIRCUIT_RESET", circuit_reset)
+        # How long a call may wait for a bulkhead slot before being refused
+        self.queue_timeout = env("QUEUE_TIMEOUT", 0.5)
+        self.backoff_base = env("BACKOFF_BASE", 0.1)
+        self.backoff_max = env("BACKOFF_MAX", 2.0)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open → (after reset) half-open probe → closed."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._gauge = CIRCUIT_STATE.labels(name)
+        self._gauge.set(0)
+
+    def _set(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Circuit for %s %s -> %s", self.name, self.state, state)
+            self.state = state
+            self._gauge.set(_STATE_VALUES[state])
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; in half-open state only one probe at a time."""
+        with self._lock:
+            if self.state == OPEN:
+                if self.retry_after() > 0:
+                    return False
+                self._set(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set(OPEN)
+
+    def cancel_probe(self) -> None:
+        """The call allowed by allow() never ran; let the next caller probe instead."""
+        with self._lock:
+            self._probing = False
+
+    def record_neutral(self) -> None:
+        """The call ended without telling us anything about health (e.g. a 4xx)."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._failures = 0
+                self._set(CLOSED)
+            self._probing = False
+
+
+class Dependency:
+    """A named upstream with its policy, breaker and bulkhead."""
+
+    def __init__(self, name: str, policy: Policy):
+        self.name = name
+        self.policy = policy
+        self.breaker = CircuitBreaker(name, policy.circuit_failures, policy.circuit_reset)
+        self._slots = threading.BoundedSemaphore(policy.max_concurrency)
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold a bulkhead slot for one attempt, after checking the breaker.
+
+        Raises:
+            DependencyUnavailable: If the circuit is open or no slot frees up in time
+        """
+        if not self.breaker.allow():
+            REJECTIONS.labels(self.name, "circuit_open").inc()
+            raise DependencyUnavailable(self.name, "circuit_open", self.breaker.retry_after())
+        if not self._slots.acquire(timeout=self.policy.queue_timeout):
+            self.breaker.cancel_probe()
+            REJECTIONS.labels(self.name, "bulkhead_full").inc()
+            raise DependencyUnavailable(self.name, "bulkhead_full")
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+def is_failure(exc: BaseException) -> bool:
+    """Whether an SDK exception means the dependency is unhealthy (not a 4xx client error)."""
+    for attr in ("http_status", "status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status >= 500 or status == 429
+    # Connection errors, timeouts and anything else without a status
+    return True
+
+
+SUPABASE = Dependency("supabase", Policy("supabase", timeout=5, deadline=10, retries=2, max_concurrency=32))
+STRIPE = Dependency("stripe", Policy("stripe", timeout=10, deadline=30, retries=2, max_concurrency=8))
+RESEND = Dependency("resend", Policy("resend", timeout=5, deadline=5, retries=0, max_concurrency=4))
+
+DEPENDENCIES = {d.name: d for d in (SUPABASE, STRIPE, RESEND)}
+
+
+@contextmanager
+def guard(dependency: str, operation: str):
+    """
+    Breaker, bulkhead and latency metrics around one SDK call.
+
+    `with guard("stripe", "checkout.session.create"): ...` replaces
+    track_dependency for calls that go through an SDK (timeouts and retries
+    are configured on the SDK itself, see clients.py).
+
+    Raises:
+        DependencyUnavailable: If the call was refused
+    """
+    dep = DEPENDENCIES[dependency]
+    with dep.slot(), track_dependency(dependency, operation):
+        try:
+            yield
+        except Exception as e:
+            (dep.breaker.record_failure if is_failure(e) else dep.breaker.record_neutral)()
+            raise
+        dep.breaker.record_success()
+
+
+# ── Supabase (httpx) ─────────────────────────────────────────
+
+
+class ResilientTransport:
+    """
+    httpx transport wrapper applying the Supabase policy to every PostgREST and auth call.
+
+    Per-attempt timeouts are set through the request's timeout extension, so
+    they override the SDK's client-wide defaults. Duck-types
+    httpx.BaseTransport like metrics.InstrumentedTransport.
+    """
+
+    def __init__(self, inner: httpx.BaseTransport, dependency: Dependency = SUPABASE):
+        self.inner = inner
+        self.dependency = dependency
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        import httpx
+
+        dep, policy = self.dependency, self.dependency.policy
+        retries = policy.retries if request.method in RETRYABLE_METHODS else 0
+        deadline = time.monotonic() + policy.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            timeout = max(0.001, min(policy.timeout, remaining))
+            request.extensions["timeout"] = {"connect": timeout, "read": timeout, "write": timeout, "pool": timeout}
+
+            response: Optional[httpx.Response] = None
+            error: Optional[Exception] = None
+            with dep.slot():
+                try:
+                    response = self.inner.handle_request(request)
+                except Exception as e:
+                    error = e
+
+            if error is None and response.status_code < 500:
+                (dep.breaker.record_neutral if response.status_code >= 400 else dep.breaker.record_success)()
+                return response
+            dep.breaker.record_failure()
+
+            if error is not None:
+                retryable = isinstance(error, httpx.TransportError)
+            else:
+                retryable = response.status_code in RETRYABLE_STATUSES
+            attempt += 1
+            delay = policy.backoff(attempt)
+            if not retryable or attempt > retries or time.monotonic() + delay >= deadline:
+                if error is not None:
+                    raise error
+                return response
+
+            if response is not None:
+                response.close()
+            RETRIES.labels(dep.name).inc()
+            time.sleep(delay)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    def __enter__(self):
+        self.inner.__enter__()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.inner.__exit__(*exc_info)
+
+
+def protect_supabase(client) -> None:
+    """Wrap the transports of a Supabase client's PostgREST and auth HTTP sessions."""
+    import httpx  # already loaded by supabase
+
+    for session in (client.postgrest.session, getattr(client.auth, "_http_client", None)):
+        if isinstance(session, httpx.Client) and not isinstance(session._transport, ResilientTransport):
+            session._transport = ResilientTransport(session._transport)
@@ -0,0 +1,160 @@
+"""
+Response encoding: orjson serialization and gzip/brotli compression.
+
+FastJSONResponse is the app's default_response_class, so every router's return
+value is rendered by orjson instead of the stdlib json module.
+
+CompressionMiddleware negotiates Accept-Encoding (brotli preferred when the
+Brotli package is installed and the client accepts it, else gzip), and
+compresses text-like responses of at least COMPRESSION_MIN_SIZE bytes.
+Streaming responses (more_body) are compressed chunk by chunk as they are
+sent rather than buffered.
+"""
+
+import os
+import zlib
+from typing import Optional
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+# 4 is brotli's sweet spot for on-the-fly compression: smaller than gzip -6
+# at similar CPU; 11 is only worth it for precompressed static assets
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also accepts non-string dict keys, like json.dumps does."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick "br" or "gzip" from an Accept-Encoding header (q-values honoured), or None."""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        coding, q = coding.strip(), 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            weights[coding] = q
+
+    best, best_q = None, 0.0
+    for coding in (("br",) if brotli else ()) + ("gzip",):
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._z.compress(data)
+        return out + self._z.flush() if final else out
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY, mode=brotli.MODE_TEXT)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        out = self._c.process(data)
+        return out + self._c.finish() if final else out
+
+
+_ENCODERS = {"gzip": _Gzip, "br": _Brotli}
+
+
+class _CompressingSender:
+    """Wraps one response's `send`, compressing its body if it qualifies."""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder = None
+        self.passthrough = False
+
+    def _eligible(self, start: dict) -> bool:
+        headers = Headers(raw=start["headers"])
+        content_type = headers.get("content-type", "")
+        return (
+            start["status"] not in (204, 304)
+            and "content-encoding" not in headers
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+        )
+
+    async def __call__(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = not self._eligible(message)
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            self.encoder = _ENCODERS[self.encoding]()
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                # Length unknown until the stream ends: send chunked
+                del headers["Content-Length"]
+                await self.send(self.start)
+            else:
+                compressed = self.encoder.compress(body, final=True)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+        chunk = self.encoder.compress(body, final=not more_body)
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSender(send, encoding, self.minimum_size))
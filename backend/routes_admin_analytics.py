@@ -0,0 +1,72 @@
+"""
+Admin dashboard analytics served from precomputed rollup tables.
+
+See migrations/017_admin_analytics_rollups.sql — the rollups are refreshed by
+pg_cron (or POST /admin/analytics/refresh), so reading them costs the same
+regardless of how many payments, profiles or listings exist.
+"""
+
+import logging
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Header, Query
+from db import get_supabase_admin
+from admin_auth import require_admin
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin/analytics", tags=["admin"])
+
+
+# ── GET /admin/analytics ─────────────────────────────────────
+
+
+@router.get("")
+def get_admin_analytics(
+    authorization: str = Header(...),
+    days: int = Query(180, ge=1, le=730),
+    top_locations: int = Query(10, ge=1, le=100),
+):
+    """
+    Totals, revenue/signup series and listing locations in one response.
+    Amounts are AUD cents, matching payment_events.amount.
+    """
+    require_admin(authorization)
+    sb = get_supabase_admin()
+
+    try:
+        res = sb.rpc("admin_analytics_summary", {
+            "p_days": days,
+            "p_top_locations": top_locations,
+        }).execute()
+    except Exception:
+        logger.exception("Failed to load admin analytics")
+        raise HTTPException(status_code=500, detail="Failed to load analytics.")
+
+    return res.data
+
+
+# ── POST /admin/analytics/refresh ────────────────────────────
+
+
+@router.post("/refresh")
+def refresh_admin_analytics(
+    authorization: str = Header(...),
+    since: Optional[date] = None,
+):
+    """
+    Re-aggregate daily rollups from `since` (default: yesterday).
+    For deployments without pg_cron, point an external scheduler here.
+    """
+    require_admin(authorization)
+    sb = get_supabase_admin()
+
+    params = {"p_since": since.isoformat()} if since else {}
+    try:
+        sb.rpc("refresh_admin_rollups", params).execute()
+    except Exception:
+        logger.exception("Failed to refresh admin rollups")
+        raise HTTPException(status_code=500, detail="Failed to refresh analytics.")
+
+    return {"status": "ok"}
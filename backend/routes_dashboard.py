@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Header
+
+import dashboard_store
+from routes_listings import get_current_user
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+
+# ── GET /dashboard/summary ───────────────────────────────────
+
+
+@router.get("/summary")
+def get_dashboard_summary(authorization: str = Header(...)):
+    """
+    Profile, owned listings, deals and unread message counts in one call.
+    Replaces the separate /profiles/me, /listings?owner=true, deal and thread
+    requests the dashboards used to make on load.
+    """
+    user = get_current_user(authorization)
+    try:
+        return dashboard_store.get_summary(user.id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
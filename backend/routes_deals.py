@@ -1,17 +1,20 @@
 import os
-import stripe
+import logging
 from fastapi import APIRouter, HTTPException, Header, Request
 from models import DealCreate, DealOut, DealStatus, SeekerFeeRequest
-from db import get_supabase
+import availability
+import clients
+from resilience import DependencyUnavailable, guard
+from db import get_supabase, get_supabase_admin
+import dashboard_store
 from routes_listings import get_current_user
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/deals", tags=["deals"])
 
-STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
 
-stripe.api_key = STRIPE_SECRET_KEY
-
 OWNER_FEE_AUD = 9900  # AUD 99.00 in cents
 SEEKER_FEE_AUD = 1900  # AUD 19.00 in cents
 
@@ -69,6 +72,19 @@ def create_deal(
         deal_row["guest_names"] = body.guest_names
     if body.deal_notes:
         deal_row["deal_notes"] = body.deal_notes
+    # The dates come from one pair of fields: move-in/move-out if given, else start/end.
+    # A stay without an end isn't held; an open-ended hold would close the listing
+    # to every later search.
+    if body.move_in_date:
+        stay = availability.stay_dates(body.move_in_date, body.move_out_date)
+    else:
+        stay = availability.stay_dates(body.start_date, body.end_date)
+    if stay and stay[1] is None:
+        stay = None
+    if stay:
+        availability.period(*stay)
+    hold_until = availability.hold_until()
+
     try:
         res = sb.table("deals").insert(deal_row).execute()
     except Exception as e:
@@ -76,32 +92,50 @@ def create_deal(
 
     deal = res.data[0]
     deal_id = deal["id"]
+    if stay:
+        # Booked with the deal id in the same write, so the hold can always be
+        # released with the deal; it lapses with the checkout unless paid.
+        # The exclusion constraint turns a double booking into a 409.
+        try:
+            availability.book(body.listing_id, user.id, *stay, deal_id=deal_id, expires_at=hold_until)
+        except Exception:
+            try:
+                get_supabase_admin().table("deals").delete().eq("id", deal_id).execute()
+            except Exception:
+                logger.warning("Could not remove deal %s after its booking failed", deal_id, exc_info=True)
+            raise
+    dashboard_store.invalidate(body.owner_id, body.seeker_id)
 
     # Create Stripe Checkout Session for owner fee
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            mode="payment",
-            currency="aud",
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": "aud",
-                        "unit_amount": OWNER_FEE_AUD,
-                        "product_data": {
-                            "name": "MigRent Owner Fee",
+        with guard("stripe", "checkout.session.create"):
+            session = clients.stripe().checkout.Session.create(
+                payment_method_types=["card"],
+                mode="payment",
+                currency="aud",
+                line_items=[
+                    {
+                        "price_data": {
+                            "currency": "aud",
+                            "unit_amount": OWNER_FEE_AUD,
+                            "product_data": {
+                                "name": "MigRent Owner Fee",
+                            },
                         },
-                    },
-                    "quantity": 1,
-                }
-            ],
-            metadata={
-                "deal_id": deal_id,
-                "fee_type": "owner",
-            },
-            success_url=SUCCESS_URL,
-            cancel_url=CANCEL_URL,
-        )
+                        "quantity": 1,
+                    }
+                ],
+                metadata={
+                    "deal_id": deal_id,
+                    "fee_type": "owner",
+                },
+                success_url=SUCCESS_URL,
+                cancel_url=CANCEL_URL,
+                # Paying after the hold lapsed would pay for dates no longer held
+                expires_at=int(hold_until.timestamp()),
+            )
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Stripe error: {e}")
 
@@ -148,29 +182,32 @@ def create_seeker_fee_session(
 
     # Create Stripe Checkout Session for seeker fee
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            mode="payment",
-            currency="aud",
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": "aud",
-                        "unit_amount": SEEKER_FEE_AUD,
-                        "product_data": {
-                            "name": "MigRent Seeker Support Fee",
+        with guard("stripe", "checkout.session.create"):
+            session = clients.stripe().checkout.Session.create(
+                payment_method_types=["card"],
+                mode="payment",
+                currency="aud",
+                line_items=[
+                    {
+                        "price_data": {
+                            "currency": "aud",
+                            "unit_amount": SEEKER_FEE_AUD,
+                            "product_data": {
+                                "name": "MigRent Seeker Support Fee",
+                            },
                         },
-                    },
-                    "quantity": 1,
-                }
-            ],
-            metadata={
-                "deal_id": deal["id"],
-                "fee_type": "seeker",
-            },
-            success_url=SUCCESS_URL,
-            cancel_url=CANCEL_URL,
-        )
+                        "quantity": 1,
+                    }
+                ],
+                metadata={
+                    "deal_id": deal["id"],
+                    "fee_type": "seeker",
+                },
+                success_url=SUCCESS_URL,
+                cancel_url=CANCEL_URL,
+            )
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Stripe error: {e}")
 
@@ -257,6 +294,8 @@ def cancel_deal(
         ).eq("id", deal_id).execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    availability.release_deal(deal_id)
+    dashboard_store.invalidate(deal["owner_id"], deal["seeker_id"])
 
     return {"deal_id": deal_id, "status": DealStatus.cancelled.value, "flagged": flagged}
 
@@ -271,6 +310,7 @@ webhook_router = APIRouter(tags=["webhooks"])
 async def stripe_webhook(request: Request):
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature", "")
+    stripe = clients.stripe()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -295,14 +335,19 @@ async def stripe_webhook(request: Request):
 
             # Ensure profile row exists, then set verified = true
             existing = sb.table("profiles").select("id").eq("id", verification_user_id).execute()
+            inserted = False
             if not existing.data:
                 try:
                     sb.table("profiles").insert({"id": verification_user_id, "verified": True}).execute()
+                    inserted = True
                 except Exception:
-                    pass
-            else:
+                    # Most likely created concurrently; fall through to the update
+                    logger.warning("Profile insert for %s failed, updating instead", verification_user_id, exc_info=True)
+            if not inserted:
                 try:
                     sb.table("profiles").update({"verified": True}).eq("id", verification_user_id).execute()
+                except HTTPException:
+                    raise
                 except Exception as e:
                     raise HTTPException(status_code=500, detail=str(e))
 
@@ -317,7 +362,8 @@ async def stripe_webhook(request: Request):
                     "event_type": "checkout.session.completed",
                 }).execute()
             except Exception:
-                pass  # payment_events table may not exist yet
+                # Bookkeeping only; the verification itself has been applied
+                logger.warning("Could not record verification payment event %s", session["id"], exc_info=True)
 
             return {"status": "ok", "verification": True}
 
@@ -334,11 +380,20 @@ async def stripe_webhook(request: Request):
         if fee_type == "owner":
             # Owner fee paid → mark deal as owner_paid
             try:
-                sb.table("deals").update(
+                updated = sb.table("deals").update(
                     {"status": DealStatus.owner_paid.value}
                 ).eq("id", deal_id).execute()
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
+            for row in updated.data or []:
+                dashboard_store.invalidate(row.get("owner_id"), row.get("seeker_id"))
+            try:
+                if not availability.confirm_deal(deal_id):
+                    logger.info("Deal %s was paid without held dates", deal_id)
+            except Exception:
+                logger.warning("Could not confirm the dates held by deal %s", deal_id, exc_info=True)
 
             # Optionally log a payment event
             try:
@@ -351,16 +406,20 @@ async def stripe_webhook(request: Request):
                     "event_type": "checkout.session.completed",
                 }).execute()
             except Exception:
-                pass  # payment_events table may not exist yet
+                logger.warning("Could not record owner payment event for deal %s", deal_id, exc_info=True)
 
         elif fee_type == "seeker":
             # Seeker fee paid → mark deal as completed
             try:
-                sb.table("deals").update(
+                updated = sb.table("deals").update(
                     {"status": DealStatus.completed.value}
                 ).eq("id", deal_id).execute()
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
+            for row in updated.data or []:
+                dashboard_store.invalidate(row.get("owner_id"), row.get("seeker_id"))
 
             try:
                 sb.table("payment_events").insert({
@@ -372,6 +431,6 @@ async def stripe_webhook(request: Request):
                     "event_type": "checkout.session.completed",
                 }).execute()
             except Exception:
-                pass
+                logger.warning("Could not record seeker payment event for deal %s", deal_id, exc_info=True)
 
     return {"status": "ok"}
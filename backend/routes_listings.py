@@ -1,7 +1,21 @@
-from fastapi import APIRouter, HTTPException, Header
-from typing import Optional
-from models import ListingCreate
+import os
+from fastapi import APIRouter, HTTPException, Header, Query, Request, UploadFile, File
+from typing import Literal, Optional
+from uuid import UUID
+from datetime import date
+from models import ListingCreate, AvailabilityBlock, ListingViews
 from db import get_supabase
+from limiter import limiter
+import availability
+import listing_store
+import listing_views
+import dashboard_store
+import duplicates
+import images
+import moderation
+import rent_stats
+import search_alerts
+import similar_listings
 
 router = APIRouter(prefix="/listings", tags=["listings"])
 
@@ -41,6 +55,19 @@ def create_listing(
     if user_type and user_type != "owner":
         raise HTTPException(status_code=403, detail="Only owners can create listings")
 
+    moderation.enforce(
+        "listing",
+        listing.title,
+        listing.description,
+        *(listing.highlights or []),
+        listing.tenant_prefs,
+        listing.neighbourhood_vibe,
+        listing.other_safety_details,
+    )
+
+    fingerprint = duplicates.fingerprint(listing.title, listing.description, listing.address, listing.postcode)
+    similar = duplicates.check(fingerprint, user.id)
+
     city = listing.city or derive_city(listing.postcode)
 
     sb = get_supabase()
@@ -104,29 +131,110 @@ def create_listing(
         res = sb.table("listings").insert(row).execute()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    dashboard_store.invalidate(user.id)
+    if res.data:
+        duplicates.record(res.data[0]["id"], user.id, fingerprint, similar)
+        search_alerts.submit(res.data[0])
+        similar_listings.added(res.data[0])
+        rent_stats.added(res.data[0])
 
     return res.data[0] if res.data else row
 
 
+@router.post("/{listing_id}/images")
+def upload_listing_images(
+    listing_id: UUID,
+    files: list[UploadFile] = File(...),
+    authorization: str = Header(...),
+):
+    """Add photos to a listing; each is stored as WebP thumb/card/full variants."""
+    user = get_current_user(authorization)
+    # The parser has spooled each file to disk; they're read one at a time while processing
+    for upload in files:
+        upload.file.seek(0, os.SEEK_END)
+        if upload.file.tell() > images.MAX_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{upload.filename} is larger than {images.MAX_BYTES // (1024 * 1024)} MB",
+            )
+    return images.add_uploads(str(listing_id), user.id, [(upload.filename, upload.file) for upload in files])
+
+
+@router.post("/views")
+@limiter.limit("120/minute")
+def record_listing_views(
+    request: Request,
+    body: ListingViews,
+):
+    """Count detail views or search impressions; batched in memory, so this never waits on the database."""
+    viewer = listing_views.viewer_key(request)
+    counted = listing_views.record([str(i) for i in body.listing_ids], body.kind, viewer)
+    return {"counted": counted}
+
+
+@router.get("/{listing_id}/similar")
+def get_similar_listings(
+    listing_id: UUID,
+    limit: int = Query(6, ge=1, le=similar_listings.NEIGHBOURS),
+):
+    """Listings most like this one (price, rooms, type, amenities) in the same area, most similar first."""
+    return similar_listings.similar(str(listing_id), limit)
+
+
+@router.get("/{listing_id}/availability")
+def get_listing_availability(
+    listing_id: UUID,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    authorization: Optional[str] = Header(None),
+):
+    """Free date windows [start_date, end_date); the owner also sees bookings and blocks."""
+    user_id = get_current_user(authorization).id if authorization else None
+    return availability.calendar(str(listing_id), start, end, user_id)
+
+
+@router.post("/{listing_id}/availability/blocks")
+def block_listing_dates(
+    listing_id: UUID,
+    body: AvailabilityBlock,
+    authorization: str = Header(...),
+):
+    user = get_current_user(authorization)
+    return availability.book(str(listing_id), user.id, body.start_date, body.end_date, "blocked", body.note)
+
+
+@router.delete("/{listing_id}/availability/blocks/{block_id}")
+def unblock_listing_dates(
+    listing_id: UUID,
+    block_id: UUID,
+    authorization: str = Header(...),
+):
+    user = get_current_user(authorization)
+    availability.unblock(str(listing_id), str(block_id), user.id)
+    return {"success": True}
+
+
 @router.get("")
 def list_listings(
     city: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
+    move_in: Optional[date] = None,
+    move_out: Optional[date] = None,
+    sort: Optional[Literal["trending"]] = None,
     owner: Optional[bool] = None,
     authorization: Optional[str] = Header(None),
 ):
-    sb = get_supabase()
-    query = sb.table("listings").select("*")
-    if city:
-        query = query.eq("city", city)
-    if min_price is not None:
-        query = query.gte("weekly_price", min_price)
-    if max_price is not None:
-        query = query.lte("weekly_price", max_price)
+    """
+    Listings matching the filters; move_in (and optional move_out) keep only
+    listings free for that stay. sort=trending puts the most viewed lately first.
+    """
+    owner_id = None
     if owner and authorization:
-        user = get_current_user(authorization)
-        query = query.eq("owner_id", user.id)
+        owner_id = get_current_user(authorization).id
+    if move_out and not move_in:
+        raise HTTPException(status_code=400, detail="move_out needs a move_in date")
+    if move_in:
+        availability.period(move_in, move_out)
 
-    res = query.execute()
-    return res.data
+    return listing_store.search_listings(city, min_price, max_price, owner_id, move_in, move_out, sort)
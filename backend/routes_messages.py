@@ -3,7 +3,8 @@ Messaging endpoints for real-time chat between seeker and owner.
 Supports direct messages (from profiles) and listing-based messages.
 """
 
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from datetime import datetime
 from typing import Optional
@@ -11,6 +12,10 @@ from uuid import UUID
 
 from models import MessageCreate, MessageOut
 from db import get_supabase
+import attachments
+import bypass
+import dashboard_store
+import moderation
 from routes_listings import get_current_user
 
 router = APIRouter(prefix="/messages", tags=["messages"])
@@ -35,6 +40,8 @@ def send_message(
     if user.id != body.sender_id:
         raise HTTPException(status_code=403, detail="Cannot send messages as another user")
 
+    moderation.enforce("message", body.message_text)
+
     # Verify receiver exists
     receiver = sb.table("profiles").select("id").eq("id", body.receiver_id).execute()
     if not receiver.data:
@@ -64,6 +71,8 @@ def send_message(
     result = sb.table("messages").insert(msg_data).execute()
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to send message")
+    dashboard_store.invalidate(body.receiver_id)
+    bypass.submit(result.data[0])
 
     return {
         "success": True,
@@ -71,6 +80,19 @@ def send_message(
     }
 
 
+# ── POST /messages/attachments ───────────────────────────────
+
+
+@router.post("/attachments")
+async def upload_attachment(request: Request, authorization: str = Header(...)):
+    """
+    Upload one file (multipart field "file") for use as a message attachment.
+    Send the returned url, name and type as attachment_url/_name/_type.
+    """
+    user = await run_in_threadpool(get_current_user, authorization)
+    return await attachments.receive_attachment(request, user.id)
+
+
 # ── GET /messages/threads ────────────────────────────────────
 
 
@@ -183,6 +205,7 @@ def get_direct_messages(
                 sb.table("messages").update(
                     {"read_at": datetime.utcnow().isoformat()}
                 ).eq("id", msg_id).execute()
+            dashboard_store.invalidate(user.id)
 
     return {"messages": messages.data or []}
 
@@ -231,6 +254,7 @@ def get_thread_messages(
                 sb.table("messages").update(
                     {"read_at": datetime.utcnow().isoformat()}
                 ).eq("id", msg_id).execute()
+            dashboard_store.invalidate(user.id)
 
     return {"messages": messages.data or []}
 
@@ -260,5 +284,6 @@ def mark_message_read(
     result = sb.table("messages").update(
         {"read_at": datetime.utcnow().isoformat()}
     ).eq("id", message_id).execute()
+    dashboard_store.invalidate(user.id)
 
     return {"success": True, "message": result.data[0] if result.data else {}}
@@ -1,10 +1,16 @@
 import os
+import json
+import base64
 import logging
-import resend
+from datetime import datetime
+from uuid import UUID
 from pydantic import BaseModel, Field
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Request, Header
-from db import get_supabase
+from fastapi import APIRouter, HTTPException, Request, Header, Query
+import clients
+from resilience import guard
+from db import get_supabase, get_supabase_admin
+from admin_auth import require_admin
 from limiter import limiter
 
 logger = logging.getLogger(__name__)
@@ -87,75 +93,156 @@ def create_report(
     # Email notification to admin via Resend
     if RESEND_API_KEY:
         try:
-            resend.api_key = RESEND_API_KEY
+            resend = clients.resend()
 
             type_label = "Profile" if resolved_type == "profile" else "Listing"
 
-            resend.Emails.send({
-                "from": "MigRent Reports <onboarding@resend.dev>",
-                "to": [SUPPORT_EMAIL],
-                "subject": f"🚩 New {type_label} Report – {resolved_reason}",
-                "html": f"""
-                <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; max-width: 600px; margin: 0 auto;">
-                    <div style="background: linear-gradient(135deg, #f43f5e, #e11d48); padding: 24px; border-radius: 12px 12px 0 0;">
-                        <h2 style="color: white; margin: 0;">🚩 New {type_label} Report</h2>
+            with guard("resend", "emails.send"):
+                resend.Emails.send({
+                    "from": "MigRent Reports <onboarding@resend.dev>",
+                    "to": [SUPPORT_EMAIL],
+                    "subject": f"🚩 New {type_label} Report – {resolved_reason}",
+                    "html": f"""
+                    <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; max-width: 600px; margin: 0 auto;">
+                        <div style="background: linear-gradient(135deg, #f43f5e, #e11d48); padding: 24px; border-radius: 12px 12px 0 0;">
+                            <h2 style="color: white; margin: 0;">🚩 New {type_label} Report</h2>
+                        </div>
+                        <div style="background: #f8fafc; padding: 24px; border: 1px solid #e2e8f0; border-top: none; border-radius: 0 0 12px 12px;">
+                            <table style="width: 100%; border-collapse: collapse;">
+                                <tr>
+                                    <td style="padding: 8px 0; color: #64748b; font-size: 14px; width: 120px;">Type:</td>
+                                    <td style="padding: 8px 0; color: #1e293b; font-size: 14px; font-weight: 600;">{type_label}</td>
+                                </tr>
+                                <tr>
+                                    <td style="padding: 8px 0; color: #64748b; font-size: 14px;">{type_label} ID:</td>
+                                    <td style="padding: 8px 0; color: #1e293b; font-size: 14px; font-family: monospace;">{resolved_id}</td>
+                                </tr>
+                                <tr>
+                                    <td style="padding: 8px 0; color: #64748b; font-size: 14px;">Reporter ID:</td>
+                                    <td style="padding: 8px 0; color: #1e293b; font-size: 14px; font-family: monospace;">{user_id}</td>
+                                </tr>
+                                <tr>
+                                    <td style="padding: 8px 0; color: #64748b; font-size: 14px;">Reason:</td>
+                                    <td style="padding: 8px 0; color: #e11d48; font-size: 14px; font-weight: 600;">{resolved_reason}</td>
+                                </tr>
+                                <tr>
+                                    <td style="padding: 8px 0; color: #64748b; font-size: 14px; vertical-align: top;">Details:</td>
+                                    <td style="padding: 8px 0; color: #1e293b; font-size: 14px;">{resolved_details or 'No additional details provided.'}</td>
+                                </tr>
+                            </table>
+                            <hr style="border: none; border-top: 1px solid #e2e8f0; margin: 16px 0;">
+                            <p style="color: #94a3b8; font-size: 12px; margin: 0;">This report requires your review. Log into the admin dashboard to take action.</p>
+                        </div>
                     </div>
-                    <div style="background: #f8fafc; padding: 24px; border: 1px solid #e2e8f0; border-top: none; border-radius: 0 0 12px 12px;">
-                        <table style="width: 100%; border-collapse: collapse;">
-                            <tr>
-                                <td style="padding: 8px 0; color: #64748b; font-size: 14px; width: 120px;">Type:</td>
-                                <td style="padding: 8px 0; color: #1e293b; font-size: 14px; font-weight: 600;">{type_label}</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 8px 0; color: #64748b; font-size: 14px;">{type_label} ID:</td>
-                                <td style="padding: 8px 0; color: #1e293b; font-size: 14px; font-family: monospace;">{resolved_id}</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 8px 0; color: #64748b; font-size: 14px;">Reporter ID:</td>
-                                <td style="padding: 8px 0; color: #1e293b; font-size: 14px; font-family: monospace;">{user_id}</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 8px 0; color: #64748b; font-size: 14px;">Reason:</td>
-                                <td style="padding: 8px 0; color: #e11d48; font-size: 14px; font-weight: 600;">{resolved_reason}</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 8px 0; color: #64748b; font-size: 14px; vertical-align: top;">Details:</td>
-                                <td style="padding: 8px 0; color: #1e293b; font-size: 14px;">{resolved_details or 'No additional details provided.'}</td>
-                            </tr>
-                        </table>
-                        <hr style="border: none; border-top: 1px solid #e2e8f0; margin: 16px 0;">
-                        <p style="color: #94a3b8; font-size: 12px; margin: 0;">This report requires your review. Log into the admin dashboard to take action.</p>
-                    </div>
-                </div>
-                """,
-            })
+                    """,
+                })
         except Exception:
             logger.exception("Failed to send report email")
 
     return {"status": "ok", "message": "Report submitted. Our team will review it shortly."}
 
 
+def _encode_cursor(created_at: str, key: str) -> str:
+    raw = json.dumps([created_at, key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, uuid_key: bool = True) -> tuple[str, str]:
+    """
+    Split a cursor into its timestamp and key, checked so that they are safe
+    to put in a PostgREST filter.
+
+    Raises:
+        HTTPException: 400 unless the timestamp is ISO 8601 and, with
+            `uuid_key`, the key is a UUID
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, key = json.loads(raw)
+        created_at = datetime.fromisoformat(str(created_at)).isoformat()
+        key = str(UUID(str(key))) if uuid_key else str(key)
+        return created_at, key
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("")
 @limiter.limit("30/minute")
 def list_reports(
     request: Request,
     authorization: Optional[str] = Header(None),
     status: Optional[str] = None,
+    item_type: Optional[str] = None,
+    reason: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=200),
 ):
-    """Admin-only: list all reports."""
-    user_id = _get_user_id(authorization)
-    sb = get_supabase()
-
-    profile = sb.table("profiles").select("role").eq("id", user_id).single().execute()
-    if not profile.data or profile.data.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
+    """Admin-only: list reports, newest first, with keyset pagination."""
+    require_admin(authorization)
+    sb = get_supabase_admin()
 
-    query = sb.table("reports").select("*").order("created_at", desc=True)
+    query = sb.table("reports").select("*")
     if status:
         query = query.eq("status", status)
-    result = query.limit(100).execute()
+    if item_type:
+        query = query.eq("item_type", item_type)
+    if reason:
+        query = query.eq("reason", reason)
+    if cursor:
+        created_at, report_id = _decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt.{report_id})'
+        )
+    result = query.order("created_at", desc=True).order("id", desc=True).limit(limit).execute()
 
-    return {"reports": result.data}
+    reports = result.data or []
+    next_cursor = None
+    if len(reports) == limit:
+        last = reports[-1]
+        next_cursor = _encode_cursor(last["created_at"], last["id"])
+
+    return {"reports": reports, "next_cursor": next_cursor}
+
+
+@router.get("/queue")
+@limiter.limit("30/minute")
+def report_queue(
+    request: Request,
+    authorization: Optional[str] = Header(None),
+    status: Optional[str] = "pending",
+    item_type: Optional[str] = None,
+    reason: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Admin-only: reports grouped by reported item, most recently reported first."""
+    require_admin(authorization)
+    sb = get_supabase_admin()
+
+    params = {
+        "p_status": status or None,
+        "p_item_type": item_type,
+        "p_reason": reason,
+        "p_limit": limit,
+    }
+    if cursor:
+        # item_id is free text, passed as an RPC argument rather than into a filter
+        params["p_before"], params["p_before_item"] = _decode_cursor(cursor, uuid_key=False)
+
+    try:
+        result = sb.rpc("report_queue", params).execute()
+    except Exception:
+        logger.exception("Failed to load report queue")
+        raise HTTPException(status_code=500, detail="Failed to load report queue.")
+
+    items = result.data or []
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = _encode_cursor(last["last_reported_at"], last["item_id"])
+
+    return {"items": items, "next_cursor": next_cursor}
 
 
 @router.patch("/{report_id}")
@@ -166,14 +253,9 @@ def update_report(
     authorization: Optional[str] = Header(None),
 ):
     """Admin-only: update report status (reviewed / dismissed)."""
-    user_id = _get_user_id(authorization)
-    sb = get_supabase()
-
-    profile = sb.table("profiles").select("role").eq("id", user_id).single().execute()
-    if not profile.data or profile.data.get("role") != "admin":
-        raise HTTPException(status_code=403, detail="Admin access required")
+    user_id = require_admin(authorization)
+    sb = get_supabase_admin()
 
-    import json
     body = json.loads(request._body) if hasattr(request, '_body') else {}
     new_status = body.get("status", "reviewed")
     if new_status not in ("reviewed", "dismissed", "actioned"):
@@ -0,0 +1,118 @@
+"""
+Saved searches and the alerts raised when new listings match them.
+Matching happens in search_alerts.py when a listing is created.
+"""
+
+from datetime import datetime, timezone
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Header
+
+from models import SavedSearchCreate
+from db import get_supabase_admin
+import search_alerts
+from routes_listings import get_current_user
+
+router = APIRouter(prefix="/saved-searches", tags=["saved-searches"])
+
+MAX_SAVED_SEARCHES = 20
+SEARCH_COLUMNS = "id,name,city,postcode,min_price,max_price,amenities,notify,created_at"
+ALERT_LISTING_FIELDS = "id,title,address,city,postcode,weekly_price,images,image_variants,created_at"
+
+
+# ── POST /saved-searches ─────────────────────────────────────
+
+
+@router.post("")
+def create_saved_search(body: SavedSearchCreate, authorization: str = Header(...)):
+    user = get_current_user(authorization)
+    if body.min_price is not None and body.max_price is not None and body.min_price > body.max_price:
+        raise HTTPException(status_code=400, detail="min_price can't be above max_price")
+
+    sb = get_supabase_admin()
+    existing = sb.table("saved_searches").select("id").eq("user_id", user.id).eq("active", True).execute()
+    if len(existing.data) >= MAX_SAVED_SEARCHES:
+        raise HTTPException(status_code=400, detail=f"You can save at most {MAX_SAVED_SEARCHES} searches")
+
+    res = sb.table("saved_searches").insert({**body.model_dump(), "user_id": user.id, "active": True}).execute()
+    if not res.data:
+        raise HTTPException(status_code=500, detail="Failed to save search")
+    search_alerts.saved(res.data[0])
+    return {key: res.data[0].get(key) for key in SEARCH_COLUMNS.split(",")}
+
+
+# ── GET /saved-searches ──────────────────────────────────────
+
+
+@router.get("")
+def list_saved_searches(authorization: str = Header(...)):
+    user = get_current_user(authorization)
+    res = (
+        get_supabase_admin().table("saved_searches")
+        .select(SEARCH_COLUMNS)
+        .eq("user_id", user.id)
+        .eq("active", True)
+        .order("created_at", desc=True)
+        .execute()
+    )
+    return {"searches": res.data}
+
+
+# ── DELETE /saved-searches/:id ───────────────────────────────
+
+
+@router.delete("/{search_id}")
+def delete_saved_search(search_id: UUID, authorization: str = Header(...)):
+    user = get_current_user(authorization)
+    # Deactivated rather than deleted so other workers sync the removal
+    res = (
+        get_supabase_admin().table("saved_searches")
+        .update({"active": False, "updated_at": datetime.now(timezone.utc).isoformat()})
+        .eq("id", str(search_id))
+        .eq("user_id", user.id)
+        .eq("active", True)
+        .execute()
+    )
+    if not res.data:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    search_alerts.saved(res.data[0])
+    return {"success": True}
+
+
+# ── GET /saved-searches/alerts ───────────────────────────────
+
+
+@router.get("/alerts")
+def list_search_alerts(authorization: str = Header(...), limit: int = 50):
+    """Newest listings that matched the user's saved searches."""
+    user = get_current_user(authorization)
+    sb = get_supabase_admin()
+    alerts = (
+        sb.table("search_alerts")
+        .select("id,saved_search_id,listing_id,created_at,read_at")
+        .eq("user_id", user.id)
+        .order("created_at", desc=True)
+        .limit(max(1, min(limit, 200)))
+        .execute()
+    ).data
+    listing_ids = sorted({a["listing_id"] for a in alerts})
+    listings = {}
+    if listing_ids:
+        res = sb.table("listings").select(ALERT_LISTING_FIELDS).in_("id", listing_ids).execute()
+        listings = {row["id"]: row for row in res.data}
+    return {
+        "alerts": [{**a, "listing": listings[a["listing_id"]]} for a in alerts if a["listing_id"] in listings],
+        "unread": sum(1 for a in alerts if a["read_at"] is None),
+    }
+
+
+# ── PATCH /saved-searches/alerts/read ────────────────────────
+
+
+@router.patch("/alerts/read")
+def mark_search_alerts_read(authorization: str = Header(...)):
+    user = get_current_user(authorization)
+    get_supabase_admin().table("search_alerts").update(
+        {"read_at": datetime.now(timezone.utc).isoformat()}
+    ).eq("user_id", user.id).is_("read_at", "null").execute()
+    return {"success": True}
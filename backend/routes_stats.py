@@ -0,0 +1,22 @@
+"""
+Market statistics for owners pricing a listing and seekers judging one.
+Served from the in-memory sketches in rent_stats.py.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+import rent_stats
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/rent")
+def get_rent_stats(
+    postcode: int = Query(..., ge=800, le=9999),
+    property_type: Optional[str] = Query(None, max_length=50),
+    place_type: Optional[str] = Query(None, max_length=50),
+):
+    """Weekly price p25/median/p75 of listings in a postcode, optionally of one property or place type."""
+    return rent_stats.rent(postcode, property_type, place_type)
@@ -1,8 +1,9 @@
 import os
 import logging
-import resend
 from pydantic import BaseModel, EmailStr, Field
 from fastapi import APIRouter, HTTPException, Request
+import clients
+from resilience import guard
 from db import get_supabase
 from limiter import limiter
 
@@ -39,20 +40,21 @@ def submit_contact(request: Request, body: ContactRequest):
     # Send email notification via Resend
     if RESEND_API_KEY:
         try:
-            resend.api_key = RESEND_API_KEY
-            resend.Emails.send({
-                "from": "MigRent Support <onboarding@resend.dev>",
-                "to": [SUPPORT_EMAIL],
-                "subject": f"New support request from {body.name} ({body.role})",
-                "html": f"""
-                <h2>New Support Request</h2>
-                <p><strong>Name:</strong> {body.name}</p>
-                <p><strong>Email:</strong> {body.email}</p>
-                <p><strong>Role:</strong> {body.role}</p>
-                <p><strong>Message:</strong></p>
-                <p>{body.message}</p>
-                """,
-            })
+            resend = clients.resend()
+            with guard("resend", "emails.send"):
+                resend.Emails.send({
+                    "from": "MigRent Support <onboarding@resend.dev>",
+                    "to": [SUPPORT_EMAIL],
+                    "subject": f"New support request from {body.name} ({body.role})",
+                    "html": f"""
+                    <h2>New Support Request</h2>
+                    <p><strong>Name:</strong> {body.name}</p>
+                    <p><strong>Email:</strong> {body.email}</p>
+                    <p><strong>Role:</strong> {body.role}</p>
+                    <p><strong>Message:</strong></p>
+                    <p>{body.message}</p>
+                    """,
+                })
         except Exception:
             logger.exception("Failed to send support email via Resend")
 
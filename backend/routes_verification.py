@@ -1,14 +1,12 @@
 import os
-import stripe
 from fastapi import APIRouter, HTTPException, Header
+import clients
+from resilience import DependencyUnavailable, guard
 from db import get_supabase
 from routes_listings import get_current_user
 
 router = APIRouter(prefix="/payments", tags=["verification"])
 
-STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "")
-stripe.api_key = STRIPE_SECRET_KEY
-
 VERIFICATION_FEE_AUD = 1900  # AUD 19.00 in cents
 
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:3000")
@@ -39,32 +37,35 @@ def create_verification_session(authorization: str = Header(...)):
         pass  # profiles row may not exist yet; that's fine
 
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            mode="payment",
-            currency="aud",
-            line_items=[
-                {
-                    "price_data": {
-                        "currency": "aud",
-                        "unit_amount": VERIFICATION_FEE_AUD,
-                        "product_data": {
-                            "name": "MigRent Seeker Verification",
+        with guard("stripe", "checkout.session.create"):
+            session = clients.stripe().checkout.Session.create(
+                payment_method_types=["card"],
+                mode="payment",
+                currency="aud",
+                line_items=[
+                    {
+                        "price_data": {
+                            "currency": "aud",
+                            "unit_amount": VERIFICATION_FEE_AUD,
+                            "product_data": {
+                                "name": "MigRent Seeker Verification",
+                            },
                         },
-                    },
-                    "quantity": 1,
-                }
-            ],
-            metadata={
-                "user_id": user.id,
-                "purpose": "verification",
-            },
-            payment_intent_data={
-                "statement_descriptor": "MigRent Verify",  # max 22 chars
-            },
-            success_url=VERIFICATION_SUCCESS_URL,
-            cancel_url=VERIFICATION_CANCEL_URL,
-        )
+                        "quantity": 1,
+                    }
+                ],
+                metadata={
+                    "user_id": user.id,
+                    "purpose": "verification",
+                },
+                payment_intent_data={
+                    "statement_descriptor": "MigRent Verify",  # max 22 chars
+                },
+                success_url=VERIFICATION_SUCCESS_URL,
+                cancel_url=VERIFICATION_CANCEL_URL,
+            )
+    except DependencyUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Stripe error: {e}")
 
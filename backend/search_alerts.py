@@ -0,0 +1,429 @@
+"""
+Saved-search alerts for new listings.
+
+create_listing hands the inserted row to submit(), which only enqueues it. A
+background thread matches it against every active saved search and writes
+one search_alerts row per match, in batches. `python -m search_alerts
+--digest` (run from cron) then emails each user one digest of their unsent
+alerts.
+
+Matching uses an inverted index over the search predicates instead of
+testing every saved search:
+
+- location: searches by city (case-insensitive) and by postcode, plus the
+  searches with no location;
+- price: weekly price in PRICE_BUCKET-dollar buckets; each search is listed
+  under every bucket its range overlaps (ranges wider than MAX_PRICE_BUCKETS
+  buckets, and searches without a price range, go in an "any price" set);
+- amenities: searches grouped by the exact set of amenities they require;
+  a listing matches the groups whose set it has (at most 2^9 groups).
+
+A listing's candidates are the searches on the smallest of its location,
+price and amenity sides (each a union of posting lists, read in place);
+each candidate's own filters are then checked directly, so the cost grows
+with the searches that match on that side, not the number of saved searches.
+
+Each worker keeps its own index. Searches created or deleted on this worker
+apply immediately; changes made on other workers are paged in by updated_at
+every SEARCH_ALERTS_SYNC_INTERVAL seconds (deleting a search only clears its
+active flag, so removals sync the same way). Each sync re-reads the last
+SYNC_OVERLAP_SECONDS of changes, since updated_at is stamped when a write's
+transaction starts and can commit out of order.
+"""
+
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from html import escape
+from typing import Optional
+
+from prometheus_client import Counter
+
+import clients
+from db import get_supabase_admin, pages_since
+from models import SEARCH_AMENITIES
+from resilience import guard
+
+logger = logging.getLogger(__name__)
+
+PRICE_BUCKET = 50
+MAX_PRICE_BUCKETS = 40
+SYNC_INTERVAL = float(os.environ.get("SEARCH_ALERTS_SYNC_INTERVAL", "30"))
+BATCH_SIZE = int(os.environ.get("SEARCH_ALERTS_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.environ.get("SEARCH_ALERTS_FLUSH_INTERVAL", "2"))
+QUEUE_SIZE = int(os.environ.get("SEARCH_ALERTS_QUEUE_SIZE", "1000"))
+
+RESEND_API_KEY = os.environ.get("RESEND_API_KEY", "")
+FRONTEND_URL = os.environ.get("FRONTEND_URL", "https://migrent-ai.vercel.app").rstrip("/")
+
+SEARCH_FIELDS = "id,user_id,city,postcode,min_price,max_price,amenities,active,updated_at"
+
+MATCHED = Counter(
+    "search_alert_matches_total",
+    "Saved searches matched by new listings",
+)
+CANDIDATES = Counter(
+    "search_alert_candidates_total",
+    "Saved searches checked exactly after the inverted-index lookup",
+)
+DROPPED = Counter(
+    "search_alert_listings_dropped_total",
+    "New listings not matched because the alert queue was full",
+)
+
+
+def _city(value) -> Optional[str]:
+    return value.strip().lower() if value and value.strip() else None
+
+
+def _price(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+class _Search:
+    __slots__ = ("id", "user_id", "city", "postcode", "min_price", "max_price", "amenities", "buckets")
+
+    def __init__(self, row: dict):
+        self.id = str(row["id"])
+        self.user_id = str(row["user_id"])
+        self.city = _city(row.get("city"))
+        self.postcode = row.get("postcode")
+        self.min_price = _price(row.get("min_price"))
+        self.max_price = _price(row.get("max_price"))
+        self.amenities = frozenset(row.get("amenities") or ())
+        self.buckets: Optional[range] = None
+        if self.min_price is not None or self.max_price is not None:
+            low = int((self.min_price or 0) // PRICE_BUCKET)
+            high = int(self.max_price // PRICE_BUCKET) if self.max_price is not None else None
+            if high is not None and high - low < MAX_PRICE_BUCKETS:
+                self.buckets = range(low, high + 1)
+
+    def matches_price(self, price: float) -> bool:
+        return (self.min_price is None or price >= self.min_price) and (self.max_price is None or price <= self.max_price)
+
+
+class SearchIndex:
+    """Inverted index of saved searches, guarded by one lock."""
+
+    def __init__(self):
+        self._searches: dict[str, _Search] = {}
+        self._by_city: dict[str, set[str]] = {}
+        self._by_postcode: dict[int, set[str]] = {}
+        self._any_location: set[str] = set()
+        self._by_bucket: dict[int, set[str]] = {}
+        self._any_price: set[str] = set()
+        self._by_amenities: dict[frozenset, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._searches)
+
+    def _postings(self, search: _Search) -> list[set[str]]:
+        postings = []
+        if search.city:
+            postings.append(self._by_city.setdefault(search.city, set()))
+        if search.postcode is not None:
+            postings.append(self._by_postcode.setdefault(search.postcode, set()))
+        if not search.city and search.postcode is None:
+            postings.append(self._any_location)
+        if search.buckets is None:
+            postings.append(self._any_price)
+        else:
+            postings.extend(self._by_bucket.setdefault(b, set()) for b in search.buckets)
+        postings.append(self._by_amenities.setdefault(search.amenities, set()))
+        return postings
+
+    def put(self, row: dict) -> None:
+        """Add or replace a search (removes it if the row is inactive)."""
+        with self._lock:
+            self._remove(str(row["id"]))
+            if row.get("active", True):
+                search = _Search(row)
+                self._searches[search.id] = search
+                for posting in self._postings(search):
+                    posting.add(search.id)
+
+    def remove(self, search_id: str) -> None:
+        with self._lock:
+            self._remove(str(search_id))
+
+    def _remove(self, search_id: str) -> None:
+        search = self._searches.pop(search_id, None)
+        if search is not None:
+            for posting in self._postings(search):
+                posting.discard(search_id)
+
+    def match(self, listing: dict) -> list[_Search]:
+        """Searches whose filters the listing satisfies (including the owner's own)."""
+        price = _price(listing.get("weekly_price"))
+        if price is None:
+            return []
+        have = frozenset(a for a in SEARCH_AMENITIES if listing.get(a) is True)
+        city, postcode = _city(listing.get("city")), listing.get("postcode")
+        postcode = int(postcode) if postcode is not None else None
+        with self._lock:
+            # Each side is a union of posting lists; walk the smallest side's lists as
+            # they are (no copies of the catch-all sets) and check the rest per search
+            location = [self._any_location, self._by_city.get(city, ()), self._by_postcode.get(postcode, ())]
+            prices = [self._any_price, self._by_bucket.get(int(price // PRICE_BUCKET), ())]
+            amenities = [ids for required, ids in self._by_amenities.items() if required <= have]
+            smallest = min((location, prices, amenities), key=lambda lists: sum(len(ids) for ids in lists))
+
+            found, seen = [], set()
+            for ids in smallest:
+                for search_id in ids:
+                    if search_id in seen:
+                        continue
+                    seen.add(search_id)
+                    search = self._searches[search_id]
+                    # A search with both city and postcode needs both to match
+                    if search.city and search.city != city:
+                        continue
+                    if search.postcode is not None and search.postcode != postcode:
+                        continue
+                    if search.amenities <= have and search.matches_price(price):
+                        found.append(search)
+            CANDIDATES.inc(len(seen))
+            return found
+
+
+_index = SearchIndex()
+# Latest updated_at applied; syncs re-read SYNC_OVERLAP_SECONDS behind it
+_since: Optional[str] = None
+_sync_lock = threading.Lock()
+
+
+def sync() -> int:
+    """
+    Page in saved searches changed since the last sync (all active ones the first time).
+
+    Returns:
+        int: Rows applied; 0 if another thread is already syncing
+    """
+    global _since
+    if not _sync_lock.acquire(blocking=False):
+        return 0
+    try:
+        sb = get_supabase_admin()
+        first = _since is None
+
+        def new_query():
+            query = sb.table("saved_searches").select(SEARCH_FIELDS)
+            return query.eq("active", True) if first else query
+
+        applied = 0
+        for page in pages_since(new_query, "updated_at", _since):
+            for row in page:
+                # Rows in the overlap come back as they are now, so re-applying them is harmless
+                _index.put(row)
+            applied += len(page)
+            _since = max(_since or "", page[-1]["updated_at"])
+        if applied:
+            logger.info("Saved search index: %d changes applied (%d active)", applied, len(_index))
+        return applied
+    finally:
+        _sync_lock.release()
+
+
+def saved(row: dict) -> None:
+    """Apply a search created, updated or deleted on this worker right away."""
+    _index.put(row)
+
+
+# ── Background matcher ───────────────────────────────────────
+
+
+def _alerts_for(listing: dict) -> list[dict]:
+    owner_id = str(listing.get("owner_id"))
+    matches = [s for s in _index.match(listing) if s.user_id != owner_id]
+    MATCHED.inc(len(matches))
+    return [{"saved_search_id": s.id, "user_id": s.user_id, "listing_id": listing["id"]} for s in matches]
+
+
+def write_alerts(rows: list[dict]) -> None:
+    if rows:
+        get_supabase_admin().table("search_alerts").upsert(
+            rows, on_conflict="saved_search_id,listing_id", ignore_duplicates=True
+        ).execute()
+
+
+class Pipeline:
+    """Matches submitted listings on one thread and writes alerts in batches."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._pending: list[dict] = []
+        self._synced_at = 0.0
+        self._thread = threading.Thread(target=self._run, name="search-alerts", daemon=True)
+        self._thread.start()
+
+    def submit(self, listing: dict) -> None:
+        try:
+            self._queue.put_nowait(listing)
+        except queue.Full:
+            DROPPED.inc()
+
+    def _sync(self) -> None:
+        now = time.monotonic()
+        if now - self._synced_at < SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        try:
+            sync()
+        except Exception:
+            logger.warning("Saved search sync failed", exc_info=True)
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        try:
+            write_alerts(self._pending)
+            self._pending = []
+        except Exception:
+            logger.warning("Failed to write %d search alerts", len(self._pending), exc_info=True)
+            self._pending = self._pending[-BATCH_SIZE * 20:]
+
+    def _run(self) -> None:
+        while True:
+            self._sync()
+            try:
+                listing = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self._flush()
+                continue
+            if listing is None:
+                self._flush()
+                return
+            try:
+                self._pending.extend(_alerts_for(listing))
+            except Exception:
+                logger.exception("Search alert matching failed for listing %s", listing.get("id"))
+            if len(self._pending) >= BATCH_SIZE:
+                self._flush()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+_pipeline: Optional[Pipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def submit(listing: dict) -> None:
+    """Queue a newly inserted listing row for alert matching (never blocks)."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = Pipeline()
+    _pipeline.submit(listing)
+
+
+def shutdown() -> None:
+    """Write pending alerts; called from the lifespan handler on shutdown."""
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+# ── Email digest ─────────────────────────────────────────────
+
+
+def _digest_html(listings: list[dict]) -> str:
+    items = "".join(
+        f"""
+        <li style="margin-bottom: 12px;">
+            <a href="{FRONTEND_URL}/seeker/room/{l['id']}" style="color: #e11d48; font-weight: 600;">{escape(l.get('title') or l.get('address') or 'Room')}</a><br>
+            <span style="color: #64748b; font-size: 14px;">{escape(l.get('city') or '')} {l.get('postcode') or ''} · ${l.get('weekly_price')}/wk</span>
+        </li>"""
+        for l in listings
+    )
+    return f"""
+    <div style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; max-width: 600px; margin: 0 auto;">
+        <h2 style="color: #1e293b;">New rooms matching your saved searches</h2>
+        <ul style="padding-left: 18px;">{items}</ul>
+        <p style="color: #94a3b8; font-size: 12px;">Turn these emails off by editing your saved searches on MigRent.</p>
+    </div>"""
+
+
+def digest(page_size: int = 500, dry_run: bool = False) -> dict:
+    """
+    Email every user one digest of their unsent alerts, then mark them notified.
+
+    Returns:
+        dict: Alerts handled and emails sent
+    """
+    sb = get_supabase_admin()
+    done = {"alerts": 0, "emails": 0}
+    while True:
+        alerts = (
+            sb.table("search_alerts").select("id,saved_search_id,user_id,listing_id")
+            .is_("notified_at", "null").order("created_at").limit(page_size).execute().data
+        )
+        if not alerts:
+            break
+        search_ids = sorted({a["saved_search_id"] for a in alerts})
+        notify = {
+            r["id"] for r in
+            sb.table("saved_searches").select("id").in_("id", search_ids).eq("notify", True).eq("active", True).execute().data
+        }
+        listing_ids = sorted({a["listing_id"] for a in alerts})
+        listings = {
+            r["id"]: r for r in
+            sb.table("listings").select("id,title,address,city,postcode,weekly_price").in_("id", listing_ids).execute().data
+        }
+
+        by_user: dict[str, dict[str, dict]] = {}
+        for a in alerts:
+            if a["saved_search_id"] in notify and a["listing_id"] in listings:
+                by_user.setdefault(a["user_id"], {})[a["listing_id"]] = listings[a["listing_id"]]
+
+        for user_id, matched in by_user.items():
+            try:
+                email = sb.auth.admin.get_user_by_id(user_id).user.email
+                if dry_run:
+                    print(f"{email}: {len(matched)} listings")
+                elif RESEND_API_KEY and email:
+                    resend = clients.resend()
+                    with guard("resend", "emails.send"):
+                        resend.Emails.send({
+                            "from": "MigRent <onboarding@resend.dev>",
+                            "to": [email],
+                            "subject": f"{len(matched)} new room{'s' if len(matched) != 1 else ''} matching your saved searches",
+                            "html": _digest_html(list(matched.values())),
+                        })
+                done["emails"] += 1
+            except Exception:
+                # Marked notified below anyway: a bad address must not block the queue
+                logger.warning("Failed to send search digest to %s", user_id, exc_info=True)
+
+        done["alerts"] += len(alerts)
+        if dry_run:
+            break
+        sb.table("search_alerts").update({"notified_at": datetime.now(timezone.utc).isoformat()}).in_(
+            "id", [a["id"] for a in alerts]
+        ).execute()
+        logger.info("Digest: %s", done)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Saved search alerts")
+    parser.add_argument("--digest", action="store_true", help="email unsent alerts, one email per user")
+    parser.add_argument("--dry-run", action="store_true", help="print recipients instead of sending")
+    args = parser.parse_args()
+    if not args.digest:
+        parser.print_help()
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(digest(dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
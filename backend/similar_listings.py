@@ -0,0 +1,410 @@
+"""
+"Similar places" for a listing: nearest neighbours over listing features.
+
+Every listing is encoded as a short numeric vector, scaled so that one unit
+is a comparable difference on every axis:
+
+- weekly price on a log scale (double the price = PRICE_WEIGHT units);
+- bedrooms, bathrooms and guests;
+- place type, one-hot (a different type = PLACE_WEIGHT units);
+- the SEARCH_AMENITIES booleans (each mismatch = AMENITY_WEIGHT units).
+
+Location is handled by blocking: only listings in the same city (or, without
+a city, the same postcode region) are candidates. Within a block, a
+different postcode adds one unit; two listings with coordinates use their
+distance instead (LOCATION_KM per unit, capped at two).
+
+The index lives in each worker's memory. A listing's neighbours are found
+the first time they are asked for by walking its block outwards from its
+price: the price gap alone bounds the distance, so the walk stops once it
+passes the farthest of the NEIGHBOURS nearest found so far, which is exact
+(about 30 ms for a 20,000-listing block). The result is kept, unless the
+walk was cut short by SIMILAR_MAX_SCAN, a safety cap set well above any
+city's listing count.
+Adding a listing only appends it to its block; kept lists catch up with
+the additions when they are next read, so inserts and warm-up stay linear
+and GET /listings/{id}/similar is usually a dict lookup plus one
+primary-key read of the neighbours' current rows. Listings that no longer
+exist drop out of the index when that read misses them.
+
+Each worker loads every listing during warm-up and then pages in listings
+created on other workers every SIMILAR_SYNC_INTERVAL seconds (re-reading the
+last SYNC_OVERLAP_SECONDS, in case a row committed late); its own inserts
+are indexed immediately.
+"""
+
+import os
+import math
+import time
+import heapq
+import bisect
+import logging
+import threading
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException
+from prometheus_client import Counter
+
+from db import get_supabase_admin, pages_since
+from models import SEARCH_AMENITIES
+
+logger = logging.getLogger(__name__)
+
+SYNC_INTERVAL = float(os.environ.get("SIMILAR_SYNC_INTERVAL", "60"))
+NEIGHBOURS = int(os.environ.get("SIMILAR_NEIGHBOURS", "24"))
+# Most listings compared for one cold lookup; beyond it the answer is approximate and not kept
+MAX_SCAN = int(os.environ.get("SIMILAR_MAX_SCAN", "100000"))
+# Additions per block remembered for catching kept lists up
+ADDED_LOG = 4096
+
+PRICE_WEIGHT = 1.5
+PLACE_WEIGHT = 1.0
+AMENITY_WEIGHT = 0.5
+LOCATION_KM = 5.0
+
+# ListingForm sends "Private room" etc.; compared lower-case with underscores
+PLACE_TYPES = ("entire_place", "private_room", "shared_room", "multiple_rooms")
+
+FEATURE_FIELDS = (
+    "id,city,postcode,latitude,longitude,weekly_price,bedrooms,bathrooms,max_guests,place_type,created_at,"
+    + ",".join(SEARCH_AMENITIES)
+)
+CARD_FIELDS = "id,title,address,city,postcode,weekly_price,bedrooms,bathrooms,place_type,images,image_variants"
+
+LOOKUPS = Counter(
+    "similar_listings_lookups_total",
+    "Similar-listing lookups, by whether the neighbour list was already kept",
+    ["cache"],
+)
+TRUNCATED = Counter(
+    "similar_listings_truncated_total",
+    "Uncached lookups cut short by SIMILAR_MAX_SCAN, whose approximate results are not kept",
+)
+
+
+class Entry(NamedTuple):
+    listing_id: str
+    block: str
+    postcode: Optional[int]
+    coords: Optional[tuple[float, float]]
+    vector: tuple[float, ...]
+
+
+def _number(value, default: float) -> float:
+    try:
+        return default if value is None else float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def encode(row: dict) -> Optional[Entry]:
+    """Feature entry for a listing row; None if it has no usable price or location."""
+    price = _number(row.get("weekly_price"), 0)
+    city = (row.get("city") or "").strip().lower()
+    try:
+        postcode = int(row["postcode"]) if row.get("postcode") is not None else None
+    except (TypeError, ValueError):
+        postcode = None
+    if price <= 0 or (not city and postcode is None):
+        return None
+
+    place = (row.get("place_type") or "").strip().lower().replace(" ", "_")
+    vector = [
+        PRICE_WEIGHT * math.log2(price),
+        _number(row.get("bedrooms"), 1) / 2,
+        _number(row.get("bathrooms"), 1) / 2,
+        _number(row.get("max_guests"), 1) / 4,
+    ]
+    # Two one-hot positions differ for a type change: scale so that costs PLACE_WEIGHT units
+    vector.extend(PLACE_WEIGHT * math.sqrt(0.5) * (place == p) for p in PLACE_TYPES)
+    vector.extend(AMENITY_WEIGHT * (row.get(a) is True) for a in SEARCH_AMENITIES)
+
+    coords = None
+    if row.get("latitude") is not None and row.get("longitude") is not None:
+        coords = (float(row["latitude"]), float(row["longitude"]))
+    return Entry(str(row["id"]), city or f"postcode:{postcode // 100}", postcode, coords, tuple(vector))
+
+
+def distance(a: Entry, b: Entry) -> float:
+    """Squared distance between two entries of the same block."""
+    d = math.dist(a.vector, b.vector) ** 2
+    if a.coords and b.coords:
+        # Equirectangular approximation; plenty for distances within a city
+        dy = (a.coords[0] - b.coords[0]) * 111.0
+        dx = (a.coords[1] - b.coords[1]) * 111.0 * math.cos(math.radians(a.coords[0]))
+        d += min(math.hypot(dx, dy) / LOCATION_KM, 2.0) ** 2
+    elif a.postcode != b.postcode:
+        d += 1.0
+    return d
+
+
+# ── Index ────────────────────────────────────────────────────
+
+
+class _Block:
+    """Listings sharing a location block."""
+
+    __slots__ = ("entries", "by_price", "added", "added_base", "removals")
+
+    def __init__(self):
+        self.entries: dict[str, Entry] = {}
+        # (price coordinate, listing_id), sorted: scans walk outwards from a listing's price
+        self.by_price: list[tuple[float, str]] = []
+        # Ids added since sequence number added_base, for catching kept lists up
+        self.added: list[str] = []
+        self.added_base = 0
+        self.removals = 0
+
+    @property
+    def seq(self) -> int:
+        return self.added_base + len(self.added)
+
+
+class _Kept(NamedTuple):
+    seq: int
+    removals: int
+    nearest: list[tuple[float, str]]
+
+
+class SimilarIndex:
+    """
+    Listing entries blocked by location, with kept neighbour lists, guarded by one lock.
+
+    Adding a listing doesn't touch other listings' kept lists; they catch up
+    with the block's additions since they were computed the next time they
+    are read.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, Entry] = {}
+        self._blocks: dict[str, _Block] = {}
+        self._neighbours: dict[str, _Kept] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, listing_id: str) -> bool:
+        return listing_id in self._entries
+
+    def add(self, row: dict) -> None:
+        """Index a listing row (replacing a previous entry for it)."""
+        self.add_many([row])
+
+    def add_many(self, rows: list[dict]) -> None:
+        entries = [(str(row["id"]), encode(row)) for row in rows]
+        with self._lock:
+            touched = set()
+            for listing_id, entry in entries:
+                self._remove(listing_id)
+                if entry is None:
+                    continue
+                block = self._blocks.setdefault(entry.block, _Block())
+                block.entries[listing_id] = entry
+                if len(entries) > 1:
+                    block.by_price.append((entry.vector[0], listing_id))
+                else:
+                    bisect.insort(block.by_price, (entry.vector[0], listing_id))
+                block.added.append(listing_id)
+                if len(block.added) > ADDED_LOG:
+                    # Kept lists older than the log are recomputed instead
+                    drop = len(block.added) - ADDED_LOG // 2
+                    del block.added[:drop]
+                    block.added_base += drop
+                self._entries[listing_id] = entry
+                touched.add(block)
+            if len(entries) > 1:
+                for block in touched:
+                    block.by_price.sort()
+
+    def remove(self, listing_id: str) -> None:
+        with self._lock:
+            self._remove(str(listing_id))
+
+    def _remove(self, listing_id: str) -> None:
+        entry = self._entries.pop(listing_id, None)
+        if entry is None:
+            return
+        block = self._blocks[entry.block]
+        del block.entries[listing_id]
+        i = bisect.bisect_left(block.by_price, (entry.vector[0], listing_id))
+        if i < len(block.by_price) and block.by_price[i][1] == listing_id:
+            del block.by_price[i]
+        # Removals are rare (deleted listings); the block's kept lists are recomputed
+        block.removals += 1
+        self._neighbours.pop(listing_id, None)
+
+    def _scan(self, entry: Entry, block: _Block, by_price: list[tuple[float, str]]) -> tuple[list[tuple[float, str]], bool]:
+        """
+        The NEIGHBOURS nearest listings, walking outwards by price. The price
+        gap alone bounds the distance, so the walk stops once it exceeds the
+        farthest neighbour found; MAX_SCAN caps it for very large blocks.
+
+        Returns:
+            tuple: (squared distance, listing_id) pairs nearest first, and
+            whether they are exact (the walk wasn't cut short by MAX_SCAN)
+        """
+        x = entry.vector[0]
+        hi = bisect.bisect_left(by_price, (x, entry.listing_id))
+        lo = hi - 1
+        best: list[tuple[float, str]] = []  # max-heap of (-distance, id)
+        scanned = 0
+        exact = True
+        while lo >= 0 or hi < len(by_price):
+            if scanned >= MAX_SCAN:
+                exact = False
+                break
+            if hi >= len(by_price) or (lo >= 0 and x - by_price[lo][0] <= by_price[hi][0] - x):
+                price, other_id = by_price[lo]
+                lo -= 1
+            else:
+                price, other_id = by_price[hi]
+                hi += 1
+            if len(best) == NEIGHBOURS and (price - x) ** 2 >= -best[0][0]:
+                break
+            other = block.entries.get(other_id)
+            if other is None or other_id == entry.listing_id:
+                continue
+            scanned += 1
+            d = distance(entry, other)
+            if len(best) < NEIGHBOURS:
+                heapq.heappush(best, (-d, other_id))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-d, other_id))
+        return sorted((-d, other_id) for d, other_id in best), exact
+
+    def neighbours(self, listing_id: str) -> Optional[list[tuple[float, str]]]:
+        """
+        Nearest listings to `listing_id`, nearest first.
+
+        Returns:
+            list: (squared distance, listing_id) pairs, or None if the listing isn't indexed
+        """
+        with self._lock:
+            entry = self._entries.get(listing_id)
+            if entry is None:
+                return None
+            block = self._blocks[entry.block]
+            kept = self._neighbours.get(listing_id)
+            if kept is not None and kept.removals == block.removals and kept.seq >= block.added_base:
+                LOOKUPS.labels("hit").inc()
+                nearest = kept.nearest
+                if kept.seq < block.seq:
+                    nearest = list(nearest)
+                    for other_id in block.added[kept.seq - block.added_base:]:
+                        other = block.entries.get(other_id)
+                        if other is None or other_id == listing_id:
+                            continue
+                        d = distance(entry, other)
+                        if len(nearest) < NEIGHBOURS or d < nearest[-1][0]:
+                            bisect.insort(nearest, (d, other_id))
+                            del nearest[NEIGHBOURS:]
+                    self._neighbours[listing_id] = _Kept(block.seq, block.removals, nearest)
+                return list(nearest)
+            seq, removals = block.seq, block.removals
+            by_price = list(block.by_price)
+        LOOKUPS.labels("miss").inc()
+
+        # The scan runs outside the lock so other lookups aren't held up by it;
+        # listings added meanwhile are after `seq` and get patched in on the next read
+        nearest, exact = self._scan(entry, block, by_price)
+        if not exact:
+            TRUNCATED.inc()
+            return list(nearest)
+        with self._lock:
+            if listing_id in self._entries and block.removals == removals:
+                self._neighbours[listing_id] = _Kept(seq, removals, nearest)
+        return list(nearest)
+
+
+_index = SimilarIndex()
+# Latest created_at indexed; syncs re-read SYNC_OVERLAP_SECONDS behind it
+_since: Optional[str] = None
+_synced_at = 0.0
+_sync_lock = threading.Lock()
+
+
+def sync() -> int:
+    """
+    Page in listings created since the last sync (all of them the first time).
+
+    Returns:
+        int: Number of listings added; 0 if another thread is already syncing
+    """
+    global _since, _synced_at
+    if not _sync_lock.acquire(blocking=False):
+        return 0
+    try:
+        sb = get_supabase_admin()
+        added = 0
+        for page in pages_since(lambda: sb.table("listings").select(FEATURE_FIELDS), "created_at", _since):
+            new = [row for row in page if str(row["id"]) not in _index]
+            _index.add_many(new)
+            added += len(new)
+            _since = max(_since or "", page[-1]["created_at"])
+        _synced_at = time.monotonic()
+        if added:
+            logger.info("Similar listings index: %d listings added (%d total)", added, len(_index))
+        return added
+    finally:
+        _sync_lock.release()
+
+
+def index() -> SimilarIndex:
+    """The worker's index, synced first if it is older than SYNC_INTERVAL."""
+    global _synced_at
+    if time.monotonic() - _synced_at > SYNC_INTERVAL:
+        try:
+            sync()
+        except Exception:
+            # Serve what we have; retry next interval
+            _synced_at = time.monotonic()
+            logger.warning("Similar listings sync failed", exc_info=True)
+    return _index
+
+
+def added(row: dict) -> None:
+    """Index a listing inserted on this worker right away."""
+    try:
+        _index.add(row)
+    except Exception:
+        logger.warning("Failed to index listing %s for similar listings", row.get("id"), exc_info=True)
+
+
+# ── Lookup ───────────────────────────────────────────────────
+
+
+def similar(listing_id: str, limit: int = 6) -> list[dict]:
+    """
+    The `limit` listings most like `listing_id`, most similar first, each
+    with a `similarity` in (0, 1].
+
+    Raises:
+        HTTPException: 404 unknown listing
+    """
+    idx = index()
+    nearest = idx.neighbours(listing_id)
+    sb = get_supabase_admin()
+    if nearest is None:
+        # Created on another worker since the last sync, or not a listing at all
+        res = sb.table("listings").select(FEATURE_FIELDS).eq("id", listing_id).execute()
+        if not res.data:
+            raise HTTPException(status_code=404, detail="Listing not found")
+        idx.add(res.data[0])
+        nearest = idx.neighbours(listing_id) or []
+
+    # A few spare ids, in case some of the nearest were deleted
+    wanted = nearest[:limit + 4]
+    if not wanted:
+        return []
+    rows = sb.table("listings").select(CARD_FIELDS).in_("id", [n for _, n in wanted]).execute().data
+    by_id = {str(r["id"]): r for r in rows}
+    results = []
+    for d, neighbour_id in wanted:
+        row = by_id.get(neighbour_id)
+        if row is None:
+            idx.remove(neighbour_id)
+            continue
+        if len(results) < limit:
+            results.append({**row, "similarity": round(1 / (1 + d), 3)})
+    return results
@@ -0,0 +1,71 @@
+"""
+Single-flight coalescing of identical in-flight reads.
+
+Route handlers run in a thread pool, so when a popular profile or listing
+search is requested by many clients at once, each request would otherwise
+make its own identical Supabase call. A Group lets the first caller for a key
+(the leader) make the call while concurrent callers for the same key
+(followers) wait for and share its result or exception.
+
+Only calls that overlap in time are merged; nothing is cached afterwards.
+Coalescing is per worker process. Shared results must be treated as
+read-only by callers.
+"""
+
+import threading
+from typing import Any, Callable, Hashable
+
+from prometheus_client import Counter
+
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total",
+    "Reads through a single-flight group; role=follower calls shared a leader's upstream request",
+    ["group", "role"],
+)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    """Deduplicates concurrent calls that share a key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._leaders = SINGLEFLIGHT_CALLS.labels(name, "leader")
+        self._followers = SINGLEFLIGHT_CALLS.labels(name, "follower")
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return fn(), or the result of an identical call already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            self._followers.inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        self._leaders.inc()
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
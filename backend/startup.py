@@ -0,0 +1,177 @@
+"""
+Application startup: lifespan handler, background warm-up and readiness.
+
+The app accepts connections as soon as its modules are imported. The lifespan
+handler validates configuration and starts warm() in a background thread,
+which imports the heavy SDKs and builds the shared Supabase admin client
+(opening its first upstream connection). READY is set once warm-up has
+finished; health.py reports it.
+
+On SIGTERM the process first sets DRAINING, which turns readiness off, and
+keeps serving for SHUTDOWN_DRAIN_SECONDS so the load balancer stops routing
+to it before the server stops accepting connections. A second SIGTERM skips
+the wait. Once the server has stopped, pending bypass flags are written.
+
+Import-time profile (which modules make cold starts and worker spawns slow):
+
+    cd backend
+    python -m startup              # top imports by cumulative time
+    python -m startup --top 40 --module routes_deals
+"""
+
+import os
+import sys
+import time
+import signal
+import asyncio
+import logging
+import argparse
+import threading
+import subprocess
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI
+
+import db
+import bypass
+import clients
+import duplicates
+import images
+import listing_views
+import moderation
+import rent_stats
+import search_alerts
+import similar_listings
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_DRAIN_SECONDS = float(os.environ.get("SHUTDOWN_DRAIN_SECONDS", "5"))
+
+READY = threading.Event()
+DRAINING = threading.Event()
+# Seconds spent in each warm-up step, for /ready and the startup log
+WARMUP_TIMINGS: dict[str, float] = {}
+
+
+def _warm_supabase() -> None:
+    db.get_supabase_admin().table("profiles").select("id").limit(1).execute()
+
+
+WARMUP_STEPS = [
+    ("stripe", clients.stripe),
+    ("resend", clients.resend),
+    ("moderation", moderation.reload),
+    ("supabase", _warm_supabase),
+    ("duplicates", duplicates.sync),
+    ("search_alerts", search_alerts.sync),
+    ("similar_listings", similar_listings.sync),
+    ("rent_stats", rent_stats.sync),
+]
+
+
+def preload_sdks() -> None:
+    """Import the heavy SDKs without opening connections or threads (safe before fork)."""
+    clients.stripe()
+    clients.resend()
+    import supabase  # noqa: F401
+
+
+def warm() -> None:
+    """
+    Run every warm-up step, then mark the process ready.
+
+    A failing step is logged and skipped; it only means the first request that
+    needs it pays the cost instead.
+    """
+    started = time.perf_counter()
+    for name, step in WARMUP_STEPS:
+        step_started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning("Warm-up step %s failed", name, exc_info=True)
+        WARMUP_TIMINGS[name] = round(time.perf_counter() - step_started, 3)
+    READY.set()
+    logger.info("Warm-up finished in %.2fs %s", time.perf_counter() - started, WARMUP_TIMINGS)
+
+
+def _drain_before(previous, loop: asyncio.AbstractEventLoop):
+    """SIGTERM handler: set DRAINING, then hand the signal to `previous` after the drain delay."""
+
+    def handle(signum, frame):
+        if DRAINING.is_set():
+            previous(signum, frame)
+            return
+        DRAINING.set()
+        logger.info("SIGTERM received; draining for %.0fs before shutdown", SHUTDOWN_DRAIN_SECONDS)
+        loop.call_soon_threadsafe(loop.call_later, SHUTDOWN_DRAIN_SECONDS, previous, signum, frame)
+
+    return handle
+
+
+def install_drain_handler() -> None:
+    """Wrap the server's SIGTERM handler (uvicorn installs it before lifespan startup)."""
+    if SHUTDOWN_DRAIN_SECONDS <= 0 or threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    if callable(previous):
+        signal.signal(signal.SIGTERM, _drain_before(previous, asyncio.get_running_loop()))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db.check_config()
+    install_drain_handler()
+    threading.Thread(target=warm, name="warmup", daemon=True).start()
+    yield
+    DRAINING.set()
+    await asyncio.to_thread(bypass.shutdown)
+    await asyncio.to_thread(search_alerts.shutdown)
+    await asyncio.to_thread(listing_views.shutdown)
+    images.shutdown()
+
+
+# ── Import-time profile ──────────────────────────────────────
+
+
+def profile_imports(module: str = "main") -> list[tuple[str, int, int]]:
+    """
+    Import `module` in a fresh interpreter under -X importtime.
+
+    Returns:
+        list: (module name, self µs, cumulative µs) in import order
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parent, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile import time of the API")
+    parser.add_argument("--module", default="main", help="module to import (default main)")
+    parser.add_argument("--top", type=int, default=25, help="rows to show")
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total = next((cum for name, _, cum in rows if name == args.module), sum(s for _, s, _ in rows))
+    print(f"import {args.module}: {total / 1000:.0f} ms ({len(rows)} modules)\n")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
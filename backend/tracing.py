@@ -0,0 +1,175 @@
+"""
+Per-request Supabase query tracing and N+1 detection.
+
+For a sampled request, every PostgREST/auth call made through a db.py client
+is recorded (operation, filter shape, duration, rows, bytes). When the
+response starts the trace is:
+  - summarised in a `Server-Timing` header (visible in browser devtools)
+  - logged as one JSON line by the "query_trace" logger
+  - flagged (warning log + metric) if it made more than
+    QUERY_TRACE_MAX_QUERIES calls or repeated one query shape at least
+    QUERY_TRACE_REPEAT_THRESHOLD times, the usual sign of a per-row loop
+
+Sampling is controlled by QUERY_TRACE_SAMPLE_RATE (0 = off, 1 = every
+request), so it can stay enabled in production at a low rate.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import random
+import logging
+from collections import Counter as Tally
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Optional
+
+from prometheus_client import Counter
+
+import metrics
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger("query_trace")
+
+QUERY_TRACE_SAMPLE_RATE = float(os.environ.get("QUERY_TRACE_SAMPLE_RATE", "0"))
+QUERY_TRACE_MAX_QUERIES = int(os.environ.get("QUERY_TRACE_MAX_QUERIES", "15"))
+QUERY_TRACE_REPEAT_THRESHOLD = int(os.environ.get("QUERY_TRACE_REPEAT_THRESHOLD", "3"))
+
+TRACE_FLAGS = Counter(
+    "query_trace_flags_total",
+    "Traced requests flagged for too many or repeated Supabase queries",
+    ["route", "reason"],
+)
+
+_current: ContextVar[Optional["QueryTrace"]] = ContextVar("query_trace", default=None)
+
+# Strip literal values from PostgREST filters so "id=eq.123" and "id=eq.456"
+# share the shape "id=eq"; inside or=/and= groups each value becomes "?".
+_NESTED_VALUE = re.compile(r"\.(eq|neq|gt|gte|lt|lte|is|in|like|ilike|cs|cd|fts)\.(\([^)]*\)|\"[^\"]*\"|[^,)]+)")
+_PASSTHROUGH_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+def query_shape(request: httpx.Request) -> str:
+    """Operation plus value-free filters, e.g. "messages.update?id=eq"."""
+    filters = []
+    for name, value in request.url.params.multi_items():
+        if name in _PASSTHROUGH_PARAMS:
+            filters.append(name)
+        elif name in ("or", "and"):
+            filters.append(f"{name}={_NESTED_VALUE.sub(lambda m: f'.{m.group(1)}.?', value)}")
+        else:
+            filters.append(f"{name}={value.split('.', 1)[0]}")
+    operation = metrics.supabase_operation(request)
+    return f"{operation}?{'&'.join(sorted(filters))}" if filters else operation
+
+
+def _row_count(response: httpx.Response) -> Optional[int]:
+    # PostgREST sends Content-Range: "0-24/*" (25 rows) or "*/0" (none)
+    content_range = response.headers.get("content-range", "")
+    span = content_range.split("/", 1)[0]
+    if span == "*":
+        return 0
+    if "-" in span:
+        first, last = span.split("-", 1)
+        if first.isdigit() and last.isdigit():
+            return int(last) - int(first) + 1
+    return None
+
+
+class QueryTrace:
+    """Supabase calls made while handling one request."""
+
+    def __init__(self):
+        self.queries: list[dict] = []
+
+    def record(self, request: httpx.Request, response: Optional[httpx.Response], elapsed: float) -> None:
+        entry = {
+            "query": query_shape(request),
+            "ms": round(elapsed * 1000, 2),
+            "status": response.status_code if response is not None else None,
+            "rows": None,
+            "bytes_out": len(request.content),
+            "bytes_in": None,
+        }
+        if response is not None:
+            entry["rows"] = _row_count(response)
+            entry["bytes_in"] = len(response.read())
+        self.queries.append(entry)
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(q["ms"] for q in self.queries), 2)
+
+    def repeated(self) -> dict[str, int]:
+        """Query shapes issued at least QUERY_TRACE_REPEAT_THRESHOLD times."""
+        tally = Tally(q["query"] for q in self.queries)
+        return {shape: n for shape, n in tally.items() if n >= QUERY_TRACE_REPEAT_THRESHOLD}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_ms};desc="{len(self.queries)} queries"'
+
+
+def _record_call(request: httpx.Request, response: Optional[httpx.Response], elapsed: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.record(request, response, elapsed)
+
+
+metrics.SUPABASE_CALL_HOOKS.append(_record_call)
+
+
+class QueryTraceMiddleware:
+    """ASGI middleware that traces a sample of requests (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or QUERY_TRACE_SAMPLE_RATE <= 0 or random.random() >= QUERY_TRACE_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+
+        trace = QueryTrace()
+        token = _current.set(trace)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and trace.queries:
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, trace, time.perf_counter() - start)
+
+    @staticmethod
+    def _report(scope, trace: QueryTrace, elapsed: float) -> None:
+        route = metrics.route_template(scope)
+        repeated = trace.repeated()
+        too_many = len(trace.queries) > QUERY_TRACE_MAX_QUERIES
+
+        summary = {
+            "method": scope["method"],
+            "route": route,
+            "request_ms": round(elapsed * 1000, 2),
+            "db_ms": trace.total_ms,
+            "query_count": len(trace.queries),
+            "repeated": repeated,
+            "queries": trace.queries,
+        }
+        logger.info(json.dumps(summary))
+
+        if too_many:
+            TRACE_FLAGS.labels(route, "query_count").inc()
+            logger.warning(f"{scope['method']} {route} made {len(trace.queries)} Supabase queries")
+        if repeated:
+            TRACE_FLAGS.labels(route, "repeated_shape").inc()
+            logger.warning(f"{scope['method']} {route} repeated queries in a loop: {repeated}")
@@ -125,156 +125,118 @@ export async function fetchAdminPayments(): Promise<AdminPayment[]> {
   }));
 }
 
-// ─── Fetch Admin Stats ───
-export async function fetchAdminStats() {
-  // Get total users count
-  const { count: userCount } = await supabase
-    .from("profiles")
-    .select("*", { count: "exact", head: true });
+// ─── Precomputed Analytics (backend rollups) ───
+// One GET /admin/analytics response backs every chart below; concurrent
+// callers on the same page share the in-flight request.
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8000";
+const MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
+
+interface AnalyticsSummary {
+  totals: {
+    users: number;
+    listings: number;
+    active_listings: number;
+    revenue_cents: number;
+    month_revenue_cents: number;
+  };
+  revenue_by_month: { month: string; amount_cents: number }[];
+  revenue_by_fee_type: { fee_type: string; amount_cents: number }[];
+  signups_by_day: { day: string; signups: number }[];
+  listings_by_location: { city: string; suburb: string; listings: number; active_listings: number }[];
+}
 
-  // Get active listings count
-  const { count: listingCount } = await supabase
-    .from("listings")
-    .select("*", { count: "exact", head: true })
-    .eq("status", "active");
+let analyticsRequest: Promise<AnalyticsSummary | null> | null = null;
+
+function fetchAnalyticsSummary(): Promise<AnalyticsSummary | null> {
+  if (!analyticsRequest) {
+    analyticsRequest = (async () => {
+      try {
+        const { data: { session } } = await supabase.auth.getSession();
+        if (!session) return null;
+        const res = await fetch(`${API_BASE_URL}/admin/analytics`, {
+          headers: { Authorization: `Bearer ${session.access_token}` },
+        });
+        if (!res.ok) throw new Error(`fetchAnalyticsSummary failed: ${res.status}`);
+        return (await res.json()) as AnalyticsSummary;
+      } catch (err) {
+        console.error("fetchAnalyticsSummary error:", err);
+        return null;
+      } finally {
+        // Let the next page visit fetch fresh numbers
+        setTimeout(() => { analyticsRequest = null; }, 0);
+      }
+    })();
+  }
+  return analyticsRequest;
+}
 
-  // Get total revenue from payments (if table exists)
-  let totalRevenue = 0;
-  let monthlyRevenue = 0;
+const toDollars = (cents: number) => Math.round(cents) / 100;
 
-  const { data: payments } = await supabase
-    .from("payments")
-    .select("amount, created_at, status")
-    .eq("status", "completed");
-
-  if (payments) {
-    totalRevenue = payments.reduce((sum, p) => sum + (p.amount || 0), 0);
-
-    // Calculate this month's revenue
-    const now = new Date();
-    const thisMonth = now.getMonth();
-    const thisYear = now.getFullYear();
-    monthlyRevenue = payments
-      .filter((p) => {
-        const d = new Date(p.created_at);
-        return d.getMonth() === thisMonth && d.getFullYear() === thisYear;
-      })
-      .reduce((sum, p) => sum + (p.amount || 0), 0);
-  }
+// ─── Fetch Admin Stats ───
+export async function fetchAdminStats() {
+  const summary = await fetchAnalyticsSummary();
+  const totals = summary?.totals;
 
   return {
-    totalUsers: userCount || 0,
-    activeListings: listingCount || 0,
-    totalRevenue,
-    monthlyRevenue,
+    totalUsers: totals?.users || 0,
+    activeListings: totals?.active_listings || 0,
+    totalRevenue: toDollars(totals?.revenue_cents || 0),
+    monthlyRevenue: toDollars(totals?.month_revenue_cents || 0),
   };
 }
 
 // ─── Fetch Monthly Revenue Data ───
 export async function fetchMonthlyRevenue(): Promise<MonthlyRevenue[]> {
-  const { data: payments } = await supabase
-    .from("payments")
-    .select("amount, created_at, status")
-    .eq("status", "completed")
-    .order("created_at", { ascending: true });
-
-  if (!payments || payments.length === 0) {
-    return [];
-  }
-
-  // Group by month
-  const monthMap = new Map<string, number>();
-  const monthNames = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"];
-
-  payments.forEach((p) => {
-    const d = new Date(p.created_at);
-    const key = `${monthNames[d.getMonth()]} ${d.getFullYear()}`;
-    monthMap.set(key, (monthMap.get(key) || 0) + (p.amount || 0));
-  });
+  const summary = await fetchAnalyticsSummary();
+  if (!summary) return [];
 
   // Return last 6 months
-  return Array.from(monthMap.entries())
-    .slice(-6)
-    .map(([month, revenue]) => ({ month: month.split(" ")[0], revenue }));
+  return summary.revenue_by_month.slice(-6).map((m) => ({
+    month: MONTH_NAMES[Number(m.month.split("-")[1]) - 1],
+    revenue: toDollars(m.amount_cents),
+  }));
 }
 
 // ─── Fetch Revenue by Role ───
 export async function fetchRevenueByRole() {
-  const { data: payments } = await supabase
-    .from("payments")
-    .select("amount, type, status")
-    .eq("status", "completed");
-
-  if (!payments || payments.length === 0) {
-    return [
-      { name: "Owner fees", value: 0, fill: "#f43f5e" },
-      { name: "Seeker fees", value: 0, fill: "#3b82f6" },
-    ];
-  }
-
-  const ownerFees = payments
-    .filter((p) => p.type === "owner_fee")
-    .reduce((sum, p) => sum + (p.amount || 0), 0);
-
-  const seekerFees = payments
-    .filter((p) => p.type === "seeker_fee")
-    .reduce((sum, p) => sum + (p.amount || 0), 0);
+  const summary = await fetchAnalyticsSummary();
+  const byType = new Map((summary?.revenue_by_fee_type || []).map((r) => [r.fee_type, r.amount_cents]));
 
   return [
-    { name: "Owner fees", value: ownerFees, fill: "#f43f5e" },
-    { name: "Seeker fees", value: seekerFees, fill: "#3b82f6" },
+    { name: "Owner fees", value: toDollars(byType.get("owner") || 0), fill: "#f43f5e" },
+    { name: "Seeker fees", value: toDollars(byType.get("seeker") || 0), fill: "#3b82f6" },
   ];
 }
 
 // ─── Fetch Signup Funnel ───
 export async function fetchSignupFunnel(): Promise<SignupFunnel[]> {
-  const { count: totalUsers } = await supabase
-    .from("profiles")
-    .select("*", { count: "exact", head: true });
+  const summary = await fetchAnalyticsSummary();
+  const totalUsers = summary?.totals.users || 0;
 
   const { count: verifiedUsers } = await supabase
     .from("profiles")
     .select("*", { count: "exact", head: true })
     .eq("email_verified", true);
 
-  const { count: activeListings } = await supabase
-    .from("listings")
-    .select("*", { count: "exact", head: true })
-    .eq("status", "active");
-
   // For "Visited" we'd need analytics - use a placeholder multiplier for now
-  const visited = (totalUsers || 0) * 10;
+  const visited = totalUsers * 10;
 
   return [
     { stage: "Visited", count: visited },
-    { stage: "Signed up", count: totalUsers || 0 },
+    { stage: "Signed up", count: totalUsers },
     { stage: "Verified", count: verifiedUsers || 0 },
-    { stage: "Active listing/search", count: activeListings || 0 },
+    { stage: "Active listing/search", count: summary?.totals.active_listings || 0 },
   ];
 }
 
 // ─── Fetch Geographic Data ───
 export async function fetchGeoData() {
-  const { data: listings } = await supabase
-    .from("listings")
-    .select("suburb")
-    .eq("status", "active");
-
-  if (!listings || listings.length === 0) {
-    return [];
-  }
+  const summary = await fetchAnalyticsSummary();
+  if (!summary) return [];
 
-  // Group by suburb
-  const suburbMap = new Map<string, number>();
-  listings.forEach((l) => {
-    if (l.suburb) {
-      suburbMap.set(l.suburb, (suburbMap.get(l.suburb) || 0) + 1);
-    }
-  });
-
-  return Array.from(suburbMap.entries())
-    .map(([suburb, users]) => ({ suburb, users }))
-    .sort((a, b) => b.users - a.users)
+  return summary.listings_by_location
+    .filter((l) => l.active_listings > 0)
+    .map((l) => ({ suburb: l.suburb || l.city || "Unknown", users: l.active_listings }))
     .slice(0, 10);
 }
 
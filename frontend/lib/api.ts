@@ -409,6 +409,315 @@ export async function getMyProfile(token: string) {
   }
 }
 
+/**
+ * Everything the dashboard shows on load in one request: profile, owned
+ * listings (card fields), deals by status and unread message counts.
+ * GET /dashboard/summary
+ */
+export async function getDashboardSummary(token: string) {
+  try {
+    const res = await fetch(`${BASE_URL}/dashboard/summary`, {
+      method: "GET",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`,
+      },
+    });
+    if (!res.ok) throw new Error(`getDashboardSummary failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("getDashboardSummary error:", err);
+    return null;
+  }
+}
+
+/**
+ * Upload photos for one of the owner's listings. The backend stores WebP
+ * thumb/card/full variants and returns the listing's images and
+ * image_variants.
+ * POST /listings/{listingId}/images
+ */
+export async function uploadListingImages(
+  token: string,
+  listingId: string,
+  files: File[]
+) {
+  try {
+    const form = new FormData();
+    files.forEach((file) => form.append("files", file));
+    const res = await fetch(`${BASE_URL}/listings/${listingId}/images`, {
+      method: "POST",
+      // No Content-Type: the browser sets the multipart boundary
+      headers: { Authorization: `Bearer ${token}` },
+      body: form,
+    });
+    if (!res.ok) throw new Error(`uploadListingImages failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("uploadListingImages error:", err);
+    return null;
+  }
+}
+
+/**
+ * Report listing detail views, or listings shown in search results
+ * (kind "impression"). Fire-and-forget; counts feed sort=trending.
+ * POST /listings/views
+ */
+export async function recordListingViews(
+  listingIds: string[],
+  kind: "view" | "impression" = "view",
+  token?: string
+) {
+  try {
+    const res = await fetch(`${BASE_URL}/listings/views`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify({ listing_ids: listingIds.slice(0, 100), kind }),
+      keepalive: true,
+    });
+    if (!res.ok) throw new Error(`recordListingViews failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("recordListingViews error:", err);
+    return null;
+  }
+}
+
+/**
+ * Listings most like this one in the same area, most similar first, each
+ * with a `similarity` in (0, 1].
+ * GET /listings/{listingId}/similar
+ */
+export async function getSimilarListings(listingId: string, limit = 6) {
+  try {
+    const res = await fetch(`${BASE_URL}/listings/${listingId}/similar?limit=${limit}`);
+    if (!res.ok) throw new Error(`getSimilarListings failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("getSimilarListings error:", err);
+    return null;
+  }
+}
+
+/**
+ * Weekly rent quartiles (p25, median, p75) of listings in a postcode,
+ * optionally of one property or place type. Quartiles are null when there
+ * are too few listings.
+ * GET /stats/rent
+ */
+export async function getRentStats(
+  postcode: number,
+  filter: { property_type?: string; place_type?: string } = {}
+) {
+  try {
+    const query = new URLSearchParams({ postcode: String(postcode), ...filter }).toString();
+    const res = await fetch(`${BASE_URL}/stats/rent?${query}`);
+    if (!res.ok) throw new Error(`getRentStats failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("getRentStats error:", err);
+    return null;
+  }
+}
+
+/**
+ * Free date windows of a listing ([start_date, end_date), end_date is the
+ * first booked day). Defaults to the next year; the owner also gets
+ * bookings.
+ * GET /listings/{listingId}/availability
+ */
+export async function getListingAvailability(
+  listingId: string,
+  range: { start?: string; end?: string } = {},
+  token?: string
+) {
+  try {
+    const query = new URLSearchParams(range as Record<string, string>).toString();
+    const res = await fetch(`${BASE_URL}/listings/${listingId}/availability?${query}`, {
+      headers: token ? { Authorization: `Bearer ${token}` } : {},
+    });
+    if (!res.ok) throw new Error(`getListingAvailability failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("getListingAvailability error:", err);
+    return null;
+  }
+}
+
+/**
+ * Block dates on one of the owner's listings (409 if already booked).
+ * POST /listings/{listingId}/availability/blocks
+ */
+export async function blockListingDates(
+  token: string,
+  listingId: string,
+  data: { start_date: string; end_date?: string; note?: string }
+) {
+  try {
+    const res = await fetch(`${BASE_URL}/listings/${listingId}/availability/blocks`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`,
+      },
+      body: JSON.stringify(data),
+    });
+    if (!res.ok) throw new Error(`blockListingDates failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("blockListingDates error:", err);
+    return null;
+  }
+}
+
+/**
+ * Remove a block added with blockListingDates.
+ * DELETE /listings/{listingId}/availability/blocks/{blockId}
+ */
+export async function unblockListingDates(token: string, listingId: string, blockId: string) {
+  try {
+    const res = await fetch(`${BASE_URL}/listings/${listingId}/availability/blocks/${blockId}`, {
+      method: "DELETE",
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!res.ok) throw new Error(`unblockListingDates failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("unblockListingDates error:", err);
+    return null;
+  }
+}
+
+/**
+ * Upload one message attachment. Returns { url, name, type, size, ... };
+ * pass url/name/type as attachment_url/attachment_name/attachment_type to
+ * sendMessage.
+ * POST /messages/attachments
+ */
+export async function uploadAttachment(token: string, file: File) {
+  try {
+    const form = new FormData();
+    form.append("file", file);
+    const res = await fetch(`${BASE_URL}/messages/attachments`, {
+      method: "POST",
+      headers: { Authorization: `Bearer ${token}` },
+      body: form,
+    });
+    if (!res.ok) throw new Error(`uploadAttachment failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("uploadAttachment error:", err);
+    return null;
+  }
+}
+
+/**
+ * Save the current /listings filters as a search to be alerted about.
+ * POST /saved-searches
+ */
+export async function createSavedSearch(
+  token: string,
+  data: {
+    name?: string;
+    city?: string;
+    postcode?: number;
+    min_price?: number;
+    max_price?: number;
+    amenities?: string[];
+    notify?: boolean;
+  }
+) {
+  try {
+    const res = await fetch(`${BASE_URL}/saved-searches`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Authorization: `Bearer ${token}`,
+      },
+      body: JSON.stringify(data),
+    });
+    if (!res.ok) throw new Error(`createSavedSearch failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("createSavedSearch error:", err);
+    return null;
+  }
+}
+
+/**
+ * List the current user's saved searches.
+ * GET /saved-searches
+ */
+export async function getSavedSearches(token: string) {
+  try {
+    const res = await fetch(`${BASE_URL}/saved-searches`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!res.ok) throw new Error(`getSavedSearches failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("getSavedSearches error:", err);
+    return null;
+  }
+}
+
+/**
+ * Delete a saved search.
+ * DELETE /saved-searches/:id
+ */
+export async function deleteSavedSearch(token: string, searchId: string) {
+  try {
+    const res = await fetch(`${BASE_URL}/saved-searches/${searchId}`, {
+      method: "DELETE",
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!res.ok) throw new Error(`deleteSavedSearch failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("deleteSavedSearch error:", err);
+    return null;
+  }
+}
+
+/**
+ * New listings matching the user's saved searches, newest first.
+ * GET /saved-searches/alerts
+ */
+export async function getSearchAlerts(token: string) {
+  try {
+    const res = await fetch(`${BASE_URL}/saved-searches/alerts`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!res.ok) throw new Error(`getSearchAlerts failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("getSearchAlerts error:", err);
+    return null;
+  }
+}
+
+/**
+ * Mark all of the user's search alerts as read.
+ * PATCH /saved-searches/alerts/read
+ */
+export async function markSearchAlertsRead(token: string) {
+  try {
+    const res = await fetch(`${BASE_URL}/saved-searches/alerts/read`, {
+      method: "PATCH",
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!res.ok) throw new Error(`markSearchAlertsRead failed: ${res.status}`);
+    return await res.json();
+  } catch (err) {
+    console.error("markSearchAlertsRead error:", err);
+    return null;
+  }
+}
+
 /**
  * Update the current user's profile.
  * PATCH /profiles/me